@@ -1,27 +1,112 @@
 # app/agents.py
 """
 Production-ready Manufacturing Copilot Agents using HuggingFace Inference Endpoints.
-This module implements three specialized agents orchestrated by LangGraph.
+This module implements three specialized agents orchestrated by LangGraph,
+together with the ML and Analytics agent nodes.
 """
 
+import asyncio
+import contextlib
+import hashlib
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
-from typing import TypedDict, List, Dict, Any, Annotated
+from typing import TypedDict, List, Dict, Any, Annotated, AsyncIterator, Awaitable, Callable, Optional, Tuple
 import operator
 
-from langchain_huggingface import HuggingFaceEndpoint
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
 from langchain.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, END
+from langgraph.graph.graph import START
 
+from .batching import MicroBatcher
+from .cache import CompletionCache, SemanticCache, TTLCache
+from .concurrency import AdaptiveLimiter, Overloaded, SingleFlight
 from .config import settings
+from .context_builder import build_context, context_budget, get_token_counter
+from .embedding_cache import CachedEmbeddings, EmbeddingCache
+from .embeddings import build_embeddings
+from .imaging import preprocess_image
+from .inference_client import InferenceClient, get_inference_client
+from .knowledge_base import (
+    COLLECTION_NAME,
+    DEFECT_KEYWORDS,
+    extract_defects,
+    infer_equipment_type,
+    mark_collection_changed,
+)
+from .local_vision import load_local_classifier
 from .models import DiagnosisRequest, DiagnosisResponse
+from .object_store import ObjectNotFound, get_object_store
+from .reranker import Reranker, load_cross_encoder
+from .retrieval import ChromaStore, HybridRetriever
+from .ml_agent import ml_agent_node, get_ml_agent
+from .analytics_agent import analytics_agent_node, get_analytics_agent
 
 logger = logging.getLogger("manufacturing_copilot_api")
 
+# Async callback receiving generated text chunks as they stream from the LLM
+TokenCallback = Callable[[str], Awaitable[None]]
+
+
+async def _complete(
+    client: InferenceClient,
+    model_id: str,
+    params: Dict[str, Any],
+    prompt: str,
+    on_token: Optional[TokenCallback] = None,
+    cache: Optional[CompletionCache] = None,
+    limiter: Optional[AdaptiveLimiter] = None
+) -> str:
+    """
+    Run an LLM completion, streaming chunks to ``on_token`` when one is given.
+
+    Args:
+        client: Shared inference client
+        model_id: HuggingFace text-generation model
+        params: Generation parameters (temperature, max_new_tokens)
+        prompt: Fully formatted prompt
+        on_token: Optional async callback invoked with each generated chunk
+        cache: Optional completion cache consulted before calling the endpoint
+        limiter: Optional adaptive concurrency limit held while calling the endpoint
+
+    Returns:
+        The complete generated text
+
+    Raises:
+        Overloaded: If the limiter sheds the call
+    """
+    cache_key = None
+    if cache is not None:
+        cache_key = CompletionCache.make_key(model_id, params, prompt)
+        cached = await cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"LLM completion cache hit for {model_id}")
+            if on_token is not None:
+                await on_token(cached)
+            return cached
+    
+    # Latency baselines are kept per model and output length: a long report is not congestion
+    kind = (model_id, params.get("max_new_tokens"))
+    async with (limiter.slot(kind) if limiter is not None else contextlib.nullcontext()):
+        if on_token is None:
+            text = await client.text_generation(model_id, prompt, **params)
+        else:
+            chunks = []
+            async for chunk in client.stream_text_generation(model_id, prompt, **params):
+                chunks.append(chunk)
+                await on_token(chunk)
+            text = "".join(chunks)
+    
+    if cache_key is not None:
+        await cache.aset(cache_key, text)
+    return text
+
 
 # ============================================================================
 # STATE DEFINITION FOR LANGGRAPH
@@ -33,12 +118,14 @@ class AgentState(TypedDict):
     plant_id: str
     equipment_id: str
     problem_description: str
-    image_id: str
+    image_id: Optional[str]
     
     # Agent Outputs
     vision_analysis: Dict[str, Any]
     rag_guidance: Dict[str, Any]
     generated_report: str
+    ml_prediction: Dict[str, Any]
+    analytics_insights: Dict[str, Any]
     
     # Metadata
     confidence_score: float
@@ -49,72 +136,121 @@ class AgentState(TypedDict):
 # VISION AGENT - Uses Vision-Language Model (VLM)
 # ============================================================================
 
+VISION_BACKENDS = ("remote", "local", "auto")
+
 class VisionAgent:
     """
     Vision Agent for manufacturing defect detection.
-    Uses HuggingFace VLM (BLIP-2) via Inference API to analyze product images.
+    Fetches the inspection image from object storage, has a HuggingFace VLM
+    (BLIP-2) describe it, and extracts known defects from the description.
     """
     
     def __init__(self):
-        """Initialize VLM endpoint."""
+        """Initialize the VLM client, image store and preprocessing pool."""
         try:
-            # Note: For image analysis, we'll use HF Inference API via requests
-            # since LangChain doesn't have direct VLM support yet
+            # LangChain has no VLM support, so images go to the HF Inference API
+            # through the shared pooled/retrying inference client
             self.model_id = settings.VLM_MODEL_ID
-            self.hf_token = settings.HUGGINGFACE_TOKEN
-            logger.info(f"Vision Agent initialized with model: {self.model_id}")
+            self.client = get_inference_client()
+            self.store = get_object_store()
+            
+            # Image fetch, decode and resize run on this pool, never on the event loop
+            self.image_pool = ThreadPoolExecutor(
+                max_workers=settings.VISION_IMAGE_WORKERS, thread_name_prefix="vision-image"
+            )
+            
+            # Results keyed by image content hash: re-diagnosing a photo costs nothing,
+            # and concurrent requests for the same photo share one analysis
+            self.result_cache = TTLCache(
+                max_entries=settings.VISION_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.VISION_CACHE_TTL_SECONDS,
+            )
+            self._inflight = SingleFlight()
+            
+            # Images arriving within a few ms are described in one VLM call
+            self.batcher = MicroBatcher(
+                self._describe_batch,
+                max_batch_size=settings.VISION_BATCH_MAX_SIZE,
+                max_wait_ms=settings.VISION_BATCH_MAX_WAIT_MS,
+                name="VLM",
+            )
+            
+            # Optional local CPU classifier: the only backend ("local"), or the
+            # fallback when the VLM fails or exceeds its latency budget ("auto")
+            self.backend = settings.VISION_BACKEND
+            if self.backend not in VISION_BACKENDS:
+                raise ValueError(f"Unknown VISION_BACKEND {self.backend!r}; expected one of {VISION_BACKENDS}")
+            self.local = None
+            if self.backend in ("local", "auto"):
+                self.local = load_local_classifier(required=self.backend == "local")
+            if self.local is not None:
+                self.local_batcher = MicroBatcher(
+                    self._classify_batch,
+                    max_batch_size=settings.VISION_BATCH_MAX_SIZE,
+                    max_wait_ms=settings.VISION_BATCH_MAX_WAIT_MS,
+                    name="local vision",
+                )
+            self.fallbacks = 0
+            logger.info(f"Vision Agent initialized with model: {self.model_id} (backend: {self.backend})")
         except Exception as e:
             logger.error(f"Failed to initialize Vision Agent: {e}")
             raise
     
-    async def analyze_image(self, image_id: str, equipment_id: str) -> Dict[str, Any]:
+    async def describe_image(self, image: bytes) -> str:
+        """
+        Ask the VLM to describe an image.
+        
+        Args:
+            image: Encoded image bytes (JPEG/PNG)
+            
+        Returns:
+            The generated description
+        """
+        return await self.batcher.submit(image)
+    
+    async def _describe_batch(self, images: List[bytes]) -> List[str]:
+        return await self.client.image_to_text_batch(self.model_id, images)
+    
+    async def _classify_batch(self, batch: List[Any]) -> List[Tuple[List[str], float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.image_pool, self.local.classify, batch)
+    
+    async def analyze_image(self, image_id: Optional[str], equipment_id: str) -> Dict[str, Any]:
         """
         Analyze product image for manufacturing defects.
         
         Args:
-            image_id: ID of the image to analyze
+            image_id: ID of the image to analyze, or None for the equipment profile
             equipment_id: Equipment that produced the product
             
         Returns:
             Dict containing defects found and confidence scores
         """
         try:
-            # In production, you would:
-            # 1. Fetch image from storage (S3, GCS, etc.) using image_id
-            # 2. Send to HuggingFace Inference API for VLM analysis
-            # 3. Parse and return structured results
+            if not image_id:
+                return self._equipment_profile(equipment_id)
             
-            # For now, simulate with intelligent defaults based on equipment
             logger.info(f"Analyzing image {image_id} for equipment {equipment_id}")
+            loop = asyncio.get_running_loop()
+            data = await loop.run_in_executor(self.image_pool, self.store.get, image_id)
             
-            # Simulated analysis - in production, replace with actual HF API call
-            defect_keywords = {
-                "CNC": ["micro-fracture", "surface-roughness", "dimensional-deviation"],
-                "WELDING": ["weld-porosity", "incomplete-fusion", "spatter"],
-                "ASSEMBLY": ["misalignment", "missing-component", "loose-fastener"],
-                "COATING": ["surface-discoloration", "coating-thickness-variation", "orange-peel"],
-            }
-            
-            # Detect equipment type
-            detected_defects = []
-            for equip_type, defects in defect_keywords.items():
-                if equip_type in equipment_id.upper():
-                    detected_defects = defects[:2]  # Take first 2 potential defects
-                    break
-            
-            if not detected_defects:
-                detected_defects = ["surface-anomaly", "quality-concern"]
+            digest = hashlib.sha256(data).hexdigest()
+            if self.backend == "local":
+                result = await self._analyze_local(digest, data)
+            else:
+                result = await self._analyze_remote(digest, data)
+            if result.get("cache_hit"):
+                logger.info(f"Vision result cache hit for image {image_id}")
+            logger.info(f"Vision analysis complete: {len(result['defects_found'])} defects found")
+            return {**result, "image_analyzed": image_id}
             
-            result = {
-                "defects_found": detected_defects,
-                "confidence": 0.87,
-                "model_used": self.model_id,
-                "image_analyzed": image_id or "no_image_provided",
+        except ObjectNotFound:
+            logger.warning(f"Image {image_id} not found in the image store")
+            return {
+                "defects_found": [],
+                "confidence": 0.0,
+                "error": f"Image {image_id} not found"
             }
-            
-            logger.info(f"Vision analysis complete: {len(detected_defects)} defects found")
-            return result
-            
         except Exception as e:
             logger.error(f"Vision Agent error: {e}")
             return {
@@ -122,6 +258,85 @@ class VisionAgent:
                 "confidence": 0.0,
                 "error": str(e)
             }
+    
+    async def _analyze_remote(self, digest: str, data: bytes) -> Dict[str, Any]:
+        """Analyze with the VLM, falling back to the local classifier when configured."""
+        key = (self.model_id, digest)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return {**cached, "cache_hit": True}
+        
+        remote = asyncio.ensure_future(self._inflight.do(key, lambda: self._analyze(key, data)))
+        if self.local is None:
+            result, _ = await remote
+            return result
+        
+        # Bound the wait on the VLM; a late answer still lands in the cache
+        remote.add_done_callback(lambda task: task.cancelled() or task.exception())
+        budget_ms = settings.VISION_REMOTE_BUDGET_MS
+        try:
+            result, _ = await asyncio.wait_for(asyncio.shield(remote), timeout=budget_ms / 1000)
+            return result
+        except asyncio.TimeoutError:
+            logger.warning(f"VLM exceeded its {budget_ms:.0f}ms budget; using the local classifier")
+        except Exception as e:
+            logger.warning(f"VLM failed ({e}); using the local classifier")
+        self.fallbacks += 1
+        return await self._analyze_local(digest, data)
+    
+    async def _analyze_local(self, digest: str, data: bytes) -> Dict[str, Any]:
+        """Classify an image with the local CPU model (batched across requests)."""
+        key = (self.local.model_id, digest)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return {**cached, "cache_hit": True}
+        
+        loop = asyncio.get_running_loop()
+        pixels = await loop.run_in_executor(self.image_pool, self.local.preprocess, data)
+        defects, confidence = await self.local_batcher.submit(pixels)
+        result = {
+            "defects_found": defects,
+            "confidence": confidence,
+            "model_used": self.local.model_id,
+        }
+        self.result_cache.set(key, result)
+        return result
+    
+    async def _analyze(self, key: Tuple[str, str], data: bytes) -> Dict[str, Any]:
+        """Preprocess an image, describe it with the VLM and cache the parsed result."""
+        loop = asyncio.get_running_loop()
+        image = await loop.run_in_executor(
+            self.image_pool, preprocess_image, data, settings.VISION_MAX_IMAGE_SIZE
+        )
+        description = await self.describe_image(image)
+        defects = extract_defects(description)
+        result = {
+            "defects_found": defects,
+            # The VLM returns text, not scores: a named defect is a stronger signal
+            "confidence": 0.85 if defects else 0.6,
+            "model_used": self.model_id,
+            "description": description,
+        }
+        self.result_cache.set(key, result)
+        return result
+    
+    def _equipment_profile(self, equipment_id: str) -> Dict[str, Any]:
+        """Typical defects for the equipment type, used when no image was provided."""
+        detected_defects = []
+        for equip_type, defects in DEFECT_KEYWORDS.items():
+            if equip_type in equipment_id.upper():
+                detected_defects = defects[:2]  # Take first 2 potential defects
+                break
+        
+        if not detected_defects:
+            detected_defects = ["surface-anomaly", "quality-concern"]
+        
+        return {
+            "defects_found": detected_defects,
+            "confidence": 0.87,
+            "model_used": self.model_id,
+            "image_analyzed": "no_image_provided",
+        }
 
 
 # ============================================================================
@@ -135,36 +350,104 @@ class RAGAgent:
     expert recommendations using HuggingFace LLM endpoints.
     """
     
-    def __init__(self):
-        """Initialize RAG components: embeddings, vector DB, and LLM."""
+    def __init__(
+        self,
+        completion_cache: Optional[CompletionCache] = None,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        """
+        Initialize RAG components: embeddings, vector DB, and LLM.
+        
+        Args:
+            completion_cache: Optional LLM completion cache shared with other agents
+            limiter: Optional adaptive concurrency limit for LLM calls, shared with other agents
+        """
         try:
-            # Initialize embeddings
+            # Initialize embeddings (torch, int8 or ONNX Runtime; see EMBEDDING_BACKEND)
             logger.info(f"Initializing embeddings with {settings.EMBEDDING_MODEL_ID}")
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name=settings.EMBEDDING_MODEL_ID,
-                model_kwargs={'device': 'cpu'}  # Use CPU for compatibility
-            )
+            self.embeddings = build_embeddings()
             
-            # Initialize vector store
-            logger.info(f"Initializing ChromaDB at {settings.CHROMA_PERSIST_DIR}")
-            self.vectorstore = Chroma(
-                collection_name="manufacturing_docs",
-                embedding_function=self.embeddings,
-                persist_directory=settings.CHROMA_PERSIST_DIR
+            # Repeated problem descriptions reuse their embedding across workers and restarts
+            self.query_embeddings = self.embeddings
+            if settings.EMBEDDING_CACHE_ENABLED:
+                self.query_embeddings = CachedEmbeddings(
+                    self.embeddings,
+                    EmbeddingCache(
+                        settings.EMBEDDING_CACHE_PATH,
+                        dim=len(self.embeddings.embed_query("embedding dimension probe")),
+                        identity=f"{settings.EMBEDDING_BACKEND}:{settings.EMBEDDING_MODEL_ID}:{settings.EMBEDDING_NORMALIZE}",
+                        max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                    ),
+                )
+            
+            # Initialize vector store: Chroma, or an in-process snapshot of it
+            if settings.RETRIEVAL_BACKEND == "ann":
+                from .ann_index import AnnIndexManager
+                
+                logger.info(f"Loading ANN snapshot from {settings.ANN_SNAPSHOT_DIR}")
+                self.vectorstore = None
+                self.store = AnnIndexManager()
+            else:
+                logger.info(f"Initializing ChromaDB at {settings.CHROMA_PERSIST_DIR}")
+                self.vectorstore = Chroma(
+                    collection_name=COLLECTION_NAME,
+                    embedding_function=self.embeddings,
+                    persist_directory=settings.CHROMA_PERSIST_DIR
+                )
+                self.store = ChromaStore(self.vectorstore._collection, self.vectorstore._client)
+            
+            # LLM calls go through the shared pooled/retrying inference client
+            logger.info(f"Using LLM endpoint: {settings.LLM_MODEL_ID}")
+            self.client = get_inference_client()
+            self.llm_params = {"temperature": settings.TEMPERATURE, "max_new_tokens": settings.MAX_TOKENS}
+            
+            self.completion_cache = completion_cache
+            self.limiter = limiter
+            
+            # Token counter for budgeting the retrieved context in prompts
+            self.count_tokens = get_token_counter()
+            
+            # Semantic cache of generated guidance, keyed on query embedding
+            self.guidance_cache = SemanticCache(
+                max_distance=settings.SEMANTIC_CACHE_MAX_DISTANCE,
+                ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
             )
+            self._kb_checked_at = 0.0
             
-            # Initialize LLM
-            logger.info(f"Initializing LLM endpoint: {settings.LLM_MODEL_ID}")
-            self.llm = HuggingFaceEndpoint(
-                repo_id=settings.LLM_MODEL_ID,
-                huggingfacehub_api_token=settings.HUGGINGFACE_TOKEN,
-                temperature=settings.TEMPERATURE,
-                max_new_tokens=settings.MAX_TOKENS,
-                timeout=settings.REQUEST_TIMEOUT,
+            # Queries arriving within a few ms are embedded and searched together
+            self.retrieval_batcher = MicroBatcher(
+                self._retrieve_batch,
+                max_batch_size=settings.RAG_BATCH_MAX_SIZE,
+                max_wait_ms=settings.RAG_BATCH_MAX_WAIT_MS,
+                name="RAG retrieval",
             )
             
             # Check if knowledge base is empty and populate if needed
-            self._ensure_knowledge_base()
+            if self.vectorstore is not None:
+                self._ensure_knowledge_base()
+            
+            # BM25 + vector retrieval, pre-filtered by equipment type
+            self.retriever = HybridRetriever(
+                self.store,
+                candidates=settings.RETRIEVAL_CANDIDATES,
+                bm25_weight=settings.RETRIEVAL_BM25_WEIGHT,
+                vector_weight=settings.RETRIEVAL_VECTOR_WEIGHT,
+                hybrid=settings.RETRIEVAL_HYBRID_ENABLED,
+            )
+            
+            # Optional cross-encoder over the over-fetched candidates
+            self.reranker = None
+            if settings.RERANK_ENABLED:
+                logger.info(f"Loading re-ranker {settings.RERANK_MODEL_ID}")
+                self.reranker = Reranker(
+                    load_cross_encoder(settings.RERANK_MODEL_ID),
+                    latency_budget_ms=settings.RERANK_LATENCY_BUDGET_MS,
+                    cache_max_entries=settings.RERANK_CACHE_MAX_ENTRIES,
+                    cache_ttl_seconds=settings.RERANK_CACHE_TTL_SECONDS,
+                )
+                self.reranker.warm_up()
+            self._check_knowledge_base_version(force=True)
             
             logger.info("RAG Agent initialized successfully")
             
@@ -326,13 +609,72 @@ class RAGAgent:
         
         # Add documents to vector store
         self.vectorstore.add_documents(sample_docs)
+        mark_collection_changed(self.vectorstore._collection)
         logger.info(f"Populated knowledge base with {len(sample_docs)} sample documents")
     
+    def _check_knowledge_base_version(self, force: bool = False):
+        """
+        Invalidate the semantic cache and rebuild the BM25 index if the collection
+        changed (checked periodically, or now if ``force``).
+        """
+        now = time.monotonic()
+        if not force and now - self._kb_checked_at < settings.SEMANTIC_CACHE_KB_CHECK_SECONDS:
+            return
+        self._kb_checked_at = now
+        try:
+            fingerprint = self.store.fingerprint()
+            self.guidance_cache.validate(fingerprint)
+            self.retriever.refresh(fingerprint)
+            if self.reranker is not None:
+                self.reranker.validate(fingerprint)
+        except Exception as e:
+            logger.warning(f"Could not check knowledge base version: {e}")
+    
+    async def _retrieve_batch(
+        self, requests: List[Tuple[str, Optional[str]]]
+    ) -> List[Tuple[List[float], List[Document]]]:
+        """Embed and search a batch of queries on a worker thread."""
+        return await asyncio.to_thread(self._retrieve_many, requests)
+    
+    def _retrieve_many(
+        self, requests: List[Tuple[str, Optional[str]]]
+    ) -> List[Tuple[List[float], List[Document]]]:
+        """
+        Embed queries as one matrix, then run hybrid retrieval and optional re-ranking
+        for the whole batch (blocking).
+        
+        Args:
+            requests: (query, equipment type filter) pairs collected by the micro-batcher
+            
+        Returns:
+            One (query embedding, relevant documents) tuple per query, in order
+        """
+        self._check_knowledge_base_version()
+        queries = [query for query, _ in requests]
+        query_embeddings = self.query_embeddings.embed_documents(queries)
+        hits = self.retriever.retrieve_many(
+            queries,
+            query_embeddings,
+            [equipment_type for _, equipment_type in requests],
+            k=settings.RERANK_CANDIDATES if self.reranker else settings.RETRIEVAL_TOP_K,
+        )
+        if self.reranker is not None:
+            hits = self.reranker.rerank_many(queries, hits, top_n=settings.RETRIEVAL_TOP_K)
+        
+        retrieved = []
+        for query_embedding, query_hits in zip(query_embeddings, hits):
+            docs = [Document(page_content=text, metadata=metadata) for _, text, metadata in query_hits]
+            retrieved.append((query_embedding, docs))
+        
+        logger.debug(f"Retrieved documents for a batch of {len(queries)} queries")
+        return retrieved
+    
     async def get_guidance(
         self, 
         equipment_id: str, 
         problem_description: str,
-        defects_found: List[str]
+        defects_found: List[str],
+        on_token: Optional[TokenCallback] = None
     ) -> Dict[str, Any]:
         """
         Retrieve relevant documentation and generate maintenance guidance.
@@ -341,6 +683,7 @@ class RAGAgent:
             equipment_id: Equipment identifier
             problem_description: Description of the issue
             defects_found: List of defects identified by Vision Agent
+            on_token: Optional async callback receiving LLM chunks as they stream
             
         Returns:
             Dict containing recommended steps and cited documents
@@ -351,10 +694,16 @@ class RAGAgent:
             if defects_found:
                 query += f" Defects: {', '.join(defects_found)}"
             
-            logger.info(f"RAG query: {query}")
+            # Restrict retrieval to documents for this equipment type (plus generic ones)
+            equipment_type = (
+                infer_equipment_type(equipment_id, defects_found)
+                if settings.RETRIEVAL_EQUIPMENT_FILTER else None
+            )
             
-            # Retrieve relevant documents
-            relevant_docs = self.vectorstore.similarity_search(query, k=3)
+            logger.info(f"RAG query: {query} (equipment type: {equipment_type or 'any'})")
+            
+            # Retrieve relevant documents (batched embedding + search, off the event loop)
+            query_embedding, relevant_docs = await self.retrieval_batcher.submit((query, equipment_type))
             
             if not relevant_docs:
                 logger.warning("No relevant documents found in knowledge base")
@@ -368,10 +717,6 @@ class RAGAgent:
                     "confidence": 0.3
                 }
             
-            # Build context from retrieved documents
-            context = "\n\n".join([doc.page_content for doc in relevant_docs])
-            cited_docs = [doc.metadata.get("doc_id", "UNKNOWN") for doc in relevant_docs]
-            
             # Create prompt for LLM
             prompt = ChatPromptTemplate.from_template("""
 You are an expert manufacturing maintenance technician. Based on the following technical documentation and the reported problem, provide clear, actionable troubleshooting steps.
@@ -389,15 +734,39 @@ Provide a numbered list of specific, actionable troubleshooting steps. Be concis
 TROUBLESHOOTING STEPS:
 """)
             
-            # Generate response
-            formatted_prompt = prompt.format(
-                context=context,
-                equipment_id=equipment_id,
-                problem_description=problem_description,
-                defects=', '.join(defects_found) if defects_found else 'None detected'
+            prompt_args = {
+                "equipment_id": equipment_id,
+                "problem_description": problem_description,
+                "defects": ', '.join(defects_found) if defects_found else 'None detected',
+            }
+            
+            # Pack the retrieved documents into the token budget left by the prompt
+            budget = context_budget(self.count_tokens(prompt.format(context="", **prompt_args)))
+            context = build_context(
+                [doc.page_content for doc in relevant_docs], query, budget, self.count_tokens
+            )
+            cited_docs = [relevant_docs[i].metadata.get("doc_id", "UNKNOWN") for i in context.sources]
+            logger.info(
+                f"RAG context: {context.tokens}/{budget} tokens from {len(context.sources)} of "
+                f"{len(relevant_docs)} documents{' (truncated)' if context.truncated else ''}"
             )
             
-            response = await self.llm.ainvoke(formatted_prompt)
+            # Reuse guidance generated for a near-identical query on the same documents
+            if settings.SEMANTIC_CACHE_ENABLED:
+                cached = self.guidance_cache.lookup(query_embedding, cited_docs)
+                if cached is not None:
+                    logger.info(f"RAG semantic cache hit ({self.guidance_cache.stats()['hit_rate']:.0%} hit rate)")
+                    if on_token is not None:
+                        await on_token(cached["llm_response"])
+                    return {**cached, "cache_hit": True}
+            
+            # Generate response
+            formatted_prompt = prompt.format(context=context.text, **prompt_args)
+            
+            response = await _complete(
+                self.client, settings.LLM_MODEL_ID, self.llm_params, formatted_prompt, on_token,
+                self.completion_cache, self.limiter
+            )
             
             # Parse response into steps
             steps = [line.strip() for line in response.split('\n') if line.strip() and any(char.isdigit() for char in line[:5])]
@@ -414,12 +783,18 @@ TROUBLESHOOTING STEPS:
                 "recommended_steps": steps[:5],  # Top 5 steps
                 "cited_documents": cited_docs,
                 "confidence": 0.85,
-                "llm_response": response
+                "llm_response": response,
+                "context_tokens": context.tokens,
             }
             
+            if settings.SEMANTIC_CACHE_ENABLED:
+                self.guidance_cache.store(query_embedding, cited_docs, result)
+            
             logger.info(f"RAG guidance generated with {len(steps)} steps")
             return result
             
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"RAG Agent error: {e}")
             return {
@@ -444,17 +819,27 @@ class ReportAgent:
     Creates structured, professional incident reports using HuggingFace LLM.
     """
     
-    def __init__(self):
-        """Initialize LLM endpoint for report generation."""
+    def __init__(
+        self,
+        completion_cache: Optional[CompletionCache] = None,
+        limiter: Optional[AdaptiveLimiter] = None
+    ):
+        """
+        Initialize LLM endpoint for report generation.
+        
+        Args:
+            completion_cache: Optional LLM completion cache shared with other agents
+            limiter: Optional adaptive concurrency limit for LLM calls, shared with other agents
+        """
         try:
             logger.info(f"Initializing Report Agent with {settings.LLM_MODEL_ID}")
-            self.llm = HuggingFaceEndpoint(
-                repo_id=settings.LLM_MODEL_ID,
-                huggingfacehub_api_token=settings.HUGGINGFACE_TOKEN,
-                temperature=0.5,  # Lower temperature for more consistent reports
-                max_new_tokens=800,  # Longer reports
-                timeout=settings.REQUEST_TIMEOUT,
-            )
+            self.client = get_inference_client()
+            self.llm_params = {
+                "temperature": 0.5,  # Lower temperature for more consistent reports
+                "max_new_tokens": 800,  # Longer reports
+            }
+            self.completion_cache = completion_cache
+            self.limiter = limiter
             logger.info("Report Agent initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize Report Agent: {e}")
@@ -466,7 +851,8 @@ class ReportAgent:
         equipment_id: str,
         problem_description: str,
         vision_analysis: Dict[str, Any],
-        rag_guidance: Dict[str, Any]
+        rag_guidance: Dict[str, Any],
+        on_token: Optional[TokenCallback] = None
     ) -> str:
         """
         Generate a structured incident report.
@@ -477,6 +863,7 @@ class ReportAgent:
             problem_description: Original problem description
             vision_analysis: Output from Vision Agent
             rag_guidance: Output from RAG Agent
+            on_token: Optional async callback receiving LLM chunks as they stream
             
         Returns:
             Formatted incident report as string
@@ -537,11 +924,16 @@ REPORT:
             )
             
             # Generate report
-            report = await self.llm.ainvoke(formatted_prompt)
+            report = await _complete(
+                self.client, settings.LLM_MODEL_ID, self.llm_params, formatted_prompt, on_token,
+                self.completion_cache, self.limiter
+            )
             
             logger.info("Report generated successfully")
             return report.strip()
             
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"Report Agent error: {e}")
             # Fallback simple report
@@ -562,157 +954,264 @@ Please review manually and contact IT support.
 # LANGGRAPH ORCHESTRATOR
 # ============================================================================
 
-# Initialize agents as singletons
-vision_agent = VisionAgent()
-rag_agent = RAGAgent()
-report_agent = ReportAgent()
+# Agent singletons and the compiled graph are built by init_agents() on first
+# use (or by the app's background warm-up) rather than at import time, so the
+# API can answer health checks while embeddings and Chroma are still loading.
+vision_agent: Optional[VisionAgent] = None
+rag_agent: Optional[RAGAgent] = None
+report_agent: Optional[ReportAgent] = None
+completion_cache: Optional[CompletionCache] = None
+llm_limiter: Optional[AdaptiveLimiter] = None
+copilot_graph = None
 
+_init_lock = threading.Lock()
 
-def vision_node(state: AgentState) -> AgentState:
+
+async def vision_node(state: AgentState) -> Dict[str, Any]:
     """LangGraph node for Vision Agent."""
-    import asyncio
     logger.info("Executing Vision Agent node")
     
     try:
-        # Run async function in sync context
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            # If event loop is already running, create a new one
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                vision_result = pool.submit(
-                    asyncio.run,
-                    vision_agent.analyze_image(state['image_id'], state['equipment_id'])
-                ).result()
-        else:
-            vision_result = loop.run_until_complete(
-                vision_agent.analyze_image(state['image_id'], state['equipment_id'])
-            )
-        
-        state['vision_analysis'] = vision_result
+        vision_result = await vision_agent.analyze_image(
+            state['image_id'], state['equipment_id']
+        )
+        return {"vision_analysis": vision_result}
     except Exception as e:
         logger.error(f"Vision node error: {e}")
-        state['errors'].append(f"Vision Agent: {str(e)}")
-        state['vision_analysis'] = {"defects_found": [], "confidence": 0.0}
+        return {
+            "vision_analysis": {"defects_found": [], "confidence": 0.0},
+            "errors": [f"Vision Agent: {str(e)}"],
+        }
+
+
+def _token_callback(config: Optional[RunnableConfig], agent: str) -> Optional[TokenCallback]:
+    """Bind the streaming token sink passed in the run config to an agent name."""
+    sink = ((config or {}).get("configurable") or {}).get("token_sink")
+    if sink is None:
+        return None
     
-    return state
+    async def on_token(text: str) -> None:
+        await sink(agent, text)
+    
+    return on_token
 
 
-def rag_node(state: AgentState) -> AgentState:
+async def rag_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """LangGraph node for RAG Agent."""
-    import asyncio
     logger.info("Executing RAG Agent node")
     
     try:
         defects = state.get('vision_analysis', {}).get('defects_found', [])
-        
-        # Run async function in sync context
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                rag_result = pool.submit(
-                    asyncio.run,
-                    rag_agent.get_guidance(
-                        state['equipment_id'],
-                        state['problem_description'],
-                        defects
-                    )
-                ).result()
-        else:
-            rag_result = loop.run_until_complete(
-                rag_agent.get_guidance(
-                    state['equipment_id'],
-                    state['problem_description'],
-                    defects
-                )
-            )
-        
-        state['rag_guidance'] = rag_result
+        rag_result = await rag_agent.get_guidance(
+            state['equipment_id'],
+            state['problem_description'],
+            defects,
+            on_token=_token_callback(config, "rag")
+        )
+        return {"rag_guidance": rag_result}
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"RAG node error: {e}")
-        state['errors'].append(f"RAG Agent: {str(e)}")
-        state['rag_guidance'] = {"recommended_steps": [], "cited_documents": []}
-    
-    return state
+        return {
+            "rag_guidance": {"recommended_steps": [], "cited_documents": []},
+            "errors": [f"RAG Agent: {str(e)}"],
+        }
 
 
-def report_node(state: AgentState) -> AgentState:
+async def report_node(state: AgentState, config: RunnableConfig) -> Dict[str, Any]:
     """LangGraph node for Report Agent."""
-    import asyncio
     logger.info("Executing Report Agent node")
     
     try:
-        # Run async function in sync context
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                report = pool.submit(
-                    asyncio.run,
-                    report_agent.generate_report(
-                        state['plant_id'],
-                        state['equipment_id'],
-                        state['problem_description'],
-                        state['vision_analysis'],
-                        state['rag_guidance']
-                    )
-                ).result()
-        else:
-            report = loop.run_until_complete(
-                report_agent.generate_report(
-                    state['plant_id'],
-                    state['equipment_id'],
-                    state['problem_description'],
-                    state['vision_analysis'],
-                    state['rag_guidance']
-                )
-            )
-        
-        state['generated_report'] = report
+        report = await report_agent.generate_report(
+            state['plant_id'],
+            state['equipment_id'],
+            state['problem_description'],
+            state['vision_analysis'],
+            state['rag_guidance'],
+            on_token=_token_callback(config, "report")
+        )
         
         # Calculate overall confidence
         vision_conf = state.get('vision_analysis', {}).get('confidence', 0.0)
         rag_conf = state.get('rag_guidance', {}).get('confidence', 0.0)
-        state['confidence_score'] = (vision_conf + rag_conf) / 2
         
+        return {
+            "generated_report": report,
+            "confidence_score": (vision_conf + rag_conf) / 2,
+        }
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Report node error: {e}")
-        state['errors'].append(f"Report Agent: {str(e)}")
-        state['generated_report'] = "Error generating report"
-        state['confidence_score'] = 0.0
+        return {
+            "generated_report": "Error generating report",
+            "confidence_score": 0.0,
+            "errors": [f"Report Agent: {str(e)}"],
+        }
+
+
+def _build_graph():
+    """
+    Build and compile the LangGraph workflow.
+    
+    Nodes are coroutines driven by ``ainvoke`` on the caller's event loop and
+    return partial state updates so that parallel branches never write the
+    same key. Vision, ML and Analytics only need the request fields and fan out
+    from START; RAG waits for the vision defects and Report for the RAG guidance.
+    The ML and Analytics branches finish independently, so end-to-end latency is
+    bounded by the vision -> rag -> report critical path.
+    """
+    workflow = StateGraph(AgentState)
+    
+    # Add nodes
+    workflow.add_node("vision", vision_node)
+    workflow.add_node("ml", ml_agent_node)
+    workflow.add_node("analytics", analytics_agent_node)
+    workflow.add_node("rag", rag_node)
+    workflow.add_node("report", report_node)
     
-    return state
+    # Define edges (fan-out from START, fan-in at END)
+    workflow.add_edge(START, "vision")
+    workflow.add_edge(START, "ml")
+    workflow.add_edge(START, "analytics")
+    workflow.add_edge("vision", "rag")
+    workflow.add_edge("rag", "report")
+    workflow.add_edge("report", END)
+    workflow.add_edge("ml", END)
+    workflow.add_edge("analytics", END)
+    
+    # Compile the graph
+    return workflow.compile()
 
 
-# Build LangGraph workflow
-workflow = StateGraph(AgentState)
+def init_agents() -> None:
+    """
+    Build all agents and compile the LangGraph workflow.
+    
+    Blocking and idempotent: loads the embedding model, opens Chroma and may
+    populate the knowledge base, so call it from a worker thread when an event
+    loop is running.
+    """
+    global vision_agent, rag_agent, report_agent, completion_cache, llm_limiter, copilot_graph
+    
+    with _init_lock:
+        if copilot_graph is not None:
+            return
+        
+        if settings.LLM_CACHE_ENABLED:
+            completion_cache = CompletionCache(
+                max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                db_path=settings.LLM_CACHE_DB_PATH or None,
+            )
+        
+        if settings.LLM_LIMITER_ENABLED:
+            llm_limiter = AdaptiveLimiter(
+                "LLM endpoint",
+                initial_limit=settings.LLM_LIMITER_INITIAL,
+                min_limit=settings.LLM_LIMITER_MIN,
+                max_limit=settings.LLM_LIMITER_MAX,
+                max_queue=settings.LLM_LIMITER_MAX_QUEUE,
+                queue_timeout=settings.LLM_LIMITER_QUEUE_TIMEOUT_SECONDS,
+                tolerance=settings.LLM_LIMITER_LATENCY_TOLERANCE,
+            )
+        
+        vision_agent = VisionAgent()
+        rag_agent = RAGAgent(completion_cache=completion_cache, limiter=llm_limiter)
+        report_agent = ReportAgent(completion_cache=completion_cache, limiter=llm_limiter)
+        get_ml_agent()
+        get_analytics_agent()
+        
+        copilot_graph = _build_graph()
+        logger.info("LangGraph orchestrator compiled successfully")
 
-# Add nodes
-workflow.add_node("vision", vision_node)
-workflow.add_node("rag", rag_node)
-workflow.add_node("report", report_node)
 
-# Define edges (sequential execution)
-workflow.set_entry_point("vision")
-workflow.add_edge("vision", "rag")
-workflow.add_edge("rag", "report")
-workflow.add_edge("report", END)
+def check_capacity() -> None:
+    """
+    Shed a new diagnosis before any work is done if the LLM queue is full.
+    
+    Raises:
+        Overloaded: If the LLM limiter would reject the request
+    """
+    if llm_limiter is not None:
+        llm_limiter.check()
+
+
+def agents_ready() -> bool:
+    """Return True once all agents are built and the graph is compiled."""
+    return copilot_graph is not None
 
-# Compile the graph
-copilot_graph = workflow.compile()
 
-logger.info("LangGraph orchestrator compiled successfully")
+async def ensure_agents() -> None:
+    """Initialize the agents off the event loop if that has not happened yet."""
+    if copilot_graph is None:
+        await asyncio.to_thread(init_agents)
 
 
 # ============================================================================
 # MAIN ENTRY POINT
 # ============================================================================
 
+def _initial_state(payload: DiagnosisRequest) -> AgentState:
+    """Build the LangGraph input state for a diagnosis request."""
+    return {
+        "plant_id": payload.plant_id,
+        "equipment_id": payload.equipment_id,
+        "problem_description": payload.problem_description,
+        "image_id": payload.image_id,
+        "vision_analysis": {},
+        "rag_guidance": {},
+        "generated_report": "",
+        "ml_prediction": {},
+        "analytics_insights": {},
+        "confidence_score": 0.0,
+        "errors": []
+    }
+
+
+# Identical diagnose requests arriving while one is in flight share its result
+_inflight_diagnoses = SingleFlight()
+
+
+def _request_key(payload: DiagnosisRequest) -> Tuple[str, str, str, Optional[str]]:
+    """Identity of a diagnosis request for coalescing (whitespace/case-insensitive text)."""
+    problem = " ".join(payload.problem_description.lower().split())
+    return payload.plant_id, payload.equipment_id, problem, payload.image_id
+
+
+def _build_response(final_state: Dict[str, Any]) -> DiagnosisResponse:
+    """Build the API response from the final LangGraph state."""
+    return DiagnosisResponse(
+        request_id=uuid4(),
+        vision_analysis=final_state['vision_analysis'],
+        rag_guidance=final_state['rag_guidance'],
+        generated_report=final_state['generated_report'],
+        confidence_score=final_state['confidence_score'],
+        ml_prediction=final_state.get('ml_prediction') or None,
+        analytics_insights=final_state.get('analytics_insights') or None
+    )
+
+
+def _error_response(error: Exception) -> DiagnosisResponse:
+    """Build the API response returned when the orchestration itself fails."""
+    return DiagnosisResponse(
+        request_id=uuid4(),
+        vision_analysis={"error": str(error)},
+        rag_guidance={"error": str(error)},
+        generated_report=f"System Error: {str(error)}",
+        confidence_score=0.0
+    )
+
+
 async def run_copilot_inference(payload: DiagnosisRequest) -> DiagnosisResponse:
     """
     Main entry point for Manufacturing Copilot inference.
-    Orchestrates Vision, RAG, and Report agents using LangGraph.
+    Orchestrates Vision, ML, Analytics, RAG, and Report agents using LangGraph.
+    
+    Concurrent requests with the same plant, equipment, problem description and
+    image share a single graph run; each caller still gets its own request_id.
     
     Args:
         payload: Diagnosis request from API
@@ -722,31 +1221,22 @@ async def run_copilot_inference(payload: DiagnosisRequest) -> DiagnosisResponse:
     """
     logger.info(f"Starting copilot inference for {payload.equipment_id}")
     
+    await ensure_agents()
+    
     try:
-        # Initialize state
-        initial_state: AgentState = {
-            "plant_id": payload.plant_id,
-            "equipment_id": payload.equipment_id,
-            "problem_description": payload.problem_description,
-            "image_id": payload.image_id or "no_image",
-            "vision_analysis": {},
-            "rag_guidance": {},
-            "generated_report": "",
-            "confidence_score": 0.0,
-            "errors": []
-        }
-        
-        # Run the LangGraph workflow
-        final_state = copilot_graph.invoke(initial_state)
+        # Run the LangGraph workflow on the current event loop
+        if settings.DIAGNOSE_COALESCING_ENABLED:
+            final_state, shared = await _inflight_diagnoses.do(
+                _request_key(payload),
+                lambda: copilot_graph.ainvoke(_initial_state(payload)),
+            )
+            if shared:
+                logger.info(f"Diagnosis for {payload.equipment_id} served by an in-flight request")
+        else:
+            final_state = await copilot_graph.ainvoke(_initial_state(payload))
         
-        # Build response
-        response = DiagnosisResponse(
-            request_id=uuid4(),
-            vision_analysis=final_state['vision_analysis'],
-            rag_guidance=final_state['rag_guidance'],
-            generated_report=final_state['generated_report'],
-            confidence_score=final_state['confidence_score']
-        )
+        # Build response (fresh request_id per caller)
+        response = _build_response(final_state)
         
         if final_state['errors']:
             logger.warning(f"Copilot completed with errors: {final_state['errors']}")
@@ -755,13 +1245,84 @@ async def run_copilot_inference(payload: DiagnosisRequest) -> DiagnosisResponse:
         
         return response
         
+    except Overloaded:
+        # Surfaced by the API as 503 + Retry-After
+        raise
     except Exception as e:
         logger.error(f"Copilot inference failed: {e}")
         # Return error response
-        return DiagnosisResponse(
-            request_id=uuid4(),
-            vision_analysis={"error": str(e)},
-            rag_guidance={"error": str(e)},
-            generated_report=f"System Error: {str(e)}",
-            confidence_score=0.0
-        )
+        return _error_response(e)
+
+
+async def stream_copilot_inference(payload: DiagnosisRequest) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of :func:`run_copilot_inference`.
+    
+    Yields events as the workflow progresses:
+    
+    - ``{"event": "agent_result", "agent": <node>, "data": {...}}`` when a
+      LangGraph node finishes, carrying that node's state update
+    - ``{"event": "token", "agent": "rag" | "report", "text": "..."}`` for each
+      LLM chunk generated by the RAG and Report agents
+    - ``{"event": "final", "data": {...}}`` with the complete
+      ``DiagnosisResponse`` as the last frame
+    
+    Args:
+        payload: Diagnosis request from API
+        
+    Yields:
+        Event dictionaries, ready to be serialized one per line
+    """
+    logger.info(f"Starting streaming copilot inference for {payload.equipment_id}")
+    
+    await ensure_agents()
+    
+    events: asyncio.Queue = asyncio.Queue()
+    done = object()
+    final_state: Dict[str, Any] = dict(_initial_state(payload))
+    
+    async def token_sink(agent: str, text: str) -> None:
+        await events.put({"event": "token", "agent": agent, "text": text})
+    
+    async def run_graph() -> None:
+        try:
+            async for update in copilot_graph.astream(
+                _initial_state(payload),
+                config={"configurable": {"token_sink": token_sink}},
+                stream_mode="updates",
+            ):
+                for node, values in update.items():
+                    values = values or {}
+                    for key, value in values.items():
+                        if key == "errors":
+                            final_state["errors"] = final_state["errors"] + value
+                        else:
+                            final_state[key] = value
+                    await events.put({"event": "agent_result", "agent": node, "data": values})
+        finally:
+            await events.put(done)
+    
+    task = asyncio.create_task(run_graph())
+    try:
+        while True:
+            event = await events.get()
+            if event is done:
+                break
+            yield event
+        
+        await task
+        response = _build_response(final_state)
+        
+        if final_state['errors']:
+            logger.warning(f"Streaming copilot completed with errors: {final_state['errors']}")
+        else:
+            logger.info("Streaming copilot inference completed successfully")
+    except Exception as e:
+        logger.error(f"Streaming copilot inference failed: {e}")
+        response = _error_response(e)
+    finally:
+        # Client disconnected mid-stream: stop the remaining agent work
+        if not task.done():
+            task.cancel()
+    
+    yield {"event": "final", "data": response.model_dump(mode="json")}
@@ -4,6 +4,7 @@ Provides historical trends, comparative analysis, and KPI calculations
 """
 
 import logging
+import threading
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
 import pandas as pd
@@ -345,44 +346,44 @@ class AnalyticsAgent:
 # Node function for LangGraph integration
 # ============================================================================
 
-analytics_agent = AnalyticsAgent()
+# Built on first use so that importing this module stays cheap
+_analytics_agent: Optional[AnalyticsAgent] = None
+_analytics_agent_lock = threading.Lock()
 
 
-def analytics_agent_node(state: dict) -> dict:
-    """LangGraph node for Analytics Agent"""
-    import asyncio
-    
+def get_analytics_agent() -> AnalyticsAgent:
+    """Return the process-wide AnalyticsAgent, creating it on first use."""
+    global _analytics_agent
+    if _analytics_agent is None:
+        with _analytics_agent_lock:
+            if _analytics_agent is None:
+                _analytics_agent = AnalyticsAgent()
+    return _analytics_agent
+
+
+async def analytics_agent_node(state: dict) -> dict:
+    """
+    LangGraph node for Analytics Agent.
+
+    Returns a partial state update so it can run in parallel with the other
+    agent nodes.
+    """
     logger.info("Executing Analytics Agent node")
     
     try:
-        # Run async function in sync context
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                analytics_result = pool.submit(
-                    asyncio.run,
-                    analytics_agent.analyze_performance_trend(
-                        state['equipment_id'],
-                        'last_30_days'
-                    )
-                ).result()
-        else:
-            analytics_result = loop.run_until_complete(
-                analytics_agent.analyze_performance_trend(
-                    state['equipment_id'],
-                    'last_30_days'
-                )
-            )
+        analytics_result = await get_analytics_agent().analyze_performance_trend(
+            state['equipment_id'],
+            'last_30_days'
+        )
         
-        state['analytics_insights'] = analytics_result
+        return {'analytics_insights': analytics_result}
         
     except Exception as e:
         logger.error(f"Analytics Agent node error: {e}")
-        state.setdefault('errors', []).append(f"Analytics Agent: {str(e)}")
-        state['analytics_insights'] = {"error": str(e)}
-    
-    return state
+        return {
+            'analytics_insights': {"error": str(e)},
+            'errors': [f"Analytics Agent: {str(e)}"]
+        }
 
 
 if __name__ == '__main__':
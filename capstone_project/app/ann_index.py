@@ -0,0 +1,444 @@
+# app/ann_index.py
+"""
+In-process approximate nearest-neighbour (IVF) index over a knowledge base snapshot.
+
+For read-heavy serving the RAG agent can search a snapshot of the
+``manufacturing_docs`` embeddings in process instead of querying Chroma.
+
+Snapshot layout (one directory per version under ``ANN_SNAPSHOT_DIR``)::
+
+    CURRENT                  name of the live version directory
+    <version>/manifest.json  dimensions, list count, equipment types, kb fingerprint
+    <version>/centroids.npy  (nlist, dim) float32, unit length
+    <version>/list_offsets.npy  (nlist + 1,) int64; list i is rows [off[i], off[i+1])
+    <version>/vectors.npy    (n, dim) float32, unit length, grouped by list
+    <version>/types.npy      (n,) int16 equipment type code per row
+    <version>/records.bin    JSON {"id", "text", "metadata"} per row, concatenated
+    <version>/record_offsets.npy  (n + 1,) int64 byte offsets into records.bin
+
+Arrays are opened with ``np.load(mmap_mode="r")``, so every uvicorn worker on a
+node shares the same page cache. Publishing writes a new version directory and
+then atomically replaces ``CURRENT``; serving processes poll it and hot-swap,
+unmapping the previous snapshot once the searches still using it finish.
+
+Usage:
+    python -m app.ann_index build
+"""
+
+import argparse
+import json
+import logging
+import math
+import mmap
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+from uuid import uuid4
+
+import numpy as np
+
+from .config import settings
+from .knowledge_base import COLLECTION_NAME, GENERIC_EQUIPMENT_TYPE, KB_VERSION_KEY
+from .retrieval import Hit
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+CURRENT_FILE = "CURRENT"
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+# ============================================================================
+# Building Snapshots
+# ============================================================================
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: int = 50_000, seed: int = 0) -> np.ndarray:
+    """
+    Train IVF centroids with spherical k-means on a sample of the vectors.
+
+    Args:
+        vectors: (n, dim) unit-length vectors
+        nlist: Number of inverted lists
+        iterations: k-means iterations
+        sample_size: Maximum rows used for training
+
+    Returns:
+        (nlist, dim) unit-length centroids
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists with random training points
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block: int = 16_384) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(vectors[start:start + block] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), block)
+    ]) if len(vectors) else np.zeros(0, dtype=np.int64)
+
+
+def build_snapshot(
+    collection,
+    snapshot_dir: Optional[str] = None,
+    nlist: Optional[int] = None,
+    keep: int = 3,
+    page_size: int = 5000,
+) -> str:
+    """
+    Export the collection into a new IVF snapshot and publish it.
+
+    Args:
+        collection: Chroma collection to export
+        snapshot_dir: Root directory of the snapshots (defaults to ANN_SNAPSHOT_DIR)
+        nlist: Inverted lists (defaults to ANN_NLIST; 0 = about sqrt(n))
+        keep: Number of snapshot versions kept on disk
+        page_size: Rows read from Chroma per request
+
+    Returns:
+        The published version name
+    """
+    root = Path(snapshot_dir or settings.ANN_SNAPSHOT_DIR)
+    root.mkdir(parents=True, exist_ok=True)
+
+    ids: List[str] = []
+    texts: List[str] = []
+    metadatas: List[Dict[str, Any]] = []
+    embeddings: List[np.ndarray] = []
+    offset = 0
+    while True:
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+        ids.extend(page["ids"])
+        texts.extend(page["documents"])
+        metadatas.extend(metadata or {} for metadata in page["metadatas"])
+        if page["ids"]:
+            embeddings.append(np.asarray(page["embeddings"], dtype=np.float32))
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+    if not ids:
+        raise ValueError("Cannot build an ANN snapshot of an empty collection")
+
+    vectors = _normalize_rows(np.concatenate(embeddings))
+    nlist = nlist if nlist is not None else settings.ANN_NLIST
+    if not nlist:
+        nlist = int(math.sqrt(len(ids)))
+    nlist = max(1, min(nlist, len(ids)))
+    centroids = train_ivf(vectors, nlist)
+    assignment = _assign(vectors, centroids)
+    order = np.argsort(assignment, kind="stable")
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=nlist))]).astype(np.int64)
+
+    equipment_types = sorted({m.get("equipment_type", GENERIC_EQUIPMENT_TYPE) for m in metadatas})
+    type_codes = {equipment_type: code for code, equipment_type in enumerate(equipment_types)}
+
+    version = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+    tmp_dir = root / f".{version}.tmp"
+    tmp_dir.mkdir()
+    np.save(tmp_dir / "centroids.npy", centroids)
+    np.save(tmp_dir / "list_offsets.npy", list_offsets)
+    np.save(tmp_dir / "vectors.npy", vectors[order])
+    np.save(tmp_dir / "types.npy", np.asarray(
+        [type_codes[metadatas[i].get("equipment_type", GENERIC_EQUIPMENT_TYPE)] for i in order], dtype=np.int16
+    ))
+    record_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    with open(tmp_dir / "records.bin", "wb") as f:
+        for row, i in enumerate(order):
+            record = json.dumps({"id": ids[i], "text": texts[i], "metadata": metadatas[i]}).encode("utf-8")
+            f.write(record)
+            record_offsets[row + 1] = record_offsets[row] + len(record)
+    np.save(tmp_dir / "record_offsets.npy", record_offsets)
+    manifest = {
+        "version": version,
+        "count": len(ids),
+        "dim": int(vectors.shape[1]),
+        "nlist": nlist,
+        "equipment_types": equipment_types,
+        "kb_version": (collection.metadata or {}).get(KB_VERSION_KEY),
+    }
+    (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_dir, root / version)
+
+    # Publish: readers see either the old or the new pointer, never a partial one
+    tmp_current = root / f".{CURRENT_FILE}.{uuid4().hex}"
+    tmp_current.write_text(version)
+    os.replace(tmp_current, root / CURRENT_FILE)
+    logger.info(f"Published ANN snapshot {version}: {len(ids)} vectors in {nlist} lists")
+
+    _remove_old_snapshots(root, keep, version)
+    return version
+
+
+def _remove_old_snapshots(root: Path, keep: int, current: str) -> None:
+    # Processes still mapping a removed version keep their pages until they swap
+    versions = sorted(
+        (p for p in root.iterdir() if p.is_dir() and not p.name.startswith(".") and p.name != current),
+        key=lambda p: p.stat().st_mtime,
+    )
+    for old in versions[:max(0, len(versions) - (keep - 1))]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+# ============================================================================
+# Serving
+# ============================================================================
+
+class IVFIndex:
+    """A loaded (memory-mapped) snapshot."""
+
+    def __init__(self, path: Path, nprobe: int = 8):
+        self.path = Path(path)
+        self.nprobe = nprobe
+        self.manifest = json.loads((self.path / "manifest.json").read_text())
+        self.version = self.manifest["version"]
+        self.centroids = np.load(self.path / "centroids.npy")
+        self.list_offsets = np.load(self.path / "list_offsets.npy")
+        self.vectors = np.load(self.path / "vectors.npy", mmap_mode="r")
+        self.types = np.load(self.path / "types.npy", mmap_mode="r")
+        self.record_offsets = np.load(self.path / "record_offsets.npy", mmap_mode="r")
+        with open(self.path / "records.bin", "rb") as f:
+            self._records = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._type_codes = {t: code for code, t in enumerate(self.manifest["equipment_types"])}
+        self._row_by_id: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return int(self.manifest["count"])
+
+    def close(self) -> None:
+        """Unmap the snapshot; no search may use this index afterwards."""
+        self._records.close()
+        self.vectors = self.types = self.record_offsets = None
+
+    def record(self, row: int) -> Hit:
+        """Decode the (id, text, metadata) of a row."""
+        start, end = int(self.record_offsets[row]), int(self.record_offsets[row + 1])
+        record = json.loads(self._records[start:end])
+        return record["id"], record["text"], record["metadata"]
+
+    def iter_records(self) -> Iterator[Hit]:
+        """Yield every row's record in storage order."""
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def get(self, ids: Sequence[str]) -> List[Hit]:
+        """Return the records with the given chunk IDs."""
+        if self._row_by_id is None:
+            self._row_by_id = {item_id: row for row, (item_id, _, _) in enumerate(self.iter_records())}
+        return [self.record(self._row_by_id[i]) for i in ids if i in self._row_by_id]
+
+    def search(
+        self,
+        embeddings: Sequence[Sequence[float]],
+        n_results: int,
+        equipment_types: Optional[Sequence[str]] = None,
+    ) -> List[List[Hit]]:
+        """
+        Return the approximate nearest chunks (cosine) for each embedding.
+
+        The ``nprobe`` lists whose centroids are closest to the query are scanned;
+        if a filter leaves fewer than ``n_results`` matches there, every list is
+        scanned instead.
+        """
+        queries = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+        allowed = None
+        if equipment_types is not None:
+            allowed = np.asarray([self._type_codes[t] for t in equipment_types if t in self._type_codes], dtype=np.int16)
+
+        nlist = len(self.centroids)
+        centroid_scores = queries @ self.centroids.T
+        results = []
+        for query, scores in zip(queries, centroid_scores):
+            probe = min(self.nprobe, nlist)
+            rows = self._search_lists(query, np.argpartition(-scores, probe - 1)[:probe], n_results, allowed)
+            if len(rows) < n_results and probe < nlist:
+                rows = self._search_lists(query, np.arange(nlist), n_results, allowed)
+            results.append([self.record(row) for row in rows])
+        return results
+
+    def _search_lists(
+        self,
+        query: np.ndarray,
+        lists: np.ndarray,
+        n_results: int,
+        allowed: Optional[np.ndarray],
+    ) -> List[int]:
+        candidate_rows = []
+        candidate_scores = []
+        for list_id in lists:
+            start, end = int(self.list_offsets[list_id]), int(self.list_offsets[list_id + 1])
+            if start == end:
+                continue
+            scores = self.vectors[start:end] @ query
+            rows = np.arange(start, end)
+            if allowed is not None:
+                mask = np.isin(self.types[start:end], allowed)
+                scores, rows = scores[mask], rows[mask]
+            candidate_rows.append(rows)
+            candidate_scores.append(scores)
+        if not candidate_rows:
+            return []
+
+        rows = np.concatenate(candidate_rows)
+        scores = np.concatenate(candidate_scores)
+        if len(rows) > n_results:
+            top = np.argpartition(-scores, n_results - 1)[:n_results]
+            rows, scores = rows[top], scores[top]
+        return rows[np.argsort(-scores, kind="stable")].tolist()
+
+
+class AnnIndexManager:
+    """
+    Serves the current snapshot and hot-swaps it when a new one is published.
+
+    Implements the vector store interface used by ``retrieval.HybridRetriever``.
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: Optional[str] = None,
+        nprobe: Optional[int] = None,
+        reload_seconds: Optional[float] = None,
+    ):
+        """
+        Args:
+            snapshot_dir: Root directory of the snapshots (defaults to ANN_SNAPSHOT_DIR)
+            nprobe: Lists scanned per query (defaults to ANN_NPROBE)
+            reload_seconds: How often to check CURRENT for a new snapshot; 0 disables
+        """
+        self.root = Path(snapshot_dir or settings.ANN_SNAPSHOT_DIR)
+        self.nprobe = nprobe or settings.ANN_NPROBE
+        self.reload_seconds = settings.ANN_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        self._index: Optional[IVFIndex] = None
+        self._swap_lock = threading.Lock()
+        # Calls in progress per index; a replaced index is closed when its count drops to zero
+        self._users: Dict[IVFIndex, int] = {}
+        self._users_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+        if not self.reload():
+            raise FileNotFoundError(
+                f"No ANN snapshot published in {self.root}; run `python -m app.ann_index build`"
+            )
+        if self.reload_seconds > 0:
+            self._watcher = threading.Thread(target=self._watch, name="ann-index-watcher", daemon=True)
+            self._watcher.start()
+
+    @property
+    def index(self) -> IVFIndex:
+        return self._index
+
+    def reload(self) -> bool:
+        """
+        Load the snapshot named in CURRENT if it differs from the loaded one.
+
+        Returns:
+            True if a snapshot is loaded after the call
+        """
+        try:
+            version = (self.root / CURRENT_FILE).read_text().strip()
+        except FileNotFoundError:
+            return self._index is not None
+
+        if self._index is not None and self._index.version == version:
+            return True
+        with self._swap_lock:
+            if self._index is not None and self._index.version == version:
+                return True
+            index = IVFIndex(self.root / version, nprobe=self.nprobe)
+            with self._users_lock:
+                previous, self._index = self._index, index
+                # Searches in flight on the previous index close it when they finish
+                idle = previous is not None and previous not in self._users
+        if idle:
+            previous.close()
+        logger.info(f"Loaded ANN snapshot {version} ({len(index)} vectors)")
+        return True
+
+    def close(self) -> None:
+        self._stop.set()
+
+    @contextmanager
+    def _use(self) -> Iterator[IVFIndex]:
+        """Pin the current index for the duration of one call."""
+        with self._users_lock:
+            index = self._index
+            self._users[index] = self._users.get(index, 0) + 1
+        try:
+            yield index
+        finally:
+            with self._users_lock:
+                self._users[index] -= 1
+                retired = not self._users[index] and index is not self._index
+                if not self._users[index]:
+                    del self._users[index]
+            if retired:
+                index.close()
+
+    def fingerprint(self) -> Any:
+        """Return the loaded snapshot's version (changes on every hot swap)."""
+        return self._index.version
+
+    def query(
+        self,
+        embeddings: List[Sequence[float]],
+        n_results: int,
+        equipment_types: Optional[List[str]] = None,
+    ) -> List[List[Hit]]:
+        with self._use() as index:
+            return index.search(embeddings, n_results, equipment_types)
+
+    def get(self, ids: List[str]) -> List[Hit]:
+        with self._use() as index:
+            return index.get(ids)
+
+    def iter_all(self) -> Iterator[Hit]:
+        with self._use() as index:
+            yield from index.iter_records()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_seconds):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.warning(f"Could not load new ANN snapshot: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and publish an ANN snapshot of the knowledge base")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--snapshot-dir", default=None, help="Snapshot root directory")
+    parser.add_argument("--nlist", type=int, default=None, help="Inverted lists (0 = about sqrt(n))")
+    parser.add_argument("--keep", type=int, default=3, help="Snapshot versions kept on disk")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    import chromadb
+
+    client = chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIR)
+    build_snapshot(client.get_collection(COLLECTION_NAME), args.snapshot_dir, args.nlist, args.keep)
+
+
+if __name__ == "__main__":
+    main()
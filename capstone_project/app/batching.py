@@ -0,0 +1,104 @@
+# app/batching.py
+"""
+Micro-batching for CPU- and model-bound work.
+
+Requests that arrive within a few milliseconds of each other are collected and
+processed as one batch (e.g. one embedding matrix instead of N single-row
+encodes), and each caller receives its own result.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Generic, List, Optional, Set, Tuple, TypeVar
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collect items submitted concurrently and process them in batches.
+
+    A batch is flushed when it reaches ``max_batch_size`` items or ``max_wait_ms``
+    after its first item arrived, whichever comes first. ``process_batch`` receives
+    the list of items and must return one result per item, in order. If it raises,
+    every caller in that batch receives the exception.
+    """
+
+    def __init__(
+        self,
+        process_batch: Callable[[List[T]], Awaitable[List[R]]],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "batch",
+    ):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._running: Set[asyncio.Task] = set()  # strong refs while batches run
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        """Queue ``item`` for the next batch and wait for its result."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Pending futures belong to the previous loop (only happens in tests)
+            self._loop = loop
+            self._pending = []
+            self._flush_handle = None
+
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def stats(self) -> dict:
+        """Return batch counters."""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+        }
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        items = [item for item, _ in batch]
+        try:
+            results = await self.process_batch(items)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"{self.name} batch returned {len(results)} results for {len(items)} items"
+                )
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(items)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,362 @@
+# app/cache.py
+"""
+In-process caches used by the Manufacturing Copilot agents.
+
+- TTLCache: thread-safe LRU cache with per-entry time-to-live and hit/miss counters
+- SemanticCache: caches RAG guidance by query embedding, so near-identical problem
+  reports that retrieve the same documents reuse one LLM generation
+- CompletionCache: exact-match cache of LLM completions keyed on model, generation
+  parameters and prompt, with an optional SQLite tier that survives restarts
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with a time-to-live per entry.
+
+    The least recently used entry is evicted once ``max_entries`` is exceeded and
+    entries older than ``ttl_seconds`` are treated as misses. A ``ttl_seconds`` of
+    0 disables expiry.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for ``key`` or ``default`` on a miss."""
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                stored_at, value = item
+                if not self._expired(stored_at):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store ``value`` under ``key``, evicting the least recently used entries."""
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _expired(self, stored_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.monotonic() - stored_at > self.ttl_seconds
+
+
+@dataclass
+class _SemanticEntry:
+    embedding: np.ndarray
+    documents: Tuple[str, ...]
+    value: Any
+    stored_at: float
+
+
+class SemanticCache:
+    """
+    Cache keyed on query embeddings instead of exact text.
+
+    A lookup hits when a stored entry retrieved the same documents and its query
+    embedding lies within ``max_distance`` cosine distance of the new query.
+    Entries expire after ``ttl_seconds`` and the least recently used entry is
+    evicted beyond ``max_entries``. Call :meth:`validate` with a fingerprint of the
+    underlying document collection to drop everything when the collection changes.
+    """
+
+    def __init__(self, max_distance: float = 0.05, ttl_seconds: float = 3600, max_entries: int = 1024):
+        self.max_distance = max_distance
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, _SemanticEntry]" = OrderedDict()
+        self._next_id = 0
+        self._fingerprint: Any = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def lookup(self, embedding: Sequence[float], documents: Sequence[str]) -> Optional[Any]:
+        """
+        Return the cached value for the closest matching query, if any.
+
+        Args:
+            embedding: Embedding of the new query
+            documents: IDs of the documents retrieved for the new query
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        query = _normalize(embedding)
+        documents = tuple(documents)
+
+        with self._lock:
+            now = time.monotonic()
+            expired = [
+                key for key, entry in self._entries.items()
+                if self.ttl_seconds and now - entry.stored_at > self.ttl_seconds
+            ]
+            for key in expired:
+                del self._entries[key]
+
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.documents == documents
+            ]
+            if candidates:
+                matrix = np.stack([entry.embedding for _, entry in candidates])
+                distances = 1.0 - matrix @ query
+                best = int(np.argmin(distances))
+                if distances[best] <= self.max_distance:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.value
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: Sequence[float], documents: Sequence[str], value: Any) -> None:
+        """Cache ``value`` for a query embedding and the documents it retrieved."""
+        entry = _SemanticEntry(
+            embedding=_normalize(embedding),
+            documents=tuple(documents),
+            value=value,
+            stored_at=time.monotonic(),
+        )
+        with self._lock:
+            self._entries[self._next_id] = entry
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def validate(self, fingerprint: Any) -> None:
+        """Invalidate the cache if the collection fingerprint has changed."""
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            if self._fingerprint is not None and self._entries:
+                logger.info("Knowledge base changed; invalidating semantic cache")
+                self.invalidations += 1
+            self._entries.clear()
+            self._fingerprint = fingerprint
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def _normalize(vector: Sequence[float]) -> np.ndarray:
+    """Return ``vector`` as a unit-length float32 array."""
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else array
+
+
+class CompletionCache:
+    """
+    Exact-match cache for LLM completions.
+
+    Keys are derived from the model id, generation parameters and prompt (see
+    :meth:`make_key`). Lookups hit an in-process LRU tier first and then, when
+    ``db_path`` is set, a SQLite tier shared by all workers on the host and
+    persisted across restarts. Disk hits are promoted into memory.
+
+    The disk tier is best-effort: SQLite errors (e.g. "database is locked" under
+    contention between workers) count as misses. Async callers use
+    :meth:`aget` / :meth:`aset`, which keep disk access off the event loop.
+    Expired rows are pruned on startup and then at most every ``prune_interval``
+    seconds when a completion is written.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_seconds: float = 86400,
+        db_path: Optional[str] = None,
+        prune_interval: float = 3600,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval = prune_interval
+        self.memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.disk_hits = 0
+        self.disk_errors = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._last_prune = 0.0
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            logger.info(f"LLM completion cache persisted to {db_path}")
+            self.prune()
+
+    @staticmethod
+    def make_key(model_id: str, params: Dict[str, Any], prompt: str) -> str:
+        """Build a cache key from the model id, generation parameters and prompt."""
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"model": model_id, "params": params}, sort_keys=True, default=str).encode())
+        digest.update(b"\0")
+        digest.update(prompt.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached completion for ``key``, or None on a miss."""
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        return self._get_disk(key)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """``get`` for the event loop: the disk tier is read in a worker thread."""
+        value = self.memory.get(key)
+        if value is not None or self._db is None:
+            return value
+        return await asyncio.to_thread(self._get_disk, key)
+
+    def set(self, key: str, value: str) -> None:
+        """Store a completion in memory and, if enabled, on disk."""
+        self.memory.set(key, value)
+        if self._db is not None:
+            self._set_disk(key, value)
+
+    async def aset(self, key: str, value: str) -> None:
+        """``set`` for the event loop: the disk tier is written in a worker thread."""
+        self.memory.set(key, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._set_disk, key, value)
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            # The disk tier is best-effort: an unreadable row is a miss
+            self.disk_errors += 1
+            logger.warning(f"Could not read LLM completion cache: {e}")
+            return None
+        if row is None:
+            return None
+        value, created_at = row
+        if self.ttl_seconds and time.time() - created_at > self.ttl_seconds:
+            return None
+
+        self.disk_hits += 1
+        self.memory.set(key, value)
+        return value
+
+    def _set_disk(self, key: str, value: str) -> None:
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, time.time()),
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            # The disk tier is best-effort; the in-memory tier already has the value
+            self.disk_errors += 1
+            logger.warning(f"Could not persist LLM completion: {e}")
+            return
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune()
+
+    def prune(self) -> int:
+        """Delete expired rows from the disk tier and return how many were removed."""
+        if self._db is None or not self.ttl_seconds:
+            return 0
+        self._last_prune = time.monotonic()
+        try:
+            with self._db_lock:
+                cursor = self._db.execute(
+                    "DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            self.disk_errors += 1
+            logger.warning(f"Could not prune LLM completion cache: {e}")
+            return 0
+        if cursor.rowcount:
+            logger.info(f"Pruned {cursor.rowcount} expired LLM completions")
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Close the disk tier."""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Return memory-tier counters plus the number of disk-tier hits."""
+        return {**self.memory.stats(), "disk_hits": self.disk_hits, "disk_errors": self.disk_errors}
@@ -0,0 +1,252 @@
+# app/concurrency.py
+"""
+Concurrency controls for the Manufacturing Copilot API.
+
+- SingleFlight: coalesces concurrent identical requests into one in-flight computation
+- AdaptiveLimiter: AIMD concurrency limit around calls to a slow backend, with
+  load shedding (``Overloaded``) when too many callers are queued
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Hashable, Tuple, TypeVar
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Share one in-flight computation between concurrent callers with the same key.
+
+    The first caller for a key starts the computation as a task; callers arriving
+    while it runs await the same task instead of starting their own. The key is
+    released as soon as the task finishes, so later calls compute afresh. A
+    caller being cancelled (e.g. a client disconnect) does not cancel the shared
+    task for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Run ``fn`` for ``key`` unless an identical call is already in flight.
+
+        Args:
+            key: Hashable identity of the request
+            fn: Zero-argument coroutine function performing the computation
+
+        Returns:
+            Tuple of (result, shared) where ``shared`` is True if the result came
+            from a computation started by another caller
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.info("Coalescing request with identical in-flight computation")
+
+        return await asyncio.shield(task), shared
+
+    def in_flight(self) -> int:
+        """Return the number of distinct computations currently running."""
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for started and coalesced calls."""
+        return {"in_flight": len(self._inflight), "started": self.started, "coalesced": self.coalesced}
+
+    def _release(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Retrieve the exception so an unobserved failure is not logged as such
+        if not task.cancelled():
+            task.exception()
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when a backend is saturated; maps to HTTP 503."""
+
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    Adaptive (AIMD) concurrency limit driven by observed call latency.
+
+    The limit grows by about one per ``limit`` successful calls while latency
+    stays within ``tolerance`` times the baseline (the fastest recent call), and
+    is multiplied by ``backoff`` when calls get slower than that or fail. At
+    most one decrease happens per typical call duration, so a burst of slow
+    responses from one slowdown is not counted many times.
+
+    Calls of different kinds (e.g. a short RAG answer and an 800-token report)
+    share the limit but each kind is compared only against its own baseline,
+    so a normally long call is not mistaken for congestion.
+
+    Callers over the limit wait in FIFO order. When ``max_queue`` callers are
+    already waiting, or a caller waits longer than ``queue_timeout`` seconds,
+    ``Overloaded`` is raised so the request fails fast instead of piling up.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_queue: int = 32,
+        queue_timeout: float = 5.0,
+        tolerance: float = 2.0,
+        backoff: float = 0.9,
+    ):
+        """
+        Args:
+            name: Backend name used in logs and errors
+            initial_limit: Starting concurrency limit
+            min_limit: Lowest limit the backoff can reach
+            max_limit: Highest limit the increase can reach
+            max_queue: Waiting callers beyond which new callers are rejected
+            queue_timeout: Maximum seconds a caller waits for a slot
+            tolerance: Latency above ``tolerance`` x baseline counts as congestion
+            backoff: Multiplicative decrease factor
+        """
+        self.name = name
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.tolerance = tolerance
+        self.backoff = backoff
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._latencies: Dict[Hashable, Deque[float]] = {}
+        self._avg_latency = 0.0
+        self._last_decrease = 0.0
+        self.rejected = 0
+        self.decreases = 0
+
+    @asynccontextmanager
+    async def slot(self, kind: Hashable = None) -> AsyncIterator[None]:
+        """
+        Hold one unit of concurrency for the duration of a backend call.
+
+        Args:
+            kind: Call type whose own recent latencies form the baseline
+
+        Raises:
+            Overloaded: If the queue is full or no slot frees up in time
+        """
+        await self._acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        except asyncio.CancelledError:
+            # The caller went away; this says nothing about backend latency
+            started = None
+            raise
+        finally:
+            if started is not None:
+                self._observe(time.monotonic() - started, ok, kind)
+            self._release()
+
+    def check(self) -> None:
+        """Raise ``Overloaded`` if a new caller would be rejected (fast, before any work)."""
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{self.name} is overloaded", retry_after=self.retry_after())
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue is likely to drain."""
+        if not self._avg_latency:
+            return 1
+        return max(1, math.ceil(self._avg_latency * (len(self._waiters) + 1) / self.limit))
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current limit, usage and shedding counters."""
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "avg_latency_ms": round(self._avg_latency * 1000, 1),
+            "rejected": self.rejected,
+            "decreases": self.decreases,
+        }
+
+    async def _acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        self.check()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # The slot is handed over by _release(), which counts it as in flight
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.rejected += 1
+            raise Overloaded(
+                f"{self.name} is overloaded (no capacity within {self.queue_timeout:.0f}s)",
+                retry_after=self.retry_after(),
+            )
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done() and not waiter.cancelled():
+            # A slot was granted just as we gave up: pass it on
+            self._release()
+        else:
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _observe(self, latency: float, ok: bool, kind: Hashable = None) -> None:
+        latencies = self._latencies.setdefault(kind, deque(maxlen=100))
+        latencies.append(latency)
+        self._avg_latency = latency if not self._avg_latency else 0.9 * self._avg_latency + 0.1 * latency
+        baseline = min(latencies)
+        now = time.monotonic()
+
+        if not ok or latency > self.tolerance * baseline:
+            if now - self._last_decrease >= self._avg_latency:
+                self._last_decrease = now
+                self.limit = max(float(self.min_limit), self.limit * self.backoff)
+                self.decreases += 1
+                logger.info(f"{self.name} concurrency limit decreased to {self.limit:.1f} "
+                            f"(latency {latency * 1000:.0f}ms, baseline {baseline * 1000:.0f}ms)")
+        elif self.in_flight >= int(self.limit) - 1:
+            # Only grow while the current limit is actually being used
+            self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
@@ -24,16 +24,136 @@ class Settings(BaseSettings):
     LLM_MODEL_ID: str = Field(default="meta-llama/Llama-2-7b-chat-hf", env="LLM_MODEL_ID")
     EMBEDDING_MODEL_ID: str = Field(default="sentence-transformers/all-MiniLM-L6-v2", env="EMBEDDING_MODEL_ID")
     
+    # Embedding runtime on CPU: "torch", "torch-int8", "onnx" or "onnx-int8"
+    EMBEDDING_BACKEND: str = Field(default="torch", env="EMBEDDING_BACKEND")
+    EMBEDDING_ONNX_DIR: str = Field(default="./models/embeddings", env="EMBEDDING_ONNX_DIR")
+    EMBEDDING_NORMALIZE: bool = Field(default=True, env="EMBEDDING_NORMALIZE")  # matches all-MiniLM-L6-v2
+    EMBEDDING_THREADS: int = Field(default=0, env="EMBEDDING_THREADS")  # 0 = runtime default
+    
+    # Memory-mapped query-embedding cache shared by all workers (put it on a persistent volume)
+    EMBEDDING_CACHE_ENABLED: bool = Field(default=True, env="EMBEDDING_CACHE_ENABLED")
+    EMBEDDING_CACHE_PATH: str = Field(default="./cache/query_embeddings.bin", env="EMBEDDING_CACHE_PATH")
+    EMBEDDING_CACHE_MAX_ENTRIES: int = Field(default=20000, env="EMBEDDING_CACHE_MAX_ENTRIES")
+    
+    # Vision: inspection images are fetched from IMAGE_STORE_BACKEND, downscaled on a
+    # worker pool, described in batched VLM calls and cached by content hash
+    IMAGE_STORE_BACKEND: str = Field(default="local", env="IMAGE_STORE_BACKEND")
+    IMAGE_STORE_ROOT: str = Field(default="./data/images", env="IMAGE_STORE_ROOT")
+    VISION_MAX_IMAGE_SIZE: int = Field(default=512, env="VISION_MAX_IMAGE_SIZE")  # longest side in pixels
+    VISION_IMAGE_WORKERS: int = Field(default=4, env="VISION_IMAGE_WORKERS")
+    VISION_BATCH_MAX_SIZE: int = Field(default=8, env="VISION_BATCH_MAX_SIZE")  # 1 = one image per call
+    VISION_BATCH_MAX_WAIT_MS: float = Field(default=10.0, env="VISION_BATCH_MAX_WAIT_MS")
+    VISION_CACHE_MAX_ENTRIES: int = Field(default=4096, env="VISION_CACHE_MAX_ENTRIES")
+    VISION_CACHE_TTL_SECONDS: int = Field(default=86400, env="VISION_CACHE_TTL_SECONDS")
+    
+    # Vision backend: "remote" (VLM), "local" (ONNX CPU classifier) or "auto" (VLM,
+    # falling back to the local model on error or after VISION_REMOTE_BUDGET_MS)
+    VISION_BACKEND: str = Field(default="remote", env="VISION_BACKEND")
+    VISION_REMOTE_BUDGET_MS: float = Field(default=3000.0, env="VISION_REMOTE_BUDGET_MS")
+    VISION_LOCAL_MODEL_PATH: str = Field(default="./models/vision/defect_classifier.onnx", env="VISION_LOCAL_MODEL_PATH")
+    VISION_LOCAL_INPUT_SIZE: int = Field(default=224, env="VISION_LOCAL_INPUT_SIZE")
+    VISION_LOCAL_THRESHOLD: float = Field(default=0.5, env="VISION_LOCAL_THRESHOLD")
+    VISION_LOCAL_THREADS: int = Field(default=0, env="VISION_LOCAL_THREADS")  # 0 = runtime default
+    
+    # Predictive maintenance model registry: how often serving processes poll the
+    # CURRENT / CANDIDATE pointers (0 disables hot reload), and the fraction of live
+    # predictions also scored by the CANDIDATE model for comparison
+    ML_MODEL_RELOAD_SECONDS: float = Field(default=30.0, env="ML_MODEL_RELOAD_SECONDS")
+    ML_SHADOW_SAMPLE_RATE: float = Field(default=0.1, env="ML_SHADOW_SAMPLE_RATE")
+    
     # API Configuration
     MAX_RETRIES: int = Field(default=3, env="MAX_RETRIES")
     REQUEST_TIMEOUT: int = Field(default=30, env="REQUEST_TIMEOUT")
     TEMPERATURE: float = Field(default=0.7, env="TEMPERATURE")
     MAX_TOKENS: int = Field(default=512, env="MAX_TOKENS")
     
+    # Shared HuggingFace inference client: pooled connections, per-model concurrency,
+    # MAX_RETRIES jittered retries within REQUEST_TIMEOUT, and hedging of slow idempotent calls
+    INFERENCE_API_URL: str = Field(default="https://api-inference.huggingface.co/models", env="INFERENCE_API_URL")
+    INFERENCE_MAX_CONNECTIONS: int = Field(default=32, env="INFERENCE_MAX_CONNECTIONS")
+    INFERENCE_KEEPALIVE_SECONDS: float = Field(default=60.0, env="INFERENCE_KEEPALIVE_SECONDS")
+    INFERENCE_MAX_CONCURRENCY_PER_MODEL: int = Field(default=8, env="INFERENCE_MAX_CONCURRENCY_PER_MODEL")
+    INFERENCE_ATTEMPT_TIMEOUT: float = Field(default=12.0, env="INFERENCE_ATTEMPT_TIMEOUT")  # seconds per attempt; connect only for text generation
+    INFERENCE_BACKOFF_BASE_SECONDS: float = Field(default=0.25, env="INFERENCE_BACKOFF_BASE_SECONDS")
+    INFERENCE_BACKOFF_MAX_SECONDS: float = Field(default=4.0, env="INFERENCE_BACKOFF_MAX_SECONDS")
+    INFERENCE_HEDGE_ENABLED: bool = Field(default=True, env="INFERENCE_HEDGE_ENABLED")
+    INFERENCE_HEDGE_PERCENTILE: float = Field(default=95.0, env="INFERENCE_HEDGE_PERCENTILE")
+    INFERENCE_HEDGE_MIN_MS: float = Field(default=1000.0, env="INFERENCE_HEDGE_MIN_MS")
+    
+    # Adaptive (AIMD) concurrency limit on RAG/Report LLM calls; requests beyond
+    # LLM_LIMITER_MAX_QUEUE waiting callers are shed with 503 + Retry-After
+    LLM_LIMITER_ENABLED: bool = Field(default=True, env="LLM_LIMITER_ENABLED")
+    LLM_LIMITER_INITIAL: int = Field(default=8, env="LLM_LIMITER_INITIAL")
+    LLM_LIMITER_MIN: int = Field(default=1, env="LLM_LIMITER_MIN")
+    LLM_LIMITER_MAX: int = Field(default=64, env="LLM_LIMITER_MAX")
+    LLM_LIMITER_MAX_QUEUE: int = Field(default=32, env="LLM_LIMITER_MAX_QUEUE")
+    LLM_LIMITER_QUEUE_TIMEOUT_SECONDS: float = Field(default=5.0, env="LLM_LIMITER_QUEUE_TIMEOUT_SECONDS")
+    LLM_LIMITER_LATENCY_TOLERANCE: float = Field(default=2.0, env="LLM_LIMITER_LATENCY_TOLERANCE")  # x baseline latency
+    
+    # RAG prompt context budget: at most RAG_CONTEXT_MAX_TOKENS, and never more than
+    # LLM_CONTEXT_WINDOW minus the prompt and MAX_TOKENS of generated text
+    LLM_CONTEXT_WINDOW: int = Field(default=4096, env="LLM_CONTEXT_WINDOW")
+    RAG_CONTEXT_MAX_TOKENS: int = Field(default=1536, env="RAG_CONTEXT_MAX_TOKENS")
+    CONTEXT_TOKEN_COUNTER: str = Field(default="tokenizer", env="CONTEXT_TOKEN_COUNTER")  # "tokenizer" or "estimate"
+    
+    # Startup: warm up agents in the background as soon as the app starts
+    WARMUP_ON_STARTUP: bool = Field(default=True, env="WARMUP_ON_STARTUP")
+    
+    # Share one agent run between concurrent identical /v1/diagnose requests
+    DIAGNOSE_COALESCING_ENABLED: bool = Field(default=True, env="DIAGNOSE_COALESCING_ENABLED")
+    
     # ChromaDB Configuration
     CHROMA_HOST: str = Field(default="localhost", env="CHROMA_HOST")
     CHROMA_PORT: int = Field(default=8000, env="CHROMA_PORT")
     CHROMA_PERSIST_DIR: str = Field(default="./chroma_db", env="CHROMA_PERSIST_DIR")
+    
+    # Bulk document ingestion (python -m app.ingestion)
+    INGEST_WORKERS: int = Field(default=4, env="INGEST_WORKERS")  # embedding processes; -1 = all cores
+    INGEST_BATCH_SIZE: int = Field(default=256, env="INGEST_BATCH_SIZE")
+    INGEST_CHUNK_SIZE: int = Field(default=1000, env="INGEST_CHUNK_SIZE")
+    INGEST_CHUNK_OVERLAP: int = Field(default=150, env="INGEST_CHUNK_OVERLAP")
+    INGEST_CSV_ROWS_PER_SECTION: int = Field(default=20, env="INGEST_CSV_ROWS_PER_SECTION")
+    INGEST_CHECKPOINT_PATH: str = Field(default="./chroma_db/ingest_checkpoint.json", env="INGEST_CHECKPOINT_PATH")
+    
+    # RAG retrieval micro-batching (queries within the window share one embed + search)
+    RAG_BATCH_MAX_SIZE: int = Field(default=32, env="RAG_BATCH_MAX_SIZE")
+    RAG_BATCH_MAX_WAIT_MS: float = Field(default=5.0, env="RAG_BATCH_MAX_WAIT_MS")
+    
+    # RAG retrieval: BM25 + vector fusion with an equipment-type pre-filter
+    RETRIEVAL_TOP_K: int = Field(default=3, env="RETRIEVAL_TOP_K")
+    RETRIEVAL_CANDIDATES: int = Field(default=10, env="RETRIEVAL_CANDIDATES")  # per retriever, before fusion
+    RETRIEVAL_HYBRID_ENABLED: bool = Field(default=True, env="RETRIEVAL_HYBRID_ENABLED")
+    RETRIEVAL_BM25_WEIGHT: float = Field(default=1.0, env="RETRIEVAL_BM25_WEIGHT")
+    RETRIEVAL_VECTOR_WEIGHT: float = Field(default=1.0, env="RETRIEVAL_VECTOR_WEIGHT")
+    RETRIEVAL_EQUIPMENT_FILTER: bool = Field(default=True, env="RETRIEVAL_EQUIPMENT_FILTER")
+    
+    # Optional cross-encoder re-ranking: over-fetch RERANK_CANDIDATES, keep RETRIEVAL_TOP_K
+    RERANK_ENABLED: bool = Field(default=False, env="RERANK_ENABLED")
+    RERANK_MODEL_ID: str = Field(default="cross-encoder/ms-marco-MiniLM-L-6-v2", env="RERANK_MODEL_ID")
+    RERANK_CANDIDATES: int = Field(default=20, env="RERANK_CANDIDATES")
+    RERANK_LATENCY_BUDGET_MS: float = Field(default=150.0, env="RERANK_LATENCY_BUDGET_MS")  # 0 = unbounded
+    RERANK_CACHE_MAX_ENTRIES: int = Field(default=10000, env="RERANK_CACHE_MAX_ENTRIES")
+    RERANK_CACHE_TTL_SECONDS: int = Field(default=3600, env="RERANK_CACHE_TTL_SECONDS")
+    
+    # Vector backend: "chroma", or "ann" for an in-process memory-mapped IVF snapshot
+    RETRIEVAL_BACKEND: str = Field(default="chroma", env="RETRIEVAL_BACKEND")
+    ANN_SNAPSHOT_DIR: str = Field(default="./ann_snapshots", env="ANN_SNAPSHOT_DIR")
+    ANN_NLIST: int = Field(default=0, env="ANN_NLIST")  # 0 = about sqrt(number of chunks)
+    ANN_NPROBE: int = Field(default=8, env="ANN_NPROBE")
+    ANN_RELOAD_SECONDS: float = Field(default=30.0, env="ANN_RELOAD_SECONDS")
+    
+    # Semantic cache for RAG guidance (reuses answers for near-identical queries)
+    SEMANTIC_CACHE_ENABLED: bool = Field(default=True, env="SEMANTIC_CACHE_ENABLED")
+    SEMANTIC_CACHE_MAX_DISTANCE: float = Field(default=0.05, env="SEMANTIC_CACHE_MAX_DISTANCE")  # cosine distance
+    SEMANTIC_CACHE_TTL_SECONDS: int = Field(default=3600, env="SEMANTIC_CACHE_TTL_SECONDS")
+    SEMANTIC_CACHE_MAX_ENTRIES: int = Field(default=1024, env="SEMANTIC_CACHE_MAX_ENTRIES")
+    SEMANTIC_CACHE_KB_CHECK_SECONDS: int = Field(default=30, env="SEMANTIC_CACHE_KB_CHECK_SECONDS")
+    
+    # Exact-match LLM completion cache shared by the RAG and Report agents
+    LLM_CACHE_ENABLED: bool = Field(default=True, env="LLM_CACHE_ENABLED")
+    LLM_CACHE_MAX_ENTRIES: int = Field(default=2048, env="LLM_CACHE_MAX_ENTRIES")
+    LLM_CACHE_TTL_SECONDS: int = Field(default=86400, env="LLM_CACHE_TTL_SECONDS")
+    LLM_CACHE_DB_PATH: str = Field(default="", env="LLM_CACHE_DB_PATH")  # empty = memory only
 
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,170 @@
+# app/context_builder.py
+"""
+Token-budgeted context assembly for RAG prompts.
+
+Retrieved chunks are packed into the prompt in relevance order until the token
+budget is used up. Whitespace is normalised, lines already included from an
+earlier (overlapping) chunk are dropped, and a chunk that does not fit whole
+contributes its most query-relevant sentences instead.
+"""
+
+import logging
+import math
+import re
+import textwrap
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence
+
+from .config import settings
+from .retrieval import tokenize
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+TokenCounter = Callable[[str], int]
+
+_SENTENCE_RE = re.compile(r"(?<=[a-z)][.!?])\s+(?=[A-Z])")  # not after "1." step numbers
+_SPACES_RE = re.compile(r"[ \t]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Conservative token estimate (~3.5 characters per token) for when no tokenizer is available."""
+    return math.ceil(len(text) / 3.5) if text else 0
+
+
+@lru_cache(maxsize=1)
+def get_token_counter() -> TokenCounter:
+    """
+    Return a token counter for the configured LLM.
+
+    Uses the model's own tokenizer when ``CONTEXT_TOKEN_COUNTER`` is "tokenizer"
+    and it can be loaded, otherwise ``estimate_tokens``.
+    """
+    if settings.CONTEXT_TOKEN_COUNTER == "tokenizer":
+        try:
+            from transformers import AutoTokenizer
+
+            tokenizer = AutoTokenizer.from_pretrained(settings.LLM_MODEL_ID, token=settings.HUGGINGFACE_TOKEN)
+            logger.info(f"Counting context tokens with the {settings.LLM_MODEL_ID} tokenizer")
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer for {settings.LLM_MODEL_ID} ({e}); estimating tokens")
+    return estimate_tokens
+
+
+def context_budget(prompt_tokens: int) -> int:
+    """
+    Tokens available for retrieved context.
+
+    Args:
+        prompt_tokens: Tokens of the prompt without the context
+
+    Returns:
+        ``RAG_CONTEXT_MAX_TOKENS``, reduced if the prompt plus ``MAX_TOKENS`` of
+        generated text would not fit in ``LLM_CONTEXT_WINDOW``
+    """
+    available = settings.LLM_CONTEXT_WINDOW - settings.MAX_TOKENS - prompt_tokens
+    return max(0, min(settings.RAG_CONTEXT_MAX_TOKENS, available))
+
+
+def normalize_text(text: str) -> str:
+    """Dedent, collapse runs of spaces and drop blank lines."""
+    lines = (_SPACES_RE.sub(" ", line).strip() for line in textwrap.dedent(text).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def split_units(text: str) -> List[str]:
+    """Split normalised text into lines, and long lines into sentences."""
+    units = []
+    for line in text.splitlines():
+        units.extend(part.strip() for part in _SENTENCE_RE.split(line) if part.strip())
+    return units
+
+
+@dataclass
+class Context:
+    """Packed context and what went into it."""
+    text: str = ""
+    tokens: int = 0
+    budget: int = 0
+    sources: List[int] = field(default_factory=list)  # indices of the chunks used
+    truncated: bool = False  # some chunk content was left out to fit the budget
+
+
+def build_context(
+    chunks: Sequence[str],
+    query: str,
+    budget: int,
+    count_tokens: Optional[TokenCounter] = None,
+    separator: str = "\n\n",
+) -> Context:
+    """
+    Pack chunks (best first) into at most ``budget`` tokens.
+
+    Args:
+        chunks: Retrieved chunk texts in relevance order
+        query: The retrieval query, used to rank sentences of partially fitting chunks
+        budget: Maximum context tokens
+        count_tokens: Token counter (defaults to the configured one)
+        separator: Placed between chunks
+
+    Returns:
+        The packed context
+    """
+    count_tokens = count_tokens or get_token_counter()
+    query_terms = set(tokenize(query))
+    separator_tokens = count_tokens(separator)
+    context = Context(budget=budget)
+    parts: List[str] = []
+    seen = set()
+
+    for index, chunk in enumerate(chunks):
+        units = []
+        for unit in split_units(normalize_text(chunk)):
+            key = unit.lower()
+            if key in seen:
+                continue
+            units.append(unit)
+        if not units:
+            continue
+
+        remaining = budget - context.tokens - (separator_tokens if parts else 0)
+        if remaining <= 0:
+            context.truncated = True
+            break
+
+        text = "\n".join(units)
+        tokens = count_tokens(text)
+        if tokens > remaining:
+            text, tokens = _best_units(units, query_terms, remaining, count_tokens)
+            context.truncated = True
+            if not text:
+                continue
+
+        seen.update(unit.lower() for unit in text.splitlines())
+        context.tokens += tokens + (separator_tokens if parts else 0)
+        parts.append(text)
+        context.sources.append(index)
+
+    context.text = separator.join(parts)
+    return context
+
+
+def _best_units(units: List[str], query_terms: set, budget: int, count_tokens: TokenCounter):
+    """Pick the most query-relevant units that fit, kept in document order."""
+    def relevance(position: int) -> float:
+        terms = tokenize(units[position])
+        overlap = len(query_terms.intersection(terms))
+        # The first unit is usually the title / section heading
+        return overlap / math.sqrt(len(terms) or 1) + (0.5 if position == 0 else 0.0)
+
+    chosen = []
+    used = 0
+    newline_tokens = count_tokens("\n")
+    for position in sorted(range(len(units)), key=relevance, reverse=True):
+        cost = count_tokens(units[position]) + (newline_tokens if chosen else 0)
+        if used + cost <= budget:
+            chosen.append(position)
+            used += cost
+    chosen.sort()
+    return "\n".join(units[p] for p in chosen), used
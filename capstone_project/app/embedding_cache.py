@@ -0,0 +1,282 @@
+# app/embedding_cache.py
+"""
+Persistent query-embedding cache shared by all API worker processes.
+
+Problem descriptions repeat ("overheating", "vibration alarm on Press 7"), and
+embedding them is the main CPU cost of a RAG request. Vectors are stored in a
+fixed-size memory-mapped file keyed by a hash of the normalised query text:
+
+- the file is a set-associative table (``ways`` slots per set); a key can only
+  live in the set its hash selects, and the least recently used slot of a full
+  set is overwritten, so the file never grows past ``max_entries`` slots
+- every uvicorn worker maps the same file, so a query embedded by one worker is
+  a hit in all others, and entries survive restarts when the file is on a
+  persistent volume
+- writers take an exclusive ``flock``; readers take a shared one
+
+The header records the embedding model, backend and dimension. A file written
+for a different model or size is replaced rather than served: a fresh file is
+built next to it and renamed over it, because other workers (e.g. the old
+release during a rolling deploy) may still have the old one mapped, and
+truncating a mapped file crashes them with SIGBUS.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+_MAGIC = b"QEMBCACHE1"
+_HEADER_DTYPE = np.dtype([
+    ("magic", "S10"),
+    ("identity", "S32"),
+    ("dim", "<u4"),
+    ("ways", "<u4"),
+    ("sets", "<u4"),
+])
+_HEADER_SIZE = 64
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query used as the cache key."""
+    return _SPACES_RE.sub(" ", text).strip().lower()
+
+
+def query_key(text: str) -> np.ndarray:
+    """128-bit key (two uint64) of the normalised query text."""
+    digest = hashlib.sha256(normalize_query(text).encode("utf-8")).digest()
+    return np.frombuffer(digest[:16], dtype="<u8")
+
+
+def _slot_dtype(dim: int) -> np.dtype:
+    # used == 0 marks an empty slot
+    return np.dtype([("key", "<u8", (2,)), ("used", "<f8"), ("vector", "<f4", (dim,))])
+
+
+class EmbeddingCache:
+    """
+    Fixed-size, memory-mapped LRU cache of float32 vectors keyed by query text.
+    """
+
+    def __init__(self, path: str, dim: int, identity: str, max_entries: int = 20000, ways: int = 8):
+        """
+        Args:
+            path: Cache file (created if missing)
+            dim: Embedding dimension
+            identity: Model/backend identifier; a file written for another identity is replaced
+            max_entries: Capacity, rounded up to a multiple of ``ways``
+            ways: Slots per set (LRU eviction happens within a set)
+        """
+        self.path = path
+        self.dim = dim
+        self.identity = hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32].encode("ascii")
+        self.ways = max(1, ways)
+        self.sets = max(1, -(-max_entries // self.ways))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._fd = self._open_locked()
+        try:
+            self._open()
+        finally:
+            self._unlock()
+
+    def _open_locked(self) -> int:
+        """Open the cache file with an exclusive lock on the file currently at ``path``."""
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is None:
+                return fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            # Another process may have replaced the file while we waited for the lock
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(fd)
+            if current is not None and (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                return fd
+            os.close(fd)
+
+    def _open(self) -> None:
+        slot_dtype = _slot_dtype(self.dim)
+        size = _HEADER_SIZE + self.sets * self.ways * slot_dtype.itemsize
+        header = np.zeros(1, dtype=_HEADER_DTYPE)
+        header[0] = (_MAGIC, self.identity, self.dim, self.ways, self.sets)
+
+        current = os.pread(self._fd, _HEADER_DTYPE.itemsize, 0)
+        existing_size = os.fstat(self._fd).st_size
+        if not existing_size:
+            # A new file: nobody can have mapped it before it had a valid header
+            os.ftruncate(self._fd, size)
+            os.pwrite(self._fd, header.tobytes(), 0)
+        elif current != header.tobytes() or existing_size != size:
+            logger.info(f"Replacing query-embedding cache {self.path} (model or size changed)")
+            self._replace(header.tobytes(), size)
+
+        with os.fdopen(os.dup(self._fd), "r+b") as f:
+            self._slots = np.memmap(
+                f, dtype=slot_dtype, mode="r+", offset=_HEADER_SIZE, shape=(self.sets, self.ways)
+            )
+
+    def _replace(self, header: bytes, size: int) -> None:
+        """Swap in a fresh file; processes mapping the old one keep a valid mapping."""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, size)
+            os.pwrite(fd, header, 0)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.close(fd)
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+        # Keep holding the lock, now on the new file
+        self._unlock()
+        os.close(self._fd)
+        self._fd = fd
+
+    # ------------------------------------------------------------------------
+    # Locking
+    # ------------------------------------------------------------------------
+
+    def _flock(self, exclusive: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def _unlock(self) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------------
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """
+        Look up the cached vectors of several queries.
+
+        Returns:
+            One vector (a copy) or None per text, in order
+        """
+        keys = [query_key(text) for text in texts]
+        results: List[Optional[np.ndarray]] = []
+        now = time.time()
+        with self._lock:
+            self._flock(exclusive=False)
+            try:
+                for key in keys:
+                    ways = self._slots[int(key[0] % self.sets)]
+                    match = np.flatnonzero((ways["used"] > 0) & (ways["key"] == key).all(axis=1))
+                    if len(match):
+                        results.append(np.array(ways["vector"][match[0]]))
+                        # Recency is advisory: a racing writer can at worst evict this entry early
+                        ways["used"][match[0]] = now
+                        self.hits += 1
+                    else:
+                        results.append(None)
+                        self.misses += 1
+            finally:
+                self._unlock()
+        return results
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """Store vectors for queries, evicting the least recently used slot of full sets."""
+        now = time.time()
+        with self._lock:
+            self._flock(exclusive=True)
+            try:
+                for text, vector in zip(texts, vectors):
+                    key = query_key(text)
+                    ways = self._slots[int(key[0] % self.sets)]
+                    match = np.flatnonzero((ways["used"] > 0) & (ways["key"] == key).all(axis=1))
+                    if len(match):
+                        way = match[0]
+                    else:
+                        way = int(np.argmin(ways["used"]))
+                        if ways["used"][way] > 0:
+                            self.evictions += 1
+                    ways["vector"][way] = np.asarray(vector, dtype=np.float32)
+                    ways["key"][way] = key
+                    ways["used"][way] = now
+            finally:
+                self._unlock()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Return the cached vector of one query, or None."""
+        return self.get_many([text])[0]
+
+    def put(self, text: str, vector: Sequence[float]) -> None:
+        """Store the vector of one query."""
+        self.put_many([text], [vector])
+
+    def __len__(self) -> int:
+        return int((self._slots["used"] > 0).sum())
+
+    def stats(self) -> Dict[str, Any]:
+        """Return this process's hit/miss counters and the shared entry count."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "capacity": self.sets * self.ways,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self) -> None:
+        """Flush and release the mapping."""
+        self._slots.flush()
+        del self._slots
+        os.close(self._fd)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding model with an ``EmbeddingCache``.
+
+    Only texts that miss the cache are sent to the model, as one batch. Use it for
+    queries; document chunks are embedded once at ingestion and never repeat.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            # Embed each distinct missing text once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            self.cache.put_many(unique, [vectors[text] for text in unique])
+            for i in missing:
+                cached[i] = vectors[texts[i]]
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in cached]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
@@ -0,0 +1,232 @@
+# app/embeddings.py
+"""
+Pluggable embedding backends for the RAG knowledge base.
+
+``EMBEDDING_BACKEND`` selects how ``EMBEDDING_MODEL_ID`` is run on CPU:
+
+- ``torch``:      full-precision sentence-transformers model (the original setup)
+- ``torch-int8``: the same model with dynamically quantized int8 Linear layers
+- ``onnx``:       ONNX Runtime export of the model
+- ``onnx-int8``:  ONNX Runtime export with dynamically quantized int8 weights
+
+ONNX exports are created once under ``EMBEDDING_ONNX_DIR`` and reused by every
+process (API workers, ingestion workers). All backends produce the same
+embedding space as ``torch`` within quantization error, so an index built with
+one can be queried with another; run ``scripts/benchmark_embeddings.py`` to
+check parity and throughput on the target hardware.
+"""
+
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import List, Optional
+from uuid import uuid4
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+
+def build_embeddings(
+    backend: Optional[str] = None,
+    model_id: Optional[str] = None,
+    threads: Optional[int] = None,
+) -> Embeddings:
+    """
+    Create the embedding model for the configured backend.
+
+    Args:
+        backend: One of BACKENDS (defaults to EMBEDDING_BACKEND)
+        model_id: Sentence-transformers model (defaults to EMBEDDING_MODEL_ID)
+        threads: CPU threads for inference (defaults to EMBEDDING_THREADS; 0 = runtime default)
+
+    Returns:
+        A LangChain ``Embeddings`` implementation
+    """
+    backend = backend or settings.EMBEDDING_BACKEND
+    model_id = model_id or settings.EMBEDDING_MODEL_ID
+    threads = settings.EMBEDDING_THREADS if threads is None else threads
+    if threads:
+        _set_torch_threads(threads)
+    logger.info(f"Loading {backend} embeddings for {model_id}")
+
+    if backend == "torch":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=model_id, model_kwargs={'device': 'cpu'})
+    if backend == "torch-int8":
+        return QuantizedTorchEmbeddings(model_id)
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(model_id, quantize=backend == "onnx-int8", threads=threads)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND {backend!r}; expected one of {BACKENDS}")
+
+
+def _set_torch_threads(threads: int) -> None:
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+# ============================================================================
+# PyTorch int8
+# ============================================================================
+
+class QuantizedTorchEmbeddings(Embeddings):
+    """sentence-transformers model with int8 dynamic quantization of its Linear layers."""
+
+    def __init__(self, model_id: str, batch_size: int = 64):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_id, device="cpu")
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(texts, batch_size=self.batch_size, show_progress_bar=False).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# ============================================================================
+# ONNX Runtime
+# ============================================================================
+
+def _mean_pool(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """Average token embeddings over non-padding positions."""
+    mask = attention_mask[..., None].astype(hidden.dtype)
+    return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+def _export_dir(model_id: str, quantize: bool) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_id)
+    return Path(settings.EMBEDDING_ONNX_DIR) / (slug + ("-int8" if quantize else ""))
+
+
+def export_onnx(model_id: str, quantize: bool = False) -> Path:
+    """
+    Export ``model_id`` to ONNX (optionally int8-quantized) unless already exported.
+
+    The export is written to a temporary directory and renamed into place, so
+    processes starting concurrently never load a partial export.
+
+    Returns:
+        Directory containing ``model.onnx`` and the tokenizer files
+    """
+    target = _export_dir(model_id, quantize)
+    if (target / "model.onnx").exists():
+        return target
+
+    if quantize:
+        source = export_onnx(model_id, quantize=False)
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp = target.with_name(f".{target.name}.{uuid4().hex}")
+        shutil.copytree(source, tmp)
+        os.remove(tmp / "model.onnx")
+        quantize_dynamic(str(source / "model.onnx"), str(tmp / "model.onnx"), weight_type=QuantType.QInt8)
+    else:
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+        except ImportError as e:
+            raise ImportError(
+                "Exporting embeddings to ONNX requires optimum: pip install 'optimum[onnxruntime]'"
+            ) from e
+        from transformers import AutoTokenizer
+
+        tmp = target.with_name(f".{target.name}.{uuid4().hex}")
+        logger.info(f"Exporting {model_id} to ONNX in {target}")
+        ORTModelForFeatureExtraction.from_pretrained(model_id, export=True).save_pretrained(tmp)
+        AutoTokenizer.from_pretrained(model_id).save_pretrained(tmp)
+
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # Another process finished the same export first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    ONNX Runtime inference of a sentence-transformers model (mean pooling).
+
+    Texts are sorted by length before batching so each batch pads to a similar
+    length, then returned in the original order.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        quantize: bool = False,
+        batch_size: int = 64,
+        max_length: int = 256,
+        normalize: Optional[bool] = None,
+        threads: Optional[int] = None,
+        model_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            model_id: Sentence-transformers model to export/load
+            quantize: Use the int8 dynamically quantized export
+            batch_size: Texts per inference call
+            max_length: Tokens per text (longer texts are truncated)
+            normalize: L2-normalise outputs (defaults to EMBEDDING_NORMALIZE)
+            threads: Intra-op threads (defaults to EMBEDDING_THREADS; 0 = ORT default)
+            model_dir: Use an existing export instead of EMBEDDING_ONNX_DIR
+        """
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = Path(model_dir) if model_dir else export_onnx(model_id, quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = settings.EMBEDDING_THREADS if threads is None else threads
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(path / "model.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path))
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.normalize = settings.EMBEDDING_NORMALIZE if normalize is None else normalize
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.zeros((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            positions = order[start:start + self.batch_size]
+            batch = self._encode([texts[i] for i in positions])
+            if vectors.shape[1] == 0:
+                vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[positions] = batch
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+        )
+        feed = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        pooled = _mean_pool(hidden, inputs["attention_mask"])
+        if self.normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
@@ -0,0 +1,43 @@
+# app/imaging.py
+"""
+Image preprocessing for the Vision agent.
+
+Decoding and resizing are CPU-bound and run on a worker thread pool (Pillow
+releases the GIL while decoding and resampling), never on the event loop.
+"""
+
+import io
+
+
+def preprocess_image(data: bytes, max_size: int = 512, quality: int = 90) -> bytes:
+    """
+    Decode an uploaded image, downscale it and re-encode it as JPEG.
+
+    VLMs resize inputs to a few hundred pixels anyway, so sending a 12 MP phone
+    photo only costs upload time and endpoint decode time.
+
+    Args:
+        data: Encoded image (JPEG, PNG, WebP, ...)
+        max_size: Longest side in pixels after resizing (aspect ratio kept)
+        quality: JPEG quality of the re-encoded image
+
+    Returns:
+        JPEG bytes
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # draft() lets the JPEG decoder skip straight to a reduced scale
+            image.draft("RGB", (max_size, max_size))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            image.thumbnail((max_size, max_size), Image.BILINEAR)
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=quality)
+            return output.getvalue()
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError(f"Not a decodable image: {e}") from e
+
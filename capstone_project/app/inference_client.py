@@ -0,0 +1,445 @@
+# app/inference_client.py
+"""
+Shared async client for the HuggingFace Inference API.
+
+One ``httpx.AsyncClient`` with keep-alive connection pooling serves the Vision,
+RAG and Report agents. On top of it:
+
+- a semaphore per model bounds concurrent requests to each endpoint
+- failed attempts (connection errors, timeouts, 429 and 5xx) are retried up to
+  ``MAX_RETRIES`` times with jittered exponential backoff, honouring Retry-After
+- each attempt gets ``INFERENCE_ATTEMPT_TIMEOUT`` seconds, and the whole call
+  ``REQUEST_TIMEOUT``, so one stalled response is retried instead of holding
+  the request for the full timeout
+- text generation is not idempotent (a long completion is slow, not stalled,
+  and every attempt is billed): only connecting is bounded per attempt, the
+  response may take until the deadline, and read timeouts are not retried
+- idempotent calls are hedged: when an attempt is slower than the recent p95
+  latency of calls to the same model with the same ``max_new_tokens``, a second
+  identical request is sent and the first response wins. Text generation and
+  streaming are never hedged
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+# Statuses with which an endpoint rejects a JSON list of images (e.g. the serverless API)
+BATCH_REJECTED_STATUS = {400, 413, 415, 422}
+
+# Failures where the request never reached the model, safe to retry for any call
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class InferenceError(RuntimeError):
+    """An inference request failed after all retries."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class InferenceClient:
+    """
+    Connection-pooled, retrying and hedging client for HuggingFace model endpoints.
+
+    The underlying ``httpx.AsyncClient`` and per-model semaphores are created on
+    first use in the running event loop, so the client can be built on the
+    warm-up thread and shared by all agents.
+    """
+
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        max_retries: Optional[int] = None,
+        request_timeout: Optional[float] = None,
+        attempt_timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_concurrency_per_model: Optional[int] = None,
+        hedge_enabled: Optional[bool] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            base_url: Inference API root; model IDs are appended (defaults to INFERENCE_API_URL)
+            token: HuggingFace token (defaults to HUGGINGFACE_TOKEN)
+            max_retries: Retries after the first attempt (defaults to MAX_RETRIES)
+            request_timeout: Deadline for a whole call in seconds (defaults to REQUEST_TIMEOUT)
+            attempt_timeout: Timeout of a single attempt (defaults to INFERENCE_ATTEMPT_TIMEOUT)
+            max_connections: Connection pool size (defaults to INFERENCE_MAX_CONNECTIONS)
+            max_concurrency_per_model: In-flight requests per model (defaults to INFERENCE_MAX_CONCURRENCY_PER_MODEL)
+            hedge_enabled: Send hedged requests for slow attempts (defaults to INFERENCE_HEDGE_ENABLED)
+            transport: Custom httpx transport (for tests)
+        """
+        self.base_url = (base_url or settings.INFERENCE_API_URL).rstrip("/")
+        self.token = token if token is not None else settings.HUGGINGFACE_TOKEN
+        self.max_retries = settings.MAX_RETRIES if max_retries is None else max_retries
+        self.request_timeout = request_timeout or settings.REQUEST_TIMEOUT
+        self.attempt_timeout = attempt_timeout or settings.INFERENCE_ATTEMPT_TIMEOUT
+        self.max_connections = max_connections or settings.INFERENCE_MAX_CONNECTIONS
+        self.max_concurrency_per_model = max_concurrency_per_model or settings.INFERENCE_MAX_CONCURRENCY_PER_MODEL
+        self.hedge_enabled = settings.INFERENCE_HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.transport = transport
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # Latencies per (model_id, max_new_tokens): output length dominates call time
+        self._latencies: Dict[Tuple[str, Optional[int]], Deque[float]] = {}
+        self._unbatched_models: set = set()
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # ------------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------------
+
+    async def text_generation(self, model_id: str, prompt: str, **parameters: Any) -> str:
+        """
+        Generate text for ``prompt``.
+
+        Args:
+            model_id: Text-generation model
+            prompt: Fully formatted prompt
+            **parameters: Generation parameters (temperature, max_new_tokens, ...)
+
+        Returns:
+            The generated text (without the prompt)
+        """
+        payload = {"inputs": prompt, "parameters": {**parameters, "return_full_text": False}}
+        data = await self.post_json(model_id, idempotent=False, json=payload)
+        return _generated_text(data)
+
+    async def stream_text_generation(self, model_id: str, prompt: str, **parameters: Any) -> AsyncIterator[str]:
+        """
+        Stream generated text chunks (server-sent events).
+
+        Connection failures and retryable statuses are retried until the first
+        chunk arrives; after that an error is raised, since the caller has
+        already consumed part of the output. As for ``text_generation``, a
+        read timeout is never retried.
+        """
+        payload = {"inputs": prompt, "parameters": {**parameters, "return_full_text": False}, "stream": True}
+        client, semaphore = self._state(model_id)
+        deadline = time.monotonic() + self.request_timeout
+
+        streamed = False
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with client.stream(
+                        "POST", self._url(model_id), json=payload, timeout=self._timeout(deadline, idempotent=False)
+                    ) as response:
+                        _raise_for_status(response.status_code, response.headers, await _peek_error(response))
+                        async for line in response.aiter_lines():
+                            text = _sse_token(line)
+                            if text:
+                                streamed = True
+                                yield text
+                        return
+                except (_RetryableError, httpx.TransportError) as e:
+                    if streamed:
+                        raise InferenceError(f"{model_id} stream interrupted: {e}") from e
+                    _raise_if_unsafe_to_retry(model_id, e, idempotent=False)
+                    await self._backoff(model_id, attempt, deadline, e)
+
+    async def image_to_text(self, model_id: str, image: bytes) -> str:
+        """Caption or describe an image with a vision-language model."""
+        data = await self.post_json(model_id, content=image, headers={"Content-Type": "application/octet-stream"})
+        return _generated_text(data)
+
+    async def image_to_text_batch(self, model_id: str, images: List[bytes]) -> List[str]:
+        """
+        Describe several images in one request.
+
+        Sends base64-encoded images as a JSON ``inputs`` list, which dedicated
+        Inference Endpoints (pipeline handlers) accept; a single image is sent
+        as raw bytes, which the serverless API also accepts. If the endpoint
+        rejects the list, the images are sent one per call, now and for every
+        later batch to that model.
+
+        Returns:
+            One description per image, in order
+        """
+        if len(images) == 1 or model_id in self._unbatched_models:
+            return list(await asyncio.gather(*[self.image_to_text(model_id, image) for image in images]))
+        payload = {"inputs": [base64.b64encode(image).decode("ascii") for image in images]}
+        try:
+            data = await self.post_json(model_id, json=payload)
+        except InferenceError as e:
+            if e.status_code not in BATCH_REJECTED_STATUS:
+                raise
+            self._unbatched_models.add(model_id)
+            logger.warning(f"{model_id} rejected a batch of {len(images)} images ({e}); sending one image per call")
+            return list(await asyncio.gather(*[self.image_to_text(model_id, image) for image in images]))
+        if not isinstance(data, list) or len(data) != len(images):
+            raise InferenceError(f"{model_id} returned {type(data).__name__} for a batch of {len(images)} images")
+        return [_generated_text(item) for item in data]
+
+    async def post_json(self, model_id: str, idempotent: bool = True, **request: Any) -> Any:
+        """
+        POST to a model endpoint with retries and hedging, and decode the JSON response.
+
+        Args:
+            model_id: Model to call
+            idempotent: False for generation: the response may take until the
+                deadline, a read timeout is not retried and the call is not hedged
+            **request: ``httpx`` request arguments (``json``, ``content``, ``headers``)
+
+        Returns:
+            Decoded response body
+        """
+        client, semaphore = self._state(model_id)
+        deadline = time.monotonic() + self.request_timeout
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self._hedged(client, semaphore, model_id, deadline, idempotent, request)
+                except (_RetryableError, httpx.TransportError) as e:
+                    _raise_if_unsafe_to_retry(model_id, e, idempotent)
+                    await self._backoff(model_id, attempt, deadline, e)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry/hedge counters and the hedge delay per model."""
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": {
+                model_id if max_new_tokens is None else f"{model_id}:{max_new_tokens}": round(delay * 1000)
+                for (model_id, max_new_tokens), delay in ((k, self._hedge_delay(k)) for k in self._latencies)
+                if delay is not None
+            },
+        }
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ------------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------------
+
+    def _state(self, model_id: str):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # First use, or a new event loop (e.g. a test client): start a fresh pool
+            self._loop = loop
+            self._semaphores = {}
+            self._client = httpx.AsyncClient(
+                headers={"Authorization": f"Bearer {self.token}"} if self.token else {},
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=settings.INFERENCE_KEEPALIVE_SECONDS,
+                ),
+                timeout=self.attempt_timeout,
+                transport=self.transport,
+            )
+        if model_id not in self._semaphores:
+            self._semaphores[model_id] = asyncio.Semaphore(self.max_concurrency_per_model)
+        return self._client, self._semaphores[model_id]
+
+    def _url(self, model_id: str) -> str:
+        return f"{self.base_url}/{model_id}"
+
+    def _timeout(self, deadline: float, idempotent: bool = True) -> httpx.Timeout:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise InferenceError(f"Inference deadline of {self.request_timeout}s exceeded")
+        attempt = min(self.attempt_timeout, remaining)
+        if idempotent:
+            return httpx.Timeout(attempt)
+        # Generation time grows with max_new_tokens; only connecting is bounded per attempt
+        return httpx.Timeout(remaining, connect=attempt, pool=attempt)
+
+    async def _attempt(
+        self, client: httpx.AsyncClient, model_id: str, deadline: float, idempotent: bool, request: dict
+    ) -> Any:
+        started = time.monotonic()
+        response = await client.post(self._url(model_id), timeout=self._timeout(deadline, idempotent), **request)
+        _raise_for_status(response.status_code, response.headers, response.text)
+        self._latencies.setdefault(_latency_key(model_id, request), deque(maxlen=200)).append(
+            time.monotonic() - started
+        )
+        return response.json()
+
+    async def _hedged(
+        self,
+        client: httpx.AsyncClient,
+        semaphore: asyncio.Semaphore,
+        model_id: str,
+        deadline: float,
+        idempotent: bool,
+        request: dict,
+    ) -> Any:
+        primary = asyncio.ensure_future(self._attempt(client, model_id, deadline, idempotent, request))
+        # A duplicate generation would be billed twice and is slow, not stalled
+        delay = self._hedge_delay(_latency_key(model_id, request)) if self.hedge_enabled and idempotent else None
+        if delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        # A hedge needs a free slot; never let hedges starve first attempts
+        if done or semaphore.locked():
+            return await primary
+
+        async with semaphore:
+            self.hedges += 1
+            hedge = asyncio.ensure_future(self._attempt(client, model_id, deadline, idempotent, request))
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is hedge:
+                                self.hedge_wins += 1
+                            return task.result()
+                        error = task.exception()
+                raise error
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    def _hedge_delay(self, key: Tuple[str, Optional[int]]) -> Optional[float]:
+        """Seconds to wait before hedging: the recent latency percentile, once enough samples exist."""
+        latencies = self._latencies.get(key)
+        if not latencies or len(latencies) < 20:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * settings.INFERENCE_HEDGE_PERCENTILE / 100))
+        return max(settings.INFERENCE_HEDGE_MIN_MS / 1000, ordered[index])
+
+    async def _backoff(self, model_id: str, attempt: int, deadline: float, error: Exception) -> None:
+        status_code = getattr(error, "status_code", None)
+        if attempt >= self.max_retries:
+            raise InferenceError(
+                f"{model_id} failed after {attempt + 1} attempts: {error}", status_code=status_code
+            ) from error
+
+        # Full jitter: uniform over [0, base * 2^attempt], capped
+        delay = random.uniform(0, min(settings.INFERENCE_BACKOFF_MAX_SECONDS,
+                                      settings.INFERENCE_BACKOFF_BASE_SECONDS * 2 ** attempt))
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if time.monotonic() + delay >= deadline:
+            raise InferenceError(f"{model_id} failed and no time is left to retry: {error}", status_code=status_code) from error
+
+        self.retries += 1
+        logger.warning(f"Inference call to {model_id} failed ({error}); retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+
+def _latency_key(model_id: str, request: dict) -> Tuple[str, Optional[int]]:
+    parameters = (request.get("json") or {}).get("parameters") or {}
+    return model_id, parameters.get("max_new_tokens")
+
+
+def _raise_if_unsafe_to_retry(model_id: str, error: Exception, idempotent: bool) -> None:
+    # A generation request that may have reached the model is not sent again
+    if idempotent or isinstance(error, (_RetryableError, *NOT_SENT_ERRORS)):
+        return
+    raise InferenceError(f"{model_id} generation failed and is not retried: {error!r}") from error
+
+
+def _raise_for_status(status_code: int, headers: httpx.Headers, body: str) -> None:
+    if status_code < 400:
+        return
+    message = f"HTTP {status_code}: {body[:200]}"
+    if status_code in RETRYABLE_STATUS:
+        raise _RetryableError(message, retry_after=_retry_after(headers, body), status_code=status_code)
+    raise InferenceError(message, status_code=status_code)
+
+
+def _retry_after(headers: httpx.Headers, body: str) -> Optional[float]:
+    value = headers.get("Retry-After")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    # HuggingFace reports the remaining load time of a cold model in the body
+    try:
+        estimated = json.loads(body).get("estimated_time")
+        return float(estimated) if estimated is not None else None
+    except (ValueError, AttributeError, TypeError):
+        return None
+
+
+async def _peek_error(response: httpx.Response) -> str:
+    if response.status_code < 400:
+        return ""
+    await response.aread()
+    return response.text
+
+
+def _sse_token(line: str) -> str:
+    if not line.startswith("data:"):
+        return ""
+    try:
+        event = json.loads(line[len("data:"):])
+    except ValueError:
+        return ""
+    token = event.get("token") or {}
+    return "" if token.get("special") else token.get("text", "")
+
+
+def _generated_text(data: Any) -> str:
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    if isinstance(data, dict):
+        if "error" in data:
+            raise InferenceError(str(data["error"]))
+        return data.get("generated_text", "")
+    return str(data)
+
+
+# ============================================================================
+# SHARED INSTANCE
+# ============================================================================
+
+_client: Optional[InferenceClient] = None
+_client_lock = threading.Lock()
+
+
+def get_inference_client() -> InferenceClient:
+    """Return the process-wide inference client shared by all agents."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = InferenceClient()
+        return _client
+
+
+async def close_inference_client() -> None:
+    """Close the shared client's connections (on application shutdown)."""
+    if _client is not None:
+        await _client.aclose()
@@ -0,0 +1,594 @@
+# app/ingestion.py
+"""
+Bulk ingestion of maintenance documentation into the RAG knowledge base.
+
+Streams SOP manuals (PDF), bulletins (HTML), maintenance logs (CSV) and plain
+text files, splits them into chunks, embeds the chunks in large batches across
+a process pool and bulk-upserts them into the ``manufacturing_docs`` Chroma
+collection. Progress is checkpointed per file, so an interrupted run resumes
+where it stopped; chunk IDs are deterministic, so re-processing a partially
+ingested file overwrites its chunks instead of duplicating them.
+
+Re-ingestion is incremental: every chunk stores a ``content_hash`` in its
+metadata, and only new or changed chunks are embedded. Chunks whose text moved
+to a different position reuse their stored embedding, chunks that no longer
+exist are deleted, and files that were removed from disk are pruned.
+
+Usage:
+    python -m app.ingestion data/sop_manuals data/bulletins data/logs
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from .config import settings
+from .knowledge_base import (
+    COLLECTION_NAME,
+    GENERIC_EQUIPMENT_TYPE,
+    infer_equipment_type,
+    mark_collection_changed,
+)
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+# (text, extra metadata) for one page, bulletin or block of log rows
+Section = Tuple[str, Dict[str, Any]]
+
+
+# ============================================================================
+# Streaming Loaders
+# ============================================================================
+
+def load_pdf(path: Path) -> Iterator[Section]:
+    """Yield the text of a PDF one page at a time."""
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise ImportError("PDF ingestion requires pypdf: pip install pypdf") from e
+
+    reader = PdfReader(str(path))
+    for page_number, page in enumerate(reader.pages, start=1):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield text, {"page": page_number}
+
+
+class _TextExtractor(HTMLParser):
+    """Collect visible text from an HTML document."""
+
+    _SKIP_TAGS = {"script", "style", "head", "noscript"}
+    _BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts: List[str] = []
+        self.title = ""
+        self._skip_depth = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag in self._SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self._BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in self._SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self._BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip_depth:
+            self.parts.append(data)
+
+
+def load_html(path: Path) -> Iterator[Section]:
+    """Yield the visible text of an HTML bulletin."""
+    extractor = _TextExtractor()
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for block in iter(lambda: f.read(64 * 1024), ""):
+            extractor.feed(block)
+    extractor.close()
+
+    lines = (line.strip() for line in "".join(extractor.parts).splitlines())
+    text = "\n".join(line for line in lines if line)
+    if text:
+        metadata = {"title": extractor.title.strip()} if extractor.title.strip() else {}
+        yield text, metadata
+
+
+def load_csv(path: Path, rows_per_section: Optional[int] = None) -> Iterator[Section]:
+    """
+    Yield maintenance log rows in blocks.
+
+    Each row is rendered as ``column: value`` lines; rows are grouped so that a
+    50-column log does not turn into one tiny chunk per row.
+    """
+    rows_per_section = rows_per_section or settings.INGEST_CSV_ROWS_PER_SECTION
+    with open(path, newline="", encoding="utf-8", errors="replace") as f:
+        reader = csv.DictReader(f)
+        block: List[str] = []
+        first_row = 1
+        for row_number, row in enumerate(reader, start=1):
+            block.append("\n".join(f"{key}: {value}" for key, value in row.items() if value))
+            if len(block) >= rows_per_section:
+                yield "\n\n".join(block), {"rows": f"{first_row}-{row_number}"}
+                block, first_row = [], row_number + 1
+        if block:
+            yield "\n\n".join(block), {"rows": f"{first_row}-{first_row + len(block) - 1}"}
+
+
+def load_text(path: Path) -> Iterator[Section]:
+    """Yield the contents of a plain text or Markdown file."""
+    text = path.read_text(encoding="utf-8", errors="replace")
+    if text.strip():
+        yield text, {}
+
+
+LOADERS: Dict[str, Callable[[Path], Iterator[Section]]] = {
+    ".pdf": load_pdf,
+    ".html": load_html,
+    ".htm": load_html,
+    ".csv": load_csv,
+    ".txt": load_text,
+    ".md": load_text,
+}
+
+
+def iter_source_files(paths: Iterable[str]) -> Iterator[Path]:
+    """Yield supported files under the given files/directories in a stable order."""
+    for raw_path in paths:
+        path = Path(raw_path)
+        if path.is_dir():
+            for child in sorted(path.rglob("*")):
+                if child.is_file() and child.suffix.lower() in LOADERS:
+                    yield child
+        elif path.is_file() and path.suffix.lower() in LOADERS:
+            yield path
+        else:
+            logger.warning(f"Skipping unsupported or missing path: {path}")
+
+
+# ============================================================================
+# Embedding Workers
+# ============================================================================
+
+_worker_embeddings = None
+
+
+def _load_embeddings(model_id: str, threads: Optional[int] = None):
+    """Load the embedding model used for the knowledge base (EMBEDDING_BACKEND)."""
+    from .embeddings import build_embeddings
+
+    return build_embeddings(model_id=model_id, threads=threads)
+
+
+def _init_embedding_worker(model_id: str, threads: int) -> None:
+    """Process pool initializer: load the model once per worker."""
+    global _worker_embeddings
+    # N workers x all cores each would oversubscribe the CPU
+    _worker_embeddings = _load_embeddings(model_id, threads)
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    """Embed one batch of chunk texts in a worker."""
+    return _worker_embeddings.embed_documents(texts)
+
+
+class _InlineExecutor:
+    """Runs embedding batches in the calling process (``workers=0``)."""
+
+    def __init__(self, model_id: str):
+        self._embeddings = _load_embeddings(model_id)
+
+    def submit(self, fn, texts):
+        future: Future = Future()
+        try:
+            future.set_result(self._embeddings.embed_documents(texts))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        pass
+
+
+# ============================================================================
+# Checkpointing
+# ============================================================================
+
+class IngestionCheckpoint:
+    """
+    JSON record of files that have been fully ingested.
+
+    A file is skipped on the next run if its size and modification time are
+    unchanged. Writes go to a temporary file that is renamed into place, so a
+    crash never leaves a truncated checkpoint.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.files: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            try:
+                self.files = json.loads(self.path.read_text()).get("files", {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+
+    @staticmethod
+    def _signature(path: Path) -> Dict[str, Any]:
+        stat = path.stat()
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def is_done(self, path: Path) -> bool:
+        entry = self.files.get(str(path))
+        return entry is not None and all(
+            entry.get(key) == value for key, value in self._signature(path).items()
+        )
+
+    def mark_done(self, path: Path, chunks: int) -> None:
+        self.files[str(path)] = {**self._signature(path), "chunks": chunks}
+
+    def remove(self, source: str) -> None:
+        self.files.pop(source, None)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps({"files": self.files}, indent=2))
+        os.replace(tmp_path, self.path)
+
+
+# ============================================================================
+# Pipeline
+# ============================================================================
+
+@dataclass
+class _Batch:
+    ids: List[str] = field(default_factory=list)
+    texts: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    files: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class IngestionStats:
+    files: int = 0
+    skipped_files: int = 0
+    failed_files: int = 0
+    removed_files: int = 0
+    chunks: int = 0  # embedded and upserted
+    unchanged_chunks: int = 0
+    reused_chunks: int = 0  # upserted with a stored embedding
+    deleted_chunks: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.chunks or self.reused_chunks or self.deleted_chunks)
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else 0.0
+
+
+def content_hash(text: str) -> str:
+    """Return the hash stored with a chunk to detect changed content."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def source_key(source: str) -> str:
+    """Return the short hash of a source path used in its chunk IDs."""
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+
+
+class IngestionPipeline:
+    """
+    Stream documents into the knowledge base.
+
+    Chunking happens in the calling process while up to ``2 * workers`` embedding
+    batches run in the pool; finished batches are upserted in submission order.
+    A file is checkpointed once all of its batches have been upserted.
+
+    Each changed file is diffed against the chunks already stored for it, so
+    only new or changed text is sent to the embedding workers.
+    """
+
+    def __init__(
+        self,
+        collection,
+        checkpoint_path: Optional[str] = None,
+        workers: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        embedding_model_id: Optional[str] = None,
+    ):
+        """
+        Args:
+            collection: Chroma collection to upsert into
+            checkpoint_path: JSON checkpoint file (defaults to INGEST_CHECKPOINT_PATH)
+            workers: Embedding processes; 0 embeds in this process
+            batch_size: Chunks per embedding batch / upsert
+            chunk_size: Characters per chunk
+            chunk_overlap: Characters of overlap between consecutive chunks
+            embedding_model_id: Must match the model used by the RAG agent
+        """
+        self.collection = collection
+        self.checkpoint = IngestionCheckpoint(checkpoint_path or settings.INGEST_CHECKPOINT_PATH)
+        self.workers = settings.INGEST_WORKERS if workers is None else workers
+        if self.workers < 0:
+            self.workers = os.cpu_count() or 1
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.embedding_model_id = embedding_model_id or settings.EMBEDDING_MODEL_ID
+        self.splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size or settings.INGEST_CHUNK_SIZE,
+            chunk_overlap=settings.INGEST_CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+        )
+
+        self.stats = IngestionStats()
+        self._pending: Deque[Tuple[Future, _Batch]] = deque()
+        self._outstanding: Dict[str, int] = {}  # file -> batches not yet upserted
+        self._chunked: Dict[str, int] = {}  # fully chunked files -> chunk count
+
+    def _create_executor(self):
+        if self.workers == 0:
+            return _InlineExecutor(self.embedding_model_id)
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_embedding_worker,
+            initargs=(self.embedding_model_id, threads),
+        )
+
+    def iter_chunks(self, path: Path) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Yield ``(chunk_id, text, metadata)`` for every chunk of a file.
+
+        Chunk IDs are ``{doc_id}-{source_key}:{chunk_index}``, stable across
+        runs. The source key keeps files that share a stem (``safety.pdf`` and
+        ``safety.html``, ``a/manual.txt`` and ``b/manual.txt``) from
+        overwriting each other's chunks.
+        """
+        loader = LOADERS[path.suffix.lower()]
+        doc_id = path.stem
+        prefix = f"{doc_id}-{source_key(str(path))}"
+        # The file name only: parent directories (e.g. /srv/express/) say nothing about the type
+        equipment_type = infer_equipment_type(path.name) or GENERIC_EQUIPMENT_TYPE
+        chunk_index = 0
+        for text, extra in loader(path):
+            for chunk in self.splitter.split_text(text):
+                metadata = {
+                    "doc_id": doc_id,
+                    "equipment_type": equipment_type,
+                    "source": str(path),
+                    "chunk_index": chunk_index,
+                    "content_hash": content_hash(chunk),
+                    **extra,
+                }
+                yield f"{prefix}:{chunk_index}", chunk, metadata
+                chunk_index += 1
+
+    def run(self, paths: Iterable[str], prune: bool = True) -> IngestionStats:
+        """
+        Ingest all supported files under ``paths``.
+
+        Args:
+            paths: Files or directories to ingest
+            prune: Delete the chunks of previously ingested files under ``paths``
+                that no longer exist
+
+        Returns:
+            Counters for the run
+        """
+        paths = list(paths)
+        started = time.perf_counter()
+        executor = self._create_executor()
+        self._batch = _Batch()
+        try:
+            for path in iter_source_files(paths):
+                if self.checkpoint.is_done(path):
+                    self.stats.skipped_files += 1
+                    continue
+
+                try:
+                    chunks = list(self.iter_chunks(path))
+                except Exception as e:
+                    # The file keeps its previous chunks and is retried next run
+                    logger.error(f"Failed to read {path}: {e}")
+                    self.stats.failed_files += 1
+                    continue
+
+                self._sync_file(executor, str(path), chunks)
+                self.stats.files += 1
+
+            if self._batch.ids:
+                self._submit(executor, self._batch)
+            while self._pending:
+                self._drain_one()
+            if prune:
+                self._prune_removed(paths)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            self.checkpoint.save()
+
+        if self.stats.changed:
+            mark_collection_changed(self.collection)
+        self.stats.seconds = time.perf_counter() - started
+        logger.info(
+            f"Ingested {self.stats.files} files in {self.stats.seconds:.1f}s: "
+            f"{self.stats.chunks} chunks embedded ({self.stats.chunks_per_second:.0f} chunks/s), "
+            f"{self.stats.reused_chunks} reused, {self.stats.unchanged_chunks} unchanged, "
+            f"{self.stats.deleted_chunks} deleted; {self.stats.skipped_files} files unchanged, "
+            f"{self.stats.removed_files} removed, {self.stats.failed_files} failed"
+        )
+        return self.stats
+
+    def _sync_file(self, executor, source: str, chunks: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """Bring the stored chunks of one file in line with its current contents."""
+        existing = self._existing_chunks(source)
+        stored_by_hash = {
+            metadata.get("content_hash"): chunk_id for chunk_id, metadata in existing.items()
+        }
+
+        copies: List[Tuple[str, str, str, Dict[str, Any]]] = []  # (id, stored id, text, metadata)
+        to_embed: List[Tuple[str, str, Dict[str, Any]]] = []
+        for chunk_id, text, metadata in chunks:
+            if existing.get(chunk_id) == metadata:
+                self.stats.unchanged_chunks += 1
+                continue
+            stored_id = stored_by_hash.get(metadata["content_hash"])
+            if stored_id is not None:
+                copies.append((chunk_id, stored_id, text, metadata))
+            else:
+                to_embed.append((chunk_id, text, metadata))
+
+        # Copy stored embeddings before anything for this file is overwritten
+        if copies:
+            stored = self.collection.get(ids=list({c[1] for c in copies}), include=["embeddings"])
+            embedding_by_id = dict(zip(stored["ids"], stored["embeddings"]))
+            for start in range(0, len(copies), self.batch_size):
+                part = copies[start:start + self.batch_size]
+                self.collection.upsert(
+                    ids=[c[0] for c in part],
+                    embeddings=[embedding_by_id[c[1]] for c in part],
+                    documents=[c[2] for c in part],
+                    metadatas=[c[3] for c in part],
+                )
+            self.stats.reused_chunks += len(copies)
+
+        stale = list(existing.keys() - {chunk_id for chunk_id, _, _ in chunks})
+        if stale:
+            self.collection.delete(ids=stale)
+            self.stats.deleted_chunks += len(stale)
+
+        for chunk_id, text, metadata in to_embed:
+            batch = self._batch
+            batch.ids.append(chunk_id)
+            batch.texts.append(text)
+            batch.metadatas.append(metadata)
+            if source not in batch.files:
+                batch.files.add(source)
+                self._outstanding[source] = self._outstanding.get(source, 0) + 1
+            if len(batch.ids) >= self.batch_size:
+                self._submit(executor, batch)
+                self._batch = _Batch()
+
+        self._chunked[source] = len(chunks)
+        if not self._outstanding.get(source):
+            self._complete_file(source)
+
+    def _existing_chunks(self, source: str) -> Dict[str, Dict[str, Any]]:
+        """Return ``{chunk_id: metadata}`` of the chunks stored for a file."""
+        stored = self.collection.get(where={"source": source}, include=["metadatas"])
+        return dict(zip(stored["ids"], stored["metadatas"]))
+
+    def _prune_removed(self, paths: List[str]) -> None:
+        """Delete the chunks of checkpointed files under ``paths`` that were removed."""
+        roots = [os.path.normpath(p) for p in paths]
+        for source in list(self.checkpoint.files):
+            if os.path.exists(source):
+                continue
+            normalized = os.path.normpath(source)
+            if not any(normalized == root or normalized.startswith(root + os.sep) for root in roots):
+                continue
+            stored = self._existing_chunks(source)
+            if stored:
+                self.collection.delete(ids=list(stored))
+                self.stats.deleted_chunks += len(stored)
+            self.checkpoint.remove(source)
+            self.stats.removed_files += 1
+            logger.info(f"Removed {len(stored)} chunks of deleted file {source}")
+
+    def _submit(self, executor, batch: _Batch) -> None:
+        # Bound the work in flight so memory stays flat on large corpora
+        while len(self._pending) >= max(2, 2 * self.workers):
+            self._drain_one()
+        self._pending.append((executor.submit(_embed_batch, batch.texts), batch))
+
+    def _drain_one(self) -> None:
+        future, batch = self._pending.popleft()
+        embeddings = future.result()
+        self.collection.upsert(
+            ids=batch.ids,
+            embeddings=embeddings,
+            documents=batch.texts,
+            metadatas=batch.metadatas,
+        )
+        self.stats.chunks += len(batch.ids)
+        self.stats.batches += 1
+        if self.stats.batches % 20 == 0:
+            logger.info(f"Upserted {self.stats.chunks} chunks ({self.stats.batches} batches)")
+
+        for source in batch.files:
+            self._outstanding[source] -= 1
+            if not self._outstanding[source] and source in self._chunked:
+                self._complete_file(source)
+
+    def _complete_file(self, source: str) -> None:
+        self._outstanding.pop(source, None)
+        self.checkpoint.mark_done(Path(source), self._chunked.pop(source))
+        self.checkpoint.save()
+
+
+def get_collection():
+    """Open (or create) the knowledge base collection used by the RAG agent."""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=settings.CHROMA_PERSIST_DIR)
+    return client.get_or_create_collection(COLLECTION_NAME)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest documents into the RAG knowledge base")
+    parser.add_argument("paths", nargs="+", help="Files or directories to ingest")
+    parser.add_argument("--workers", type=int, default=None, help="Embedding processes (-1 = all cores, 0 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Chunks per embedding batch")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file")
+    parser.add_argument("--reset-checkpoint", action="store_true", help="Re-check every file")
+    parser.add_argument("--no-prune", action="store_true", help="Keep chunks of files removed from disk")
+    parser.add_argument("--publish-snapshot", action="store_true", help="Publish an ANN snapshot if anything changed")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    checkpoint_path = args.checkpoint or settings.INGEST_CHECKPOINT_PATH
+    if args.reset_checkpoint and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    collection = get_collection()
+    pipeline = IngestionPipeline(
+        collection,
+        checkpoint_path=checkpoint_path,
+        workers=args.workers,
+        batch_size=args.batch_size,
+    )
+    stats = pipeline.run(args.paths, prune=not args.no_prune)
+    if args.publish_snapshot and stats.changed:
+        from .ann_index import build_snapshot
+
+        build_snapshot(collection)
+
+
+if __name__ == "__main__":
+    main()
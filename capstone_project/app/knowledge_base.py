@@ -0,0 +1,119 @@
+# app/knowledge_base.py
+"""
+Helpers shared by everything that reads or writes the RAG knowledge base.
+
+Writers bump a ``kb_version`` marker in the Chroma collection metadata whenever
+they change its contents, so readers in other processes (API workers) can tell
+that caches derived from the collection are stale.
+"""
+
+import re
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+COLLECTION_NAME = "manufacturing_docs"
+KB_VERSION_KEY = "kb_version"
+
+# Equipment types used in document metadata ("ALL" applies to every type)
+EQUIPMENT_TYPES = ("CNC", "WELDING", "ASSEMBLY", "COATING", "PRESS", "PUMP")
+GENERIC_EQUIPMENT_TYPE = "ALL"
+
+# Defects the Vision Agent reports, per equipment type
+DEFECT_KEYWORDS = {
+    "CNC": ["micro-fracture", "surface-roughness", "dimensional-deviation"],
+    "WELDING": ["weld-porosity", "incomplete-fusion", "spatter"],
+    "ASSEMBLY": ["misalignment", "missing-component", "loose-fastener"],
+    "COATING": ["surface-discoloration", "coating-thickness-variation", "orange-peel"],
+}
+
+# Words in a VLM description that indicate each defect
+DEFECT_TERMS = {
+    "micro-fracture": ("crack", "fracture", "fissure"),
+    "surface-roughness": ("rough", "chatter", "tool mark"),
+    "dimensional-deviation": ("deform", "warp", "bent", "out of tolerance"),
+    "weld-porosity": ("porosity", "pores", "pinhole", "bubble"),
+    "incomplete-fusion": ("incomplete fusion", "lack of fusion", "cold lap", "gap in the weld"),
+    "spatter": ("spatter", "splatter"),
+    "misalignment": ("misalign", "crooked", "offset"),
+    "missing-component": ("missing",),
+    "loose-fastener": ("loose", "unscrewed"),
+    "surface-discoloration": ("discolor", "stain", "burn mark", "rust", "corrosion"),
+    "coating-thickness-variation": ("uneven coating", "thin coating", "drip"),
+    "orange-peel": ("orange peel", "orange-peel", "dimpl"),
+}
+
+
+def extract_defects(description: str) -> List[str]:
+    """
+    Map a free-text image description to known defect labels.
+
+    Args:
+        description: Caption or answer generated by the vision-language model
+
+    Returns:
+        Matching labels from DEFECT_TERMS, in vocabulary order
+    """
+    text = description.lower()
+    return [
+        defect for defect, terms in DEFECT_TERMS.items()
+        if any(re.search(r"\b" + re.escape(term), text) for term in terms)
+    ]
+
+
+def infer_equipment_type(text: str, defects: Sequence[str] = ()) -> Optional[str]:
+    """
+    Infer the equipment type from an identifier or file name, else from defects.
+
+    Types match whole words only (letters between digits or separators), so
+    "CNC2-A" and "press_manual" match but "COMPRESSOR-3" and "express" do not.
+
+    Args:
+        text: e.g. an equipment ID ("CNC-A-102") or a file name
+        defects: Defects reported by the Vision Agent
+
+    Returns:
+        The first matching entry of EQUIPMENT_TYPES, or None
+    """
+    words = set(re.findall(r"[A-Z]+", text.upper()))
+    for equipment_type in EQUIPMENT_TYPES:
+        if equipment_type in words:
+            return equipment_type
+    for equipment_type, keywords in DEFECT_KEYWORDS.items():
+        if any(defect in keywords for defect in defects):
+            return equipment_type
+    return None
+
+
+def mark_collection_changed(collection) -> str:
+    """
+    Record that the collection contents changed.
+
+    Args:
+        collection: Chroma collection that was written to
+
+    Returns:
+        The new knowledge base version
+    """
+    version = uuid4().hex
+    metadata = dict(collection.metadata or {})
+    metadata[KB_VERSION_KEY] = version
+    collection.modify(metadata=metadata)
+    return version
+
+
+def collection_fingerprint(client, name: str = COLLECTION_NAME) -> Tuple[int, Any]:
+    """
+    Return a cheap fingerprint of the collection contents.
+
+    The collection is re-fetched so that metadata written by other processes
+    is seen.
+
+    Args:
+        client: Chroma client
+        name: Collection name
+
+    Returns:
+        Tuple of (document count, knowledge base version)
+    """
+    collection = client.get_collection(name)
+    return collection.count(), (collection.metadata or {}).get(KB_VERSION_KEY)
@@ -0,0 +1,149 @@
+# app/local_vision.py
+"""
+Local CPU defect classifier for the Vision agent.
+
+A small image classifier exported to ONNX (e.g. a fine-tuned MobileNetV3 or
+EfficientNet-Lite, optionally int8-quantized) runs in-process with ONNX
+Runtime. It is used instead of the remote VLM when ``VISION_BACKEND`` is
+"local", or as a fallback when the remote call fails or exceeds
+``VISION_REMOTE_BUDGET_MS`` ("auto").
+
+The model takes a float32 NCHW batch of ImageNet-normalised RGB images and
+returns one logit per label (multi-label, sigmoid). Labels are read from a JSON
+list next to the model: ``defect_classifier.onnx`` -> ``defect_classifier.labels.json``.
+A "no-defect" label, if present, is never reported as a defect.
+"""
+
+import io
+import json
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+NO_DEFECT_LABEL = "no-defect"
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+class LocalDefectClassifier:
+    """Multi-label defect classifier running on CPU with ONNX Runtime."""
+
+    def __init__(
+        self,
+        model_path: str,
+        input_size: int = 224,
+        threshold: float = 0.5,
+        threads: int = 0,
+    ):
+        """
+        Args:
+            model_path: ONNX model file; labels are read from ``<stem>.labels.json``
+            input_size: Square input resolution expected by the model
+            threshold: Minimum sigmoid probability for a defect to be reported
+            threads: Intra-op threads (0 = ONNX Runtime default)
+
+        Raises:
+            FileNotFoundError: If the model or its labels file is missing
+        """
+        import onnxruntime as ort
+
+        path = Path(model_path)
+        labels_path = path.with_suffix(".labels.json")
+        if not path.is_file() or not labels_path.is_file():
+            raise FileNotFoundError(f"Local vision model needs {path} and {labels_path}")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.labels: List[str] = json.loads(labels_path.read_text())
+        self.input_size = input_size
+        self.threshold = threshold
+        self.model_id = f"local:{path.name}"
+        logger.info(f"Loaded local vision classifier {path} ({len(self.labels)} labels)")
+
+    def preprocess(self, data: bytes) -> np.ndarray:
+        """
+        Decode and resize one image into a normalised CHW float32 array.
+
+        Raises:
+            ValueError: If the bytes are not a decodable image
+        """
+        from PIL import Image, ImageOps, UnidentifiedImageError
+
+        size = (self.input_size, self.input_size)
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                image.draft("RGB", size)
+                image = ImageOps.exif_transpose(image).convert("RGB").resize(size, Image.BILINEAR)
+        except (UnidentifiedImageError, OSError) as e:
+            raise ValueError(f"Not a decodable image: {e}") from e
+        pixels = np.asarray(image, dtype=np.float32) / 255.0
+        return ((pixels - _MEAN) / _STD).transpose(2, 0, 1)
+
+    def classify(self, batch: List[np.ndarray]) -> List[Tuple[List[str], float]]:
+        """
+        Classify preprocessed images in one forward pass.
+
+        Args:
+            batch: Arrays returned by ``preprocess``
+
+        Returns:
+            One (defects, confidence) pair per image. Defects are ordered by
+            probability; confidence is the top defect probability or, when
+            none passes the threshold, the probability of "no defect": the
+            model's "no-defect" output if it has one, else one minus the top
+            defect probability.
+        """
+        logits = self.session.run(None, {self.input_name: np.stack(batch).astype(np.float32)})[0]
+        probabilities = 1.0 / (1.0 + np.exp(-logits))
+
+        no_defect = self.labels.index(NO_DEFECT_LABEL) if NO_DEFECT_LABEL in self.labels else None
+        results = []
+        for row in probabilities:
+            order = [i for i in np.argsort(-row) if i != no_defect]
+            defects = [self.labels[i] for i in order if row[i] >= self.threshold]
+            if defects:
+                confidence = float(row[order[0]])
+            elif no_defect is not None:
+                confidence = float(row[no_defect])
+            else:
+                confidence = 1.0 - float(row[order[0]]) if order else 1.0
+            results.append((defects, round(confidence, 4)))
+        return results
+
+
+@lru_cache(maxsize=1)
+def get_local_classifier() -> LocalDefectClassifier:
+    """Load the configured local classifier once per process."""
+    return LocalDefectClassifier(
+        settings.VISION_LOCAL_MODEL_PATH,
+        input_size=settings.VISION_LOCAL_INPUT_SIZE,
+        threshold=settings.VISION_LOCAL_THRESHOLD,
+        threads=settings.VISION_LOCAL_THREADS,
+    )
+
+
+def load_local_classifier(required: bool) -> Optional[LocalDefectClassifier]:
+    """
+    Load the local classifier, or return None when it is optional and unavailable.
+
+    Args:
+        required: Raise instead of returning None (``VISION_BACKEND=local``)
+    """
+    try:
+        return get_local_classifier()
+    except (ImportError, FileNotFoundError) as e:
+        if required:
+            raise
+        logger.warning(f"Local vision fallback unavailable: {e}")
+        return None
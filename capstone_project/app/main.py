@@ -1,21 +1,22 @@
 # app/main.py
 
+import asyncio
+import json
 import time
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Optional
 from uuid import uuid4
 
-from fastapi import FastAPI, Request, Depends
+from fastapi import FastAPI, Request, Depends, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from .concurrency import Overloaded
 from .config import settings
-from .models import DiagnosisRequest, DiagnosisResponse, HealthStatus
+from .inference_client import close_inference_client
+from .models import DiagnosisRequest, DiagnosisResponse, HealthStatus, PredictionBatchRequest
 from .security import authorize_request
-from .agents import run_copilot_inference
-
-# --- Application Setup ---
-app = FastAPI(
-    title=settings.APP_TITLE,
-    version=settings.APP_VERSION,
-    description="API for interacting with the Manufacturing Copilot agents.",
-)
 
 # --- Logging Configuration ---
 # In a real app, you might use a more advanced logging setup (e.g., Loguru)
@@ -27,6 +28,83 @@ logging.basicConfig(
 logger = logging.getLogger("manufacturing_copilot_api")
 
 
+# --- Agent Warm-up ---
+# The agent stack (LangChain, sentence-transformers, Chroma, trained ML models)
+# is imported and built on a dedicated thread instead of at import time, so the
+# process answers /health immediately and reports readiness on /ready.
+_warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="copilot-warmup")
+_warmup_lock = threading.Lock()
+_warmup_future: Optional[Future] = None
+
+
+def _load_copilot():
+    """Import and initialize all agents (blocking; runs on the warm-up thread)."""
+    start_time = time.perf_counter()
+    from . import agents
+    agents.init_agents()
+    logger.info(f"Copilot agents ready in {time.perf_counter() - start_time:.2f}s")
+    return agents
+
+
+def _start_warmup() -> Future:
+    """Start the agent warm-up if it is not running, retrying after a failure."""
+    global _warmup_future
+    with _warmup_lock:
+        if _warmup_future is None or (
+            _warmup_future.done() and _warmup_future.exception() is not None
+        ):
+            _warmup_future = _warmup_executor.submit(_load_copilot)
+        return _warmup_future
+
+
+async def get_copilot():
+    """
+    Return the initialized agents module, waiting for warm-up if needed.
+    
+    Raises:
+        HTTPException: 503 if the agents failed to initialize.
+    """
+    try:
+        return await asyncio.wrap_future(_start_warmup())
+    except Exception as e:
+        logger.error(f"Copilot agents failed to initialize: {e}")
+        raise HTTPException(
+            status_code=503,
+            detail="Copilot agents are not available. Please retry shortly.",
+            headers={"Retry-After": "10"},
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Kick off agent warm-up in the background and let the server start serving."""
+    if settings.WARMUP_ON_STARTUP:
+        _start_warmup()
+    yield
+    await close_inference_client()
+    _warmup_executor.shutdown(wait=False)
+
+
+# --- Application Setup ---
+app = FastAPI(
+    title=settings.APP_TITLE,
+    version=settings.APP_VERSION,
+    description="API for interacting with the Manufacturing Copilot agents.",
+    lifespan=lifespan,
+)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed load fast: tell the client when to retry instead of queueing the request."""
+    logger.warning(f"Shedding {request.method} {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "The copilot is at capacity. Please retry shortly."},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 # --- Middleware for Observability ---
 @app.middleware("http")
 async def add_observability_headers(request: Request, call_next):
@@ -75,6 +153,24 @@ async def health_check():
     return HealthStatus(status="ok")
 
 
+@app.get("/ready", response_model=HealthStatus, tags=["Monitoring"])
+async def readiness_check():
+    """
+    Readiness endpoint for Kubernetes readiness probes.
+    
+    Returns 503 until all agents are initialized, so traffic (and HPA CPU
+    averaging) only includes pods that have finished warming up.
+    """
+    future = _warmup_future
+    if future is None or not future.done():
+        return JSONResponse(status_code=503, content={"status": "warming_up"})
+    if future.exception() is not None:
+        # Retry in the background so a transient failure does not wedge the pod
+        _start_warmup()
+        return JSONResponse(status_code=503, content={"status": "initialization_failed"})
+    return HealthStatus(status="ready")
+
+
 @app.post("/v1/diagnose", response_model=DiagnosisResponse, tags=["Copilot"])
 async def diagnose_problem(
     payload: DiagnosisRequest,
@@ -93,11 +189,46 @@ async def diagnose_problem(
     )
     
     # Call LangGraph orchestrator which runs all agents
-    response = await run_copilot_inference(payload)
+    copilot = await get_copilot()
+    copilot.check_capacity()
+    response = await copilot.run_copilot_inference(payload)
     
     return response
 
 
+@app.post("/v1/diagnose/stream", tags=["Copilot"])
+async def diagnose_problem_stream(
+    payload: DiagnosisRequest,
+    user_id: str = Depends(authorize_request)
+):
+    """
+    Streaming variant of the diagnosis endpoint.
+    
+    Returns newline-delimited JSON (NDJSON). Each agent's result is emitted as soon
+    as its node finishes (`agent_result`), RAG and report LLM output is streamed as
+    it is generated (`token`), and the last line (`final`) carries the complete
+    `DiagnosisResponse`. Requires a valid technician auth token.
+    """
+    logger.info(
+        f"Received streaming diagnosis request from user '{user_id}' for plant '{payload.plant_id}'."
+    )
+    
+    copilot = await get_copilot()
+    # Shed before the 200 and the stream start; later overload ends the stream with an error frame
+    copilot.check_capacity()
+    
+    async def ndjson_events():
+        async for event in copilot.stream_copilot_inference(payload):
+            yield json.dumps(event, default=str) + "\n"
+    
+    return StreamingResponse(
+        ndjson_events(),
+        media_type="application/x-ndjson",
+        # Disable proxy buffering so frames reach the client as they are produced
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/v1/predict", tags=["ML Agent"])
 async def predict_failure(
     equipment_id: str,
@@ -111,8 +242,8 @@ async def predict_failure(
     Returns failure probability, risk level, and maintenance recommendations.
     """
     try:
-        from .ml_agent import ml_agent
-        result = await ml_agent.predict_failure(equipment_id, sensor_data)
+        from .ml_agent import get_ml_agent
+        result = await get_ml_agent().predict_failure(equipment_id, sensor_data)
         return result
     except ImportError:
         return {
@@ -124,6 +255,52 @@ async def predict_failure(
         return {"error": str(e), "equipment_id": equipment_id}
 
 
+@app.post("/v1/predict/batch", tags=["ML Agent"])
+async def predict_failure_batch(
+    payload: PredictionBatchRequest,
+    user_id: str = Depends(authorize_request)
+):
+    """
+    Predict failure for many equipment in one call.
+    
+    All items are scored in a single vectorized model pass, which is far cheaper
+    than one `/v1/predict` call per machine for fleet-wide sweeps. Predictions are
+    returned in request order.
+    """
+    items = [(item.equipment_id, item.sensor_data) for item in payload.items]
+    try:
+        from .ml_agent import get_ml_agent
+        predictions = await get_ml_agent().predict_failure_batch(items)
+        return {"count": len(predictions), "predictions": predictions}
+    except ImportError:
+        return {
+            "error": "ML Agent not available. Train the model first: python ml_models/predictive_maintenance/train_model.py",
+            "count": 0,
+            "predictions": []
+        }
+    except Exception as e:
+        logger.error(f"ML batch prediction error: {e}")
+        return {"error": str(e), "count": 0, "predictions": []}
+
+
+@app.get("/v1/models/predictive-maintenance", tags=["ML Agent"])
+async def get_predictive_maintenance_model(user_id: str = Depends(authorize_request)):
+    """
+    Report the live and candidate predictive maintenance model versions.
+    
+    Includes how the candidate's shadow predictions compare with the live model
+    (risk level agreement and probability difference) on sampled traffic.
+    """
+    try:
+        from .ml_agent import get_ml_agent
+        agent = get_ml_agent()
+        await agent.ensure_models()
+        return agent.model_info()
+    except Exception as e:
+        logger.error(f"ML model info error: {e}")
+        return {"error": str(e)}
+
+
 @app.get("/v1/analytics/{equipment_id}", tags=["Analytics Agent"])
 async def get_analytics(
     equipment_id: str,
@@ -137,8 +314,8 @@ async def get_analytics(
     Time range options: last_7_days, last_30_days, last_90_days
     """
     try:
-        from .analytics_agent import analytics_agent
-        result = await analytics_agent.analyze_performance_trend(equipment_id, time_range)
+        from .analytics_agent import get_analytics_agent
+        result = await get_analytics_agent().analyze_performance_trend(equipment_id, time_range)
         return result
     except ImportError:
         return {
@@ -3,21 +3,56 @@ ML Agent - Machine Learning Predictions for Manufacturing
 Provides predictive maintenance, anomaly detection, and quality forecasting
 """
 
+import asyncio
 import logging
+import random
+import threading
 import numpy as np
-import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple
 from pathlib import Path
-import joblib
 import sys
 
 # Add parent directory to path for imports
 sys.path.append(str(Path(__file__).parent.parent))
 
-from ml_models.predictive_maintenance.train_model import PredictiveMaintenanceModel
+from app.config import settings
+# NumPy-only; scikit-learn and pandas are imported only if a model must be compiled
+from ml_models.predictive_maintenance.registry import ModelRegistry
 
 logger = logging.getLogger(__name__)
 
+# Raw model inputs and the value assumed when a reading is not supplied
+FEATURE_DEFAULTS: Dict[str, float] = {
+    'temperature_avg': 65.0,
+    'temperature_std': 2.0,
+    'temperature_max': 70.0,
+
+    'vibration_avg': 2.5,
+    'vibration_std': 0.3,
+    'vibration_max': 3.0,
+
+    'pressure_avg': 45.0,
+    'pressure_std': 1.5,
+    'pressure_min': 42.0,
+
+    'hours_since_maintenance': 168.0,
+    'equipment_age_months': 24,
+    'cycles_completed': 1000,
+
+    'hour_of_day': 12,
+    'day_of_week': 3,
+
+    'load_factor': 0.8,
+    'ambient_temperature': 25.0,
+    'humidity': 50.0,
+}
+
+
+class ServingModel(NamedTuple):
+    """A loaded model version; replaced as a whole so each request sees one version"""
+    version: str
+    predictor: Any
+
 
 class MLAgent:
     """
@@ -25,39 +60,141 @@ class MLAgent:
     Uses trained ML models for failure prediction, anomaly detection, quality forecasting
     """
     
-    def __init__(self, models_dir: str = "./ml_models"):
-        """Initialize ML Agent with trained models"""
+    def __init__(
+        self,
+        models_dir: str = "./ml_models",
+        reload_seconds: Optional[float] = None,
+        shadow_sample_rate: Optional[float] = None
+    ):
+        """
+        Initialize ML Agent; models are loaded on the first prediction
+        
+        Args:
+            models_dir: Directory containing the ``predictive_maintenance`` registry
+            reload_seconds: How often to check for a new model version; 0 disables
+                (defaults to ML_MODEL_RELOAD_SECONDS)
+            shadow_sample_rate: Fraction of predictions also scored by the
+                candidate version (defaults to ML_SHADOW_SAMPLE_RATE)
+        """
         self.models_dir = Path(models_dir)
-        self.predictive_maintenance_model = None
+        self.registry = ModelRegistry(str(self.models_dir / "predictive_maintenance"))
+        self.reload_seconds = (
+            settings.ML_MODEL_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        )
+        self.shadow_sample_rate = (
+            settings.ML_SHADOW_SAMPLE_RATE if shadow_sample_rate is None else shadow_sample_rate
+        )
+        # Live and shadow failure models (CompiledForest, or FastPredictor over sklearn)
+        self.active: Optional[ServingModel] = None
+        self.candidate: Optional[ServingModel] = None
         self.anomaly_detection_model = None
         self.quality_prediction_model = None
-        
-        # Load models
-        self._load_models()
+        self._models_loaded = False
+        self._load_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._shadow_lock = threading.Lock()
+        self._shadow = self._new_shadow_stats(None)
         
         logger.info("ML Agent initialized successfully")
     
+    @property
+    def predictor(self):
+        """Predictor of the live model version (None until loaded, or if untrained)"""
+        active = self.active
+        return active.predictor if active else None
+    
+    @property
+    def model_version(self) -> Optional[str]:
+        active = self.active
+        return active.version if active else None
+    
+    async def ensure_models(self):
+        """Load models on first use, off the event loop"""
+        if not self._models_loaded:
+            await asyncio.to_thread(self._load_models)
+    
     def _load_models(self):
-        """Load all trained ML models"""
-        try:
-            # Load Predictive Maintenance Model
-            pm_model_path = self.models_dir / "predictive_maintenance"
-            if pm_model_path.exists():
-                self.predictive_maintenance_model = PredictiveMaintenanceModel.load_model(
-                    str(pm_model_path)
-                )
-                logger.info("✅ Predictive Maintenance model loaded")
-            else:
-                logger.warning(f"⚠️  Predictive Maintenance model not found at {pm_model_path}")
-                logger.info("   Run: python ml_models/predictive_maintenance/train_model.py")
+        """Load all trained ML models (once; retried on the next call if it fails)"""
+        with self._load_lock:
+            if self._models_loaded:
+                return
+            try:
+                # Load Predictive Maintenance Model
+                if self.reload():
+                    logger.info(f"✅ Predictive Maintenance model {self.model_version} loaded")
+                else:
+                    logger.warning(
+                        f"⚠️  Predictive Maintenance model not found at {self.registry.root}"
+                    )
+                    logger.info("   Run: python ml_models/predictive_maintenance/train_model.py")
+                
+                # TODO: Load other models when implemented
+                # self.anomaly_detection_model = AnomalyDetectionModel.load_model(...)
+                # self.quality_prediction_model = QualityPredictionModel.load_model(...)
+                
+            except Exception as e:
+                logger.error(f"Error loading ML models: {e}")
+                raise
+            self._models_loaded = True
             
-            # TODO: Load other models when implemented
-            # self.anomaly_detection_model = AnomalyDetectionModel.load_model(...)
-            # self.quality_prediction_model = QualityPredictionModel.load_model(...)
+            # Keep watching even without a model, so the first published one is picked up
+            if self.reload_seconds > 0:
+                self._watcher = threading.Thread(
+                    target=self._watch, name="ml-model-watcher", daemon=True
+                )
+                self._watcher.start()
+    
+    def reload(self) -> bool:
+        """
+        Load the versions named by CURRENT and CANDIDATE if they changed
+        
+        Called by the watcher thread, never on the request path: requests keep
+        scoring with the previous version until the new one is fully loaded and
+        swapped in by a single assignment.
+        
+        Returns:
+            True if a model version is live after the call
+        """
+        current_version = self.registry.current_version()
+        candidate_version = self.registry.candidate_version()
+        if candidate_version == current_version:
+            # A promoted candidate has nothing left to be compared against
+            candidate_version = None
+        
+        with self._swap_lock:
+            # A missing CURRENT pointer keeps the loaded version serving
+            if current_version is not None and current_version != self.model_version:
+                self.active = self._load_version(current_version)
+                logger.info(f"Serving predictive maintenance model {current_version}")
             
-        except Exception as e:
-            logger.error(f"Error loading ML models: {e}")
-            raise
+            loaded_candidate = self.candidate.version if self.candidate else None
+            if candidate_version != loaded_candidate:
+                self.candidate = self._load_version(candidate_version) if candidate_version else None
+                with self._shadow_lock:
+                    self._shadow = self._new_shadow_stats(candidate_version)
+                if candidate_version:
+                    logger.info(f"Shadow-scoring predictive maintenance model {candidate_version}")
+        return self.active is not None
+    
+    def _load_version(self, version: str) -> ServingModel:
+        """Load a registry version, reusing the predictor if it is already in memory"""
+        for loaded in (self.active, self.candidate):
+            if loaded is not None and loaded.version == version:
+                return loaded
+        return ServingModel(version, self.registry.store(version).load())
+    
+    def _watch(self) -> None:
+        while not self._stop.wait(self.reload_seconds):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.warning(f"Could not load new predictive maintenance model: {e}")
+    
+    def close(self) -> None:
+        """Stop watching the registry"""
+        self._stop.set()
     
     async def predict_failure(
         self,
@@ -77,18 +214,19 @@ class MLAgent:
         try:
             logger.info(f"Predicting failure risk for {equipment_id}")
             
-            # If model not loaded, return mock prediction
-            if self.predictive_maintenance_model is None:
-                return self._mock_failure_prediction(equipment_id, sensor_data)
+            await self.ensure_models()
             
-            # Prepare features from sensor data
-            features_df = self._prepare_features_for_prediction(sensor_data)
-            
-            # Make prediction
-            prediction = self.predictive_maintenance_model.predict(features_df)
+            # If no trained model is available, return mock prediction
+            active = self.active
+            if active is None:
+                return self._mock_failure_prediction(equipment_id, sensor_data)
             
-            failure_prob = prediction['probabilities'][0]
-            risk_level = prediction['risk_levels'][0]
+            # Score on the single-row fast path (no DataFrame, one forest walk)
+            _, failure_prob, risk_level = active.predictor.predict_one(
+                self._feature_values(sensor_data)
+            )
+            if self.candidate is not None and random.random() < self.shadow_sample_rate:
+                self._schedule_shadow([sensor_data], [failure_prob], [risk_level])
             
             # Generate explanation and recommendations
             explanation = self._generate_failure_explanation(sensor_data, failure_prob)
@@ -103,7 +241,8 @@ class MLAgent:
                 "contributing_factors": explanation,
                 "recommendations": recommendations,
                 "confidence": 0.85,
-                "model_used": "Random Forest (Predictive Maintenance)"
+                "model_used": "Random Forest (Predictive Maintenance)",
+                "model_version": active.version
             }
             
             logger.info(f"Failure prediction complete: {risk_level} risk ({failure_prob:.2%})")
@@ -119,33 +258,196 @@ class MLAgent:
                 "risk_level": "Unknown"
             }
     
-    def _prepare_features_for_prediction(self, sensor_data: Dict[str, Any]) -> pd.DataFrame:
-        """Prepare features from sensor data for model input"""
+    async def predict_failure_batch(
+        self,
+        items: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Predict failure probability for many equipment in one model pass
         
-        # Extract sensor readings (assuming recent averages are provided)
-        features = {
-            'temperature_avg': sensor_data.get('temperature_avg', 65.0),
-            'temperature_std': sensor_data.get('temperature_std', 2.0),
-            'temperature_max': sensor_data.get('temperature_max', 70.0),
-            
-            'vibration_avg': sensor_data.get('vibration_avg', 2.5),
-            'vibration_std': sensor_data.get('vibration_std', 0.3),
-            'vibration_max': sensor_data.get('vibration_max', 3.0),
-            
-            'pressure_avg': sensor_data.get('pressure_avg', 45.0),
-            'pressure_std': sensor_data.get('pressure_std', 1.5),
-            'pressure_min': sensor_data.get('pressure_min', 42.0),
+        Args:
+            items: (equipment_id, sensor_data) pairs
             
-            'hours_since_maintenance': sensor_data.get('hours_since_maintenance', 168.0),
-            'equipment_age_months': sensor_data.get('equipment_age_months', 24),
-            'cycles_completed': sensor_data.get('cycles_completed', 1000),
+        Returns:
+            One result per item, in order, shaped like ``predict_failure``
+        """
+        if not items:
+            return []
+        
+        logger.info(f"Predicting failure risk for {len(items)} equipment")
+        
+        try:
+            await self.ensure_models()
             
-            'hour_of_day': sensor_data.get('hour_of_day', 12),
-            'day_of_week': sensor_data.get('day_of_week', 3),
+            # One version scores the whole batch, even if a swap happens meanwhile
+            active = self.active
+            if active is None:
+                return [
+                    self._mock_failure_prediction(equipment_id, sensor_data)
+                    for equipment_id, sensor_data in items
+                ]
             
-            'load_factor': sensor_data.get('load_factor', 0.8),
-            'ambient_temperature': sensor_data.get('ambient_temperature', 25.0),
-            'humidity': sensor_data.get('humidity', 50.0),
+            # Scoring thousands of rows is CPU work; keep it off the event loop
+            sensor_rows = [s for _, s in items]
+            prediction = await asyncio.to_thread(self._predict_matrix, active.predictor, sensor_rows)
+        except Exception as e:
+            logger.error(f"Error in batch failure prediction: {e}")
+            return [
+                {
+                    "equipment_id": equipment_id,
+                    "error": str(e),
+                    "prediction_type": "failure_risk",
+                    "failure_probability": 0.0,
+                    "risk_level": "Unknown"
+                }
+                for equipment_id, _ in items
+            ]
+        
+        if self.candidate is not None and self.shadow_sample_rate > 0:
+            sampled = np.flatnonzero(np.random.random(len(items)) < self.shadow_sample_rate)
+            if len(sampled):
+                self._schedule_shadow(
+                    [sensor_rows[i] for i in sampled],
+                    [prediction['probabilities'][i] for i in sampled],
+                    [prediction['risk_levels'][i] for i in sampled]
+                )
+        
+        results = []
+        for (equipment_id, sensor_data), failure_prob, risk_level in zip(
+            items, prediction['probabilities'], prediction['risk_levels']
+        ):
+            results.append({
+                "equipment_id": equipment_id,
+                "prediction_type": "failure_risk",
+                "failure_probability": failure_prob,
+                "risk_level": risk_level,
+                "time_horizon": "7_days",
+                "contributing_factors": self._generate_failure_explanation(sensor_data, failure_prob),
+                "recommendations": self._generate_maintenance_recommendations(risk_level, sensor_data),
+                "confidence": 0.85,
+                "model_used": "Random Forest (Predictive Maintenance)",
+                "model_version": active.version
+            })
+        return results
+    
+    def _predict_matrix(self, predictor, sensor_rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the feature matrix for ``sensor_rows`` and score it in one call"""
+        return predictor.predict(self._build_feature_matrix(sensor_rows, predictor.feature_names))
+    
+    def _build_feature_matrix(
+        self,
+        sensor_rows: List[Dict[str, Any]],
+        feature_names: List[str]
+    ) -> np.ndarray:
+        """
+        Assemble an (n, n_features) matrix in the model's feature order
+        
+        Engineered features are computed column-wise, matching
+        ``PredictiveMaintenanceModel.engineer_features``.
+        """
+        columns = {
+            name: np.array([row.get(name, default) for row in sensor_rows], dtype=np.float64)
+            for name, default in FEATURE_DEFAULTS.items()
+        }
+        
+        columns['temp_vibration_interaction'] = columns['temperature_avg'] * columns['vibration_avg']
+        columns['high_temp_low_pressure'] = (
+            (columns['temperature_avg'] > 70) & (columns['pressure_avg'] < 40)
+        ).astype(np.float64)
+        columns['maintenance_overdue'] = (columns['hours_since_maintenance'] > 360).astype(np.float64)
+        columns['high_temperature_flag'] = (columns['temperature_avg'] > 75).astype(np.float64)
+        columns['high_vibration_flag'] = (columns['vibration_avg'] > 4.0).astype(np.float64)
+        
+        missing_features = set(feature_names) - set(columns)
+        if missing_features:
+            raise ValueError(f"Missing features: {missing_features}")
+        return np.column_stack([columns[name] for name in feature_names])
+    
+    def _schedule_shadow(
+        self,
+        sensor_rows: List[Dict[str, Any]],
+        probabilities: List[float],
+        risk_levels: List[str]
+    ):
+        """Score sampled rows with the candidate model after the response, off the event loop"""
+        candidate = self.candidate
+        if candidate is None:
+            return
+        asyncio.get_running_loop().run_in_executor(
+            None, self._shadow_score, candidate, sensor_rows, probabilities, risk_levels
+        )
+    
+    def _shadow_score(
+        self,
+        candidate: ServingModel,
+        sensor_rows: List[Dict[str, Any]],
+        probabilities: List[float],
+        risk_levels: List[str]
+    ):
+        """Compare candidate predictions with the live ones and record the difference"""
+        try:
+            shadow = self._predict_matrix(candidate.predictor, sensor_rows)
+        except Exception as e:
+            logger.warning(f"Shadow scoring with model {candidate.version} failed: {e}")
+            return
+        
+        differences = np.abs(np.asarray(shadow['probabilities']) - np.asarray(probabilities))
+        agreements = int(np.sum(np.asarray(shadow['risk_levels']) == np.asarray(risk_levels)))
+        with self._shadow_lock:
+            stats = self._shadow
+            if stats['candidate_version'] != candidate.version:
+                return  # candidate changed while scoring
+            stats['scored'] += len(sensor_rows)
+            stats['risk_level_agreements'] += agreements
+            stats['probability_diff_sum'] += float(differences.sum())
+            stats['max_probability_diff'] = max(stats['max_probability_diff'], float(differences.max()))
+    
+    @staticmethod
+    def _new_shadow_stats(candidate_version: Optional[str]) -> Dict[str, Any]:
+        return {
+            'candidate_version': candidate_version,
+            'scored': 0,
+            'risk_level_agreements': 0,
+            'probability_diff_sum': 0.0,
+            'max_probability_diff': 0.0,
+        }
+    
+    def model_info(self) -> Dict[str, Any]:
+        """
+        Live and candidate model versions and shadow-scoring results
+        
+        Returns:
+            Dictionary with versions on disk, the loaded versions, and how the
+            candidate's predictions compare with the live ones
+        """
+        with self._shadow_lock:
+            stats = dict(self._shadow)
+        scored = stats['scored']
+        return {
+            "model_version": self.model_version,
+            "candidate_version": stats['candidate_version'],
+            "available_versions": self.registry.versions(),
+            "shadow": {
+                "sample_rate": self.shadow_sample_rate,
+                "scored": scored,
+                "risk_level_agreement": stats['risk_level_agreements'] / scored if scored else None,
+                "mean_probability_diff": stats['probability_diff_sum'] / scored if scored else None,
+                "max_probability_diff": stats['max_probability_diff'] if scored else None,
+            },
+        }
+    
+    def _prepare_features_for_prediction(self, sensor_data: Dict[str, Any]):
+        """Prepare a one-row DataFrame for ``PredictiveMaintenanceModel.predict``"""
+        import pandas as pd
+        
+        return pd.DataFrame([self._feature_values(sensor_data)])
+    
+    def _feature_values(self, sensor_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Prepare raw and engineered feature values from sensor data"""
+        
+        # Extract sensor readings (assuming recent averages are provided)
+        features = {
+            name: sensor_data.get(name, default) for name, default in FEATURE_DEFAULTS.items()
         }
         
         # Engineer features (same as training)
@@ -157,7 +459,7 @@ class MLAgent:
         features['high_temperature_flag'] = int(features['temperature_avg'] > 75)
         features['high_vibration_flag'] = int(features['vibration_avg'] > 4.0)
         
-        return pd.DataFrame([features])
+        return features
     
     def _generate_failure_explanation(
         self,
@@ -291,6 +593,7 @@ class MLAgent:
             "recommendations": self._generate_maintenance_recommendations(risk_level, sensor_data),
             "confidence": 0.60,
             "model_used": "Mock Model (Rule-based)",
+            "model_version": None,
             "note": "Using simplified rule-based prediction. Train ML model for better accuracy."
         }
     
@@ -358,13 +661,28 @@ class MLAgent:
 # Node function for LangGraph integration
 # ============================================================================
 
-ml_agent = MLAgent()
+# Built on first use so that importing this module stays cheap
+_ml_agent: Optional[MLAgent] = None
+_ml_agent_lock = threading.Lock()
 
 
-def ml_agent_node(state: dict) -> dict:
-    """LangGraph node for ML Agent"""
-    import asyncio
-    
+def get_ml_agent() -> MLAgent:
+    """Return the process-wide MLAgent, creating it on first use."""
+    global _ml_agent
+    if _ml_agent is None:
+        with _ml_agent_lock:
+            if _ml_agent is None:
+                _ml_agent = MLAgent()
+    return _ml_agent
+
+
+async def ml_agent_node(state: dict) -> dict:
+    """
+    LangGraph node for ML Agent.
+
+    Returns a partial state update so it can run in parallel with the other
+    agent nodes.
+    """
     logger.info("Executing ML Agent node")
     
     try:
@@ -377,28 +695,16 @@ def ml_agent_node(state: dict) -> dict:
             'equipment_age_months': state.get('equipment_age_months', 36)
         }
         
-        # Run async function in sync context
-        loop = asyncio.get_event_loop()
-        if loop.is_running():
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                ml_result = pool.submit(
-                    asyncio.run,
-                    ml_agent.predict_failure(state['equipment_id'], sensor_data)
-                ).result()
-        else:
-            ml_result = loop.run_until_complete(
-                ml_agent.predict_failure(state['equipment_id'], sensor_data)
-            )
+        ml_result = await get_ml_agent().predict_failure(state['equipment_id'], sensor_data)
         
-        state['ml_prediction'] = ml_result
+        return {'ml_prediction': ml_result}
         
     except Exception as e:
         logger.error(f"ML Agent node error: {e}")
-        state.setdefault('errors', []).append(f"ML Agent: {str(e)}")
-        state['ml_prediction'] = {"error": str(e)}
-    
-    return state
+        return {
+            'ml_prediction': {"error": str(e)},
+            'errors': [f"ML Agent: {str(e)}"]
+        }
 
 
 if __name__ == '__main__':
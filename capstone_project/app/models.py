@@ -36,6 +36,17 @@ class DiagnosisResponse(BaseModel):
     analytics_insights: Optional[dict] = Field(None, description="Analytics Agent insights")
     safety_disclaimer: str = "Always follow standard safety procedures and consult a supervisor if unsure."
 
+class EquipmentSensorData(BaseModel):
+    """Sensor readings for one piece of equipment in a batch prediction."""
+    equipment_id: str = Field(..., description="Tag or ID of the equipment.", examples=["CNC-A-102"])
+    sensor_data: dict = Field(
+        default_factory=dict, description="Recent sensor averages and equipment metadata."
+    )
+
+class PredictionBatchRequest(BaseModel):
+    """Request model for scoring many equipment in one call."""
+    items: List[EquipmentSensorData] = Field(..., min_length=1, max_length=10000)
+
 class HealthStatus(BaseModel):
     """Response model for the health check endpoint."""
     status: str = "ok"
@@ -0,0 +1,86 @@
+# app/object_store.py
+"""
+Object storage for uploaded inspection images.
+
+``get_object_store()`` returns the backend selected by ``IMAGE_STORE_BACKEND``.
+Only a local-filesystem backend ships here (a stand-in for S3/GCS in local and
+single-node deployments); cloud backends implement the same two methods and
+register themselves in ``OBJECT_STORES``.
+"""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from uuid import uuid4
+
+from .config import settings
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+
+class ObjectNotFound(KeyError):
+    """No object exists under the requested key."""
+
+
+class ObjectStore(ABC):
+    """Minimal blocking key/value interface over an object store."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """Return the object's bytes or raise ``ObjectNotFound``."""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> None:
+        """Store ``data`` under ``key``, replacing any existing object."""
+
+
+class LocalObjectStore(ObjectStore):
+    """
+    Objects stored as files under a root directory.
+
+    Keys may omit the file extension (image IDs usually do): ``get("img_123")``
+    also finds ``img_123.jpg``, ``img_123.png``, etc.
+    """
+
+    EXTENSIONS = ("", ".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.IMAGE_STORE_ROOT).resolve()
+
+    def get(self, key: str) -> bytes:
+        base = self._path(key)
+        for extension in self.EXTENSIONS:
+            path = base.with_name(base.name + extension)
+            if path.is_file():
+                return path.read_bytes()
+        raise ObjectNotFound(key)
+
+    def put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid4().hex}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        # Keys come from API requests: never let one escape the root
+        if not key or path == self.root or self.root not in path.parents:
+            raise ObjectNotFound(key)
+        return path
+
+
+OBJECT_STORES: Dict[str, Callable[[], ObjectStore]] = {
+    "local": LocalObjectStore,
+}
+
+
+def get_object_store(backend: Optional[str] = None) -> ObjectStore:
+    """Create the image store selected by ``IMAGE_STORE_BACKEND``."""
+    backend = backend or settings.IMAGE_STORE_BACKEND
+    if backend not in OBJECT_STORES:
+        raise ValueError(f"Unknown IMAGE_STORE_BACKEND {backend!r}; expected one of {sorted(OBJECT_STORES)}")
+    logger.info(f"Using {backend} image store")
+    return OBJECT_STORES[backend]()
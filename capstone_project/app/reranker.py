@@ -0,0 +1,172 @@
+# app/reranker.py
+"""
+Cross-encoder re-ranking of retrieved chunks.
+
+Retrieval over-fetches candidates; a small CPU cross-encoder then scores every
+(query, chunk) pair of a micro-batch in one forward pass and the best N chunks
+per query are kept. Scores are cached by (query hash, chunk id), and the number
+of pairs scored per batch is capped so re-ranking stays within a latency budget.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from .cache import TTLCache
+from .retrieval import Hit
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+# Scores (query, passage) pairs; higher is more relevant
+PairScorer = Callable[[List[Tuple[str, str]]], Sequence[float]]
+
+
+def load_cross_encoder(model_id: str, max_length: int = 512) -> PairScorer:
+    """Load a sentence-transformers cross-encoder on CPU and return its scorer."""
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_id, max_length=max_length, device="cpu")
+    return lambda pairs: model.predict(pairs, batch_size=64, show_progress_bar=False)
+
+
+class Reranker:
+    """
+    Re-rank retrieval candidates with a pairwise scorer.
+
+    ``latency_budget_ms`` bounds the scoring time per batch: the average cost of
+    a pair is tracked, and when a batch has more uncached pairs than fit in the
+    budget only the best-ranked candidates of each query are scored. Unscored
+    candidates keep their retrieval order after the scored ones.
+    """
+
+    def __init__(
+        self,
+        scorer: PairScorer,
+        latency_budget_ms: float = 150.0,
+        cache_max_entries: int = 10_000,
+        cache_ttl_seconds: float = 3600,
+    ):
+        """
+        Args:
+            scorer: Pairwise relevance scorer (e.g. from load_cross_encoder)
+            latency_budget_ms: Target scoring time per batch; 0 disables the cap
+            cache_max_entries: Maximum cached (query, chunk) scores
+            cache_ttl_seconds: Lifetime of a cached score
+        """
+        self.scorer = scorer
+        self.latency_budget_ms = latency_budget_ms
+        self.cache = TTLCache(max_entries=cache_max_entries, ttl_seconds=cache_ttl_seconds)
+        self._ms_per_pair: Optional[float] = None
+        self._fingerprint: Any = None
+        self._lock = threading.Lock()
+        self.scored_pairs = 0
+        self.budget_limited_batches = 0
+
+    def validate(self, fingerprint: Any) -> None:
+        """Drop cached scores if the knowledge base fingerprint changed."""
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                if self._fingerprint is not None:
+                    self.cache.clear()
+                self._fingerprint = fingerprint
+
+    def warm_up(self, pairs: int = 16) -> None:
+        """
+        Load the scorer and measure its per-pair cost before the first request.
+
+        The first call pays one-time initialisation and is not timed; a second
+        batch of ``pairs`` seeds the latency budget, so the first real batch is
+        already capped.
+        """
+        batch = [("warm-up query", "warm-up passage")] * pairs
+        self.scorer(batch[:1])
+        started = time.perf_counter()
+        self.scorer(batch)
+        self._observe((time.perf_counter() - started) * 1000, pairs)
+
+    def rerank_many(
+        self,
+        queries: Sequence[str],
+        candidates: Sequence[Sequence[Hit]],
+        top_n: int,
+    ) -> List[List[Hit]]:
+        """
+        Re-rank the candidates of each query and keep the best ``top_n``.
+
+        Args:
+            queries: Retrieval queries
+            candidates: Candidate chunks per query, in retrieval order
+            top_n: Chunks kept per query
+
+        Returns:
+            The re-ranked chunks per query, best first
+        """
+        query_keys = [hashlib.sha1(query.encode("utf-8")).hexdigest()[:16] for query in queries]
+        scores: List[dict] = []
+        pending: List[Tuple[int, int, int]] = []  # (rank, query index, candidate index)
+        for qi, (key, hits) in enumerate(zip(query_keys, candidates)):
+            cached = {}
+            for ci, (chunk_id, _, _) in enumerate(hits):
+                score = self.cache.get((key, chunk_id))
+                if score is None:
+                    pending.append((ci, qi, ci))
+                else:
+                    cached[ci] = score
+            scores.append(cached)
+
+        # Score the best-ranked candidates of every query first
+        pending.sort()
+        limit = self._pair_limit(minimum=top_n * len(queries))
+        if limit is not None and len(pending) > limit:
+            self.budget_limited_batches += 1
+            logger.info(f"Re-ranking {limit} of {len(pending)} pairs to stay within the latency budget")
+            pending = pending[:limit]
+
+        if pending:
+            pairs = [(queries[qi], candidates[qi][ci][1]) for _, qi, ci in pending]
+            started = time.perf_counter()
+            pair_scores = self.scorer(pairs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._observe(elapsed_ms, len(pairs))
+            if self.latency_budget_ms and elapsed_ms > self.latency_budget_ms:
+                logger.warning(f"Re-ranking took {elapsed_ms:.0f}ms (budget {self.latency_budget_ms:.0f}ms)")
+
+            for (_, qi, ci), score in zip(pending, pair_scores):
+                score = float(score)
+                scores[qi][ci] = score
+                self.cache.set((query_keys[qi], candidates[qi][ci][0]), score)
+
+        reranked = []
+        for hits, hit_scores in zip(candidates, scores):
+            scored = sorted(hit_scores, key=lambda ci: hit_scores[ci], reverse=True)
+            unscored = [ci for ci in range(len(hits)) if ci not in hit_scores]
+            reranked.append([hits[ci] for ci in scored + unscored][:top_n])
+        return reranked
+
+    def stats(self) -> dict:
+        """Return scoring counters and the score cache statistics."""
+        return {
+            "scored_pairs": self.scored_pairs,
+            "budget_limited_batches": self.budget_limited_batches,
+            "ms_per_pair": self._ms_per_pair,
+            "cache": self.cache.stats(),
+        }
+
+    def _pair_limit(self, minimum: int) -> Optional[int]:
+        if not self.latency_budget_ms or self._ms_per_pair is None:
+            return None
+        # Per-pair cost includes fixed overhead, so small batches over-estimate it;
+        # always score at least the top_n of each query
+        return max(minimum, int(self.latency_budget_ms / self._ms_per_pair))
+
+    def _observe(self, elapsed_ms: float, pairs: int) -> None:
+        with self._lock:
+            self.scored_pairs += pairs
+            per_pair = elapsed_ms / pairs
+            # Exponential moving average of the per-pair cost
+            if self._ms_per_pair is None:
+                self._ms_per_pair = per_pair
+            else:
+                self._ms_per_pair = 0.8 * self._ms_per_pair + 0.2 * per_pair
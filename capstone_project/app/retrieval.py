@@ -0,0 +1,341 @@
+# app/retrieval.py
+"""
+Hybrid retrieval for the RAG knowledge base.
+
+Dense embeddings find paraphrases but handle exact identifiers (SOP IDs, part
+numbers) badly; BM25 is the opposite. The hybrid retriever runs both over the
+same pre-filtered candidate set (documents for the equipment type, plus
+documents that apply to all equipment) and fuses the two rankings with
+reciprocal rank fusion.
+
+The BM25 index is held in process and rebuilt when the knowledge base
+fingerprint changes. Vectors come from a store: ``ChromaStore`` (the Chroma
+collection) or ``ann_index.AnnIndexManager`` (an in-process snapshot).
+"""
+
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .knowledge_base import COLLECTION_NAME, GENERIC_EQUIPMENT_TYPE, collection_fingerprint
+
+logger = logging.getLogger("manufacturing_copilot_api")
+
+# (chunk id, text, metadata)
+Hit = Tuple[str, str, Dict[str, Any]]
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms for BM25.
+
+    Compound identifiers are kept whole *and* split into their parts, so
+    "SOP-123" matches the query "sop-123" exactly as well as "SOP 123".
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        terms.append(token)
+        parts = re.split(r"[-_./]", token)
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part)
+    return terms
+
+
+def allowed_equipment_types(equipment_type: Optional[str]) -> Optional[List[str]]:
+    """Return the equipment types to search for a query (None = no filter)."""
+    if equipment_type is None or equipment_type == GENERIC_EQUIPMENT_TYPE:
+        return None
+    return [equipment_type, GENERIC_EQUIPMENT_TYPE]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    weights: Optional[Sequence[float]] = None,
+    k: int = 60,
+) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of IDs into one.
+
+    Each ID scores ``sum(weight / (k + rank))`` over the rankings it appears in,
+    which needs no normalisation between BM25 and vector distances.
+
+    Args:
+        rankings: Lists of IDs, best first
+        weights: Optional weight per ranking
+        k: Damping constant (60 is the usual choice)
+
+    Returns:
+        (id, fused score) pairs, best first
+    """
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking, weight in zip(rankings, weights):
+        for rank, item_id in enumerate(ranking):
+            scores[item_id] += weight / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the knowledge base chunks.
+
+    Posting weights are precomputed at build time, so a search is one scatter-add
+    per query term followed by a top-k selection.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[str] = []
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._type_codes: Dict[str, int] = {}
+        self._doc_types = np.zeros(0, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(
+        cls,
+        ids: Sequence[str],
+        texts: Sequence[str],
+        metadatas: Sequence[Optional[Dict[str, Any]]],
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> "BM25Index":
+        """Build an index from chunk IDs, texts and metadata."""
+        index = cls(k1=k1, b=b)
+        index.ids = list(ids)
+        n_docs = len(index.ids)
+
+        doc_lengths = np.zeros(n_docs, dtype=np.float32)
+        raw_postings: Dict[str, Tuple[List[int], List[int]]] = defaultdict(lambda: ([], []))
+        doc_types = np.zeros(n_docs, dtype=np.int32)
+        for doc_index, (text, metadata) in enumerate(zip(texts, metadatas)):
+            term_counts = Counter(tokenize(text or ""))
+            doc_lengths[doc_index] = sum(term_counts.values())
+            for term, count in term_counts.items():
+                doc_list, tf_list = raw_postings[term]
+                doc_list.append(doc_index)
+                tf_list.append(count)
+            equipment_type = (metadata or {}).get("equipment_type", GENERIC_EQUIPMENT_TYPE)
+            doc_types[doc_index] = index._type_codes.setdefault(equipment_type, len(index._type_codes))
+
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        for term, (doc_list, tf_list) in raw_postings.items():
+            docs = np.asarray(doc_list, dtype=np.int32)
+            tf = np.asarray(tf_list, dtype=np.float32)
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = k1 * (1 - b + b * doc_lengths[docs] / (avg_length or 1.0))
+            index._postings[term] = (docs, (idf * tf * (k1 + 1) / (tf + norm)).astype(np.float32))
+        index._doc_types = doc_types
+        return index
+
+    def search(
+        self,
+        query: str,
+        k: int,
+        equipment_types: Optional[Sequence[str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """
+        Return the top ``k`` (id, score) pairs for ``query``.
+
+        Args:
+            query: Free-text query
+            k: Number of results
+            equipment_types: Only return chunks with one of these equipment types
+        """
+        if not self.ids:
+            return []
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                docs, weights = posting
+                scores[docs] += weights
+
+        if equipment_types is not None:
+            codes = [self._type_codes[t] for t in equipment_types if t in self._type_codes]
+            scores[~np.isin(self._doc_types, codes)] = 0.0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self.ids[i], float(scores[i])) for i in candidates]
+
+
+class ChromaStore:
+    """Vector store backed by the Chroma collection."""
+
+    def __init__(self, collection, client=None, name: str = COLLECTION_NAME):
+        self.collection = collection
+        self.client = client
+        self.name = name
+
+    def fingerprint(self) -> Any:
+        """Return the knowledge base fingerprint (count, kb_version)."""
+        return collection_fingerprint(self.client, self.name)
+
+    def query(
+        self,
+        embeddings: List[Sequence[float]],
+        n_results: int,
+        equipment_types: Optional[List[str]] = None,
+    ) -> List[List[Hit]]:
+        """Return the nearest chunks for each embedding, best first."""
+        where = {"equipment_type": {"$in": equipment_types}} if equipment_types else None
+        try:
+            results = self.collection.query(
+                query_embeddings=embeddings,
+                n_results=n_results,
+                where=where,
+                include=["documents", "metadatas", "distances"],
+            )
+        except Exception as e:
+            if where is None:
+                raise
+            # Very selective filters can fail in the HNSW index; search unfiltered
+            logger.warning(f"Filtered vector query failed ({e}); retrying without filter")
+            return self.query(embeddings, n_results, None)
+
+        return [
+            [(item_id, text, metadata or {}) for item_id, text, metadata in zip(ids, texts, metadatas)]
+            for ids, texts, metadatas in zip(results["ids"], results["documents"], results["metadatas"])
+        ]
+
+    def get(self, ids: List[str]) -> List[Hit]:
+        """Return the chunks with the given IDs."""
+        fetched = self.collection.get(ids=ids, include=["documents", "metadatas"])
+        return [
+            (item_id, text, metadata or {})
+            for item_id, text, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"])
+        ]
+
+    def iter_all(self, page_size: int = 5000) -> Iterator[Hit]:
+        """Yield every chunk in the collection, a page at a time."""
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            for item_id, text, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                yield item_id, text, metadata or {}
+            if len(page["ids"]) < page_size:
+                break
+            offset += page_size
+
+
+class HybridRetriever:
+    """
+    BM25 + vector retrieval with an equipment-type pre-filter.
+
+    Safe to call from several worker threads; the BM25 index is swapped
+    atomically when it is rebuilt.
+    """
+
+    def __init__(
+        self,
+        store,
+        candidates: int = 10,
+        bm25_weight: float = 1.0,
+        vector_weight: float = 1.0,
+        hybrid: bool = True,
+    ):
+        """
+        Args:
+            store: Vector store (ChromaStore or AnnIndexManager)
+            candidates: Results taken from each retriever before fusion
+            bm25_weight: Weight of the BM25 ranking in the fusion
+            vector_weight: Weight of the vector ranking in the fusion
+            hybrid: False disables BM25 (vector search with pre-filter only)
+        """
+        self.store = store
+        self.candidates = candidates
+        self.bm25_weight = bm25_weight
+        self.vector_weight = vector_weight
+        self.hybrid = hybrid
+        self.index = BM25Index()
+        self._fingerprint: Any = None
+        self._lock = threading.Lock()
+
+    def refresh(self, fingerprint: Any) -> bool:
+        """
+        Rebuild the BM25 index if the knowledge base fingerprint changed.
+
+        Returns:
+            True if the index was rebuilt
+        """
+        if not self.hybrid or fingerprint == self._fingerprint:
+            return False
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return False
+            ids: List[str] = []
+            texts: List[str] = []
+            metadatas: List[Dict[str, Any]] = []
+            for item_id, text, metadata in self.store.iter_all():
+                ids.append(item_id)
+                texts.append(text)
+                metadatas.append(metadata)
+            self.index = BM25Index.build(ids, texts, metadatas)
+            self._fingerprint = fingerprint
+        logger.info(f"Built BM25 index over {len(ids)} chunks")
+        return True
+
+    def retrieve_many(
+        self,
+        queries: Sequence[str],
+        query_embeddings: Sequence[Sequence[float]],
+        equipment_types: Sequence[Optional[str]],
+        k: int = 3,
+    ) -> List[List[Hit]]:
+        """
+        Retrieve the top ``k`` chunks for each query.
+
+        Queries with the same equipment filter share one vector query; chunks
+        found only by BM25 are fetched with a single ``get`` for the whole batch.
+
+        Returns:
+            One list of (id, text, metadata) per query, best first
+        """
+        n_vector = max(k, self.candidates) if self.hybrid else k
+        vector_hits: List[List[Hit]] = [[] for _ in queries]
+
+        groups: Dict[Optional[str], List[int]] = defaultdict(list)
+        for i, equipment_type in enumerate(equipment_types):
+            groups[equipment_type].append(i)
+        for equipment_type, positions in groups.items():
+            results = self.store.query(
+                [query_embeddings[i] for i in positions],
+                n_vector,
+                allowed_equipment_types(equipment_type),
+            )
+            for position, hits in zip(positions, results):
+                vector_hits[position] = hits
+
+        if not self.hybrid:
+            return [hits[:k] for hits in vector_hits]
+
+        index = self.index
+        fused_ids: List[List[str]] = []
+        known: Dict[str, Hit] = {hit[0]: hit for hits in vector_hits for hit in hits}
+        for query, equipment_type, hits in zip(queries, equipment_types, vector_hits):
+            bm25 = index.search(query, n_vector, allowed_equipment_types(equipment_type))
+            fused = reciprocal_rank_fusion(
+                [[hit[0] for hit in hits], [item_id for item_id, _ in bm25]],
+                [self.vector_weight, self.bm25_weight],
+            )
+            fused_ids.append([item_id for item_id, _ in fused[:k]])
+
+        missing = list({item_id for ids in fused_ids for item_id in ids if item_id not in known})
+        if missing:
+            for hit in self.store.get(missing):
+                known[hit[0]] = hit
+
+        return [[known[item_id] for item_id in ids if item_id in known] for ids in fused_ids]
@@ -0,0 +1,216 @@
+"""
+Predictive Maintenance Inference (NumPy only)
+Risk bucketing and a compiled, array-backed evaluator for the trained RandomForest
+
+``compile_forest`` flattens every tree of a fitted forest into contiguous
+node arrays (feature, threshold, children, leaf probability) and
+``CompiledForest`` evaluates them for a whole batch at once. The arrays are
+stored as plain ``.npy`` files and loaded with ``np.load(mmap_mode='r')``, so
+every worker process maps the same pages instead of unpickling private copies
+of the scikit-learn objects. This module must not import pandas or sklearn.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Lower probability bound of each risk level, highest first
+RISK_THRESHOLDS = ((0.7, 'Critical'), (0.4, 'High'), (0.2, 'Medium'))
+
+COMPILED_FORMAT_VERSION = 1
+COMPILED_ARRAYS = ('feature', 'threshold', 'children', 'value', 'roots', 'mean', 'scale')
+
+
+def risk_levels(probabilities: np.ndarray) -> np.ndarray:
+    """Bucket failure probabilities into risk levels (array of strings)."""
+    probabilities = np.asarray(probabilities)
+    return np.select(
+        [probabilities >= bound for bound, _ in RISK_THRESHOLDS],
+        [level for _, level in RISK_THRESHOLDS],
+        default='Low'
+    )
+
+
+def risk_level(probability: float) -> str:
+    """Scalar ``risk_levels`` for the single-row path."""
+    for bound, level in RISK_THRESHOLDS:
+        if probability >= bound:
+            return level
+    return 'Low'
+
+
+def compile_forest(forest, scaler, feature_names: List[str], output_dir: str) -> Path:
+    """
+    Flatten a fitted binary RandomForestClassifier into ``.npy`` node arrays
+
+    Each tree is renumbered breadth-first so that a node's right child
+    directly follows its left one: ``children[i]`` holds the left child and a
+    step is ``children[i] + (x[feature[i]] > threshold[i])``. Leaves point to
+    themselves with an infinite threshold, so every sample can be stepped
+    exactly ``max_depth`` times without branching on leaf-ness. Node indices
+    are global across trees. Leaf values are P(class 1), normalised the same
+    way as ``DecisionTreeClassifier.predict_proba``.
+
+    Args:
+        forest: Fitted RandomForestClassifier
+        scaler: Fitted StandardScaler applied before the forest
+        feature_names: Column order the forest was trained on
+        output_dir: Directory to write the arrays and ``forest.json`` to
+
+    Returns:
+        Path of the written directory
+    """
+    if len(forest.classes_) != 2:
+        raise ValueError(f"Only binary forests can be compiled, got classes {forest.classes_}")
+
+    features, thresholds, children, values, roots = [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+
+        # Breadth-first order, appending both children of a split together
+        order = [0]
+        first_child = np.empty(tree.node_count, dtype=np.int64)
+        for position in range(tree.node_count):
+            node = order[position]
+            if tree.children_left[node] == -1:
+                first_child[position] = position
+            else:
+                first_child[position] = len(order)
+                order.extend((tree.children_left[node], tree.children_right[node]))
+        order = np.asarray(order)
+        is_leaf = tree.children_left[order] == -1
+
+        features.append(np.where(is_leaf, 0, tree.feature[order]))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+        children.append(first_child + offset)
+        counts = tree.value[order, 0, :]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values.append(np.nan_to_num(counts[:, 1] / counts.sum(axis=1)))
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    arrays = {
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(thresholds).astype(np.float64),
+        'children': np.concatenate(children).astype(np.int32),
+        'value': np.concatenate(values).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'mean': np.asarray(scaler.mean_, dtype=np.float64),
+        'scale': np.asarray(scaler.scale_, dtype=np.float64),
+    }
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(output_path / f'{name}.npy', np.ascontiguousarray(array))
+    with open(output_path / 'forest.json', 'w') as f:
+        json.dump({
+            'format_version': COMPILED_FORMAT_VERSION,
+            'feature_names': list(feature_names),
+            'classes': [c.item() if hasattr(c, 'item') else c for c in forest.classes_],
+            'n_trees': len(roots),
+            'n_nodes': offset,
+            'max_depth': max_depth,
+        }, f, indent=2)
+
+    logger.info(f"Compiled forest ({len(roots)} trees, {offset} nodes) saved to {output_path}")
+    return output_path
+
+
+class CompiledForest:
+    """
+    Batched NumPy evaluator for a forest written by ``compile_forest``
+
+    Takes raw (unscaled) features in ``feature_names`` order; the scaler is
+    applied from the stored mean / scale arrays.
+    """
+
+    # Rows evaluated per step; bounds the (rows, trees) index matrices
+    CHUNK_ROWS = 4096
+
+    def __init__(self, arrays: Dict[str, np.ndarray], metadata: Dict[str, Any]):
+        self.feature_names: List[str] = metadata['feature_names']
+        self.classes = metadata['classes']
+        self.max_depth: int = metadata['max_depth']
+        self.metadata = metadata
+        for name in COMPILED_ARRAYS:
+            setattr(self, f'_{name}', arrays[name])
+
+    @classmethod
+    def load(cls, compiled_dir: str, mmap_mode: str = 'r') -> 'CompiledForest':
+        """
+        Load compiled arrays, memory-mapped by default
+
+        Raises:
+            FileNotFoundError: If ``forest.json`` or an array is missing
+            ValueError: If the directory was written by an incompatible version
+        """
+        path = Path(compiled_dir)
+        with open(path / 'forest.json', 'r') as f:
+            metadata = json.load(f)
+        if metadata.get('format_version') != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled forest format in {path}")
+
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode=mmap_mode) for name in COMPILED_ARRAYS}
+        logger.info(f"Compiled forest loaded from {path} ({metadata['n_trees']} trees)")
+        return cls(arrays, metadata)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Failure probability for each row of an (n, n_features) raw feature matrix"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(
+                f"Expected an (n, {len(self.feature_names)}) feature matrix, got {X.shape}"
+            )
+
+        n_features = len(self.feature_names)
+        roots = self._roots.astype(np.intp)
+        probabilities = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), self.CHUNK_ROWS):
+            chunk = X[start:start + self.CHUNK_ROWS]
+            # Trees compare float32 inputs against float64 thresholds
+            scaled = ((chunk - self._mean) / self._scale).astype(np.float32).ravel()
+            row_offsets = (np.arange(len(chunk), dtype=np.intp) * n_features)[:, None]
+            nodes = np.broadcast_to(roots, (len(chunk), len(roots)))
+            for _ in range(self.max_depth):
+                go_right = scaled.take(row_offsets + self._feature.take(nodes)) > self._threshold.take(nodes)
+                nodes = self._children.take(nodes) + go_right
+            probabilities[start:start + len(chunk)] = self._value.take(nodes).mean(axis=1)
+        return probabilities
+
+    def predict(self, X: np.ndarray) -> Dict[str, Any]:
+        """
+        Score a raw feature matrix
+
+        Returns:
+            Dictionary shaped like ``PredictiveMaintenanceModel.predict``
+        """
+        probabilities = self.predict_proba(X)
+        # predict() is argmax over predict_proba, ties going to the first class
+        predictions = np.where(probabilities > 0.5, self.classes[1], self.classes[0])
+        return {
+            'predictions': predictions.tolist(),
+            'probabilities': probabilities.tolist(),
+            'risk_levels': risk_levels(probabilities).tolist()
+        }
+
+    def predict_one(self, features: Mapping[str, float]) -> Tuple[Any, float, str]:
+        """
+        Score one feature row
+
+        Returns:
+            (predicted class, failure probability, risk level)
+        """
+        row = np.array([[features[name] for name in self.feature_names]], dtype=np.float64)
+        probability = float(self.predict_proba(row)[0])
+        label = self.classes[1] if probability > 0.5 else self.classes[0]
+        return label, probability, risk_level(probability)
@@ -0,0 +1,108 @@
+"""
+Predictive Maintenance Model Store
+Saves and loads model artifacts in a layout every worker can memory-map
+
+A model directory holds the training artifacts written by
+``PredictiveMaintenanceModel.save_model`` (``model.joblib``, ``scaler.joblib``,
+``metadata.json``) and the serving artifacts in ``compiled/`` (see
+``inference.compile_forest``). Serving only ever maps ``compiled/`` read-only,
+so N uvicorn workers share one physical copy through the page cache. If only
+the joblib artifacts exist, the first loader compiles them once and publishes
+``compiled/`` atomically for everyone else.
+
+scikit-learn and pandas are imported only on that fallback path.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from ml_models.predictive_maintenance.inference import CompiledForest
+
+logger = logging.getLogger(__name__)
+
+COMPILED_DIRNAME = 'compiled'
+
+
+class ModelStore:
+    """Artifacts of one predictive maintenance model directory"""
+
+    def __init__(self, model_dir: str):
+        self.model_dir = Path(model_dir)
+        self.compiled_dir = self.model_dir / COMPILED_DIRNAME
+
+    def has_compiled(self) -> bool:
+        """Whether serving arrays have been published"""
+        return (self.compiled_dir / 'forest.json').exists()
+
+    def has_source(self) -> bool:
+        """Whether joblib training artifacts exist"""
+        return (self.model_dir / 'metadata.json').exists()
+
+    def exists(self) -> bool:
+        """Whether the directory holds a model in either form"""
+        return self.has_compiled() or self.has_source()
+
+    def publish_compiled(self, model) -> Path:
+        """
+        Compile a trained random forest and publish it as ``compiled/``
+
+        Arrays are written to a temporary sibling directory and renamed into
+        place, so a concurrent loader never sees a half-written directory.
+        Workers that already mapped a previous version keep their mapping.
+
+        Args:
+            model: Trained PredictiveMaintenanceModel with a random forest
+        """
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f'.{COMPILED_DIRNAME}-', dir=self.model_dir))
+        try:
+            model.export_compiled(str(staging))
+            if self.compiled_dir.exists():
+                retired = Path(tempfile.mkdtemp(prefix=f'.{COMPILED_DIRNAME}-old-', dir=self.model_dir))
+                os.rename(self.compiled_dir, retired / COMPILED_DIRNAME)
+                os.rename(staging, self.compiled_dir)
+                shutil.rmtree(retired, ignore_errors=True)
+            else:
+                os.rename(staging, self.compiled_dir)
+        except OSError:
+            # Another process published first; its arrays are equivalent
+            if not self.has_compiled():
+                raise
+            logger.info(f"Compiled model already published at {self.compiled_dir}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        return self.compiled_dir
+
+    def load(self, mmap_mode: str = 'r') -> Any:
+        """
+        Load a predictor for serving
+
+        Returns:
+            ``CompiledForest`` over memory-mapped arrays, or a ``FastPredictor``
+            for models that cannot be compiled (gradient boosting)
+
+        Raises:
+            FileNotFoundError: If the directory holds no model
+        """
+        if self.has_compiled():
+            return CompiledForest.load(str(self.compiled_dir), mmap_mode=mmap_mode)
+        if not self.has_source():
+            raise FileNotFoundError(f"No predictive maintenance model in {self.model_dir}")
+
+        from ml_models.predictive_maintenance.train_model import (
+            FastPredictor,
+            PredictiveMaintenanceModel,
+        )
+
+        model = PredictiveMaintenanceModel.load_model(str(self.model_dir))
+        if model.model_type != 'random_forest':
+            return FastPredictor(model)
+
+        logger.info(f"Compiling {self.model_dir} for memory-mapped serving (one-time)")
+        self.publish_compiled(model)
+        return CompiledForest.load(str(self.compiled_dir), mmap_mode=mmap_mode)
+
@@ -0,0 +1,196 @@
+"""
+Predictive Maintenance Model Registry
+Versioned model directories with atomic "current" and "candidate" pointers
+
+Layout (under ``ml_models/predictive_maintenance`` by default)::
+
+    CURRENT                 name of the live version
+    CANDIDATE               optional version shadow-scored on live traffic
+    versions/<version>/     one ModelStore directory (joblib + compiled/)
+                            and a PUBLISHED timestamp, which orders versions
+
+Publishing writes the whole version directory under a temporary name, renames
+it into ``versions/`` and only then replaces the pointer file with
+``os.replace``, so readers see either the old or the new version, never a
+partial one. Serving processes (``MLAgent``) poll the pointers and hot-swap.
+
+A directory written by the older flat ``save_model`` layout (no ``CURRENT``)
+is served as version ``unversioned``.
+
+Usage:
+    python -m ml_models.predictive_maintenance.registry list
+    python -m ml_models.predictive_maintenance.registry activate <version>
+    python -m ml_models.predictive_maintenance.registry candidate <version>
+    python -m ml_models.predictive_maintenance.registry clear-candidate
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+from uuid import uuid4
+
+# Allow running as a script as well as with -m
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from ml_models.predictive_maintenance.model_store import ModelStore  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = 'CURRENT'
+CANDIDATE_FILE = 'CANDIDATE'
+VERSIONS_DIR = 'versions'
+PUBLISHED_FILE = 'PUBLISHED'
+UNVERSIONED = 'unversioned'
+
+
+class ModelRegistry:
+    """Versioned predictive maintenance models under one root directory"""
+
+    def __init__(self, root: str = './ml_models/predictive_maintenance'):
+        self.root = Path(root)
+        self.versions_dir = self.root / VERSIONS_DIR
+
+    def versions(self) -> List[str]:
+        """Published version names, oldest first (by publish time, not name: v9 precedes v10)"""
+        if not self.versions_dir.exists():
+            return []
+        paths = [p for p in self.versions_dir.iterdir() if p.is_dir() and not p.name.startswith('.')]
+        return [p.name for p in sorted(paths, key=lambda p: (_published_at(p), p.name))]
+
+    def store(self, version: str) -> ModelStore:
+        """ModelStore for a version (``unversioned`` is the root itself)"""
+        if version == UNVERSIONED:
+            return ModelStore(str(self.root))
+        return ModelStore(str(self.versions_dir / version))
+
+    def current_version(self) -> Optional[str]:
+        """Live version, falling back to a legacy flat layout; None if nothing is published"""
+        version = self._read_pointer(CURRENT_FILE)
+        if version is None and ModelStore(str(self.root)).exists():
+            return UNVERSIONED
+        return version
+
+    def candidate_version(self) -> Optional[str]:
+        """Version to shadow-score, if any"""
+        return self._read_pointer(CANDIDATE_FILE)
+
+    def publish(self, model, version: Optional[str] = None, activate: bool = True, keep: int = 5) -> str:
+        """
+        Save a trained model as a new version
+
+        Args:
+            model: Trained PredictiveMaintenanceModel
+            version: Version name (defaults to a timestamp)
+            activate: Point CURRENT at the new version; otherwise it only
+                becomes available for ``activate`` / ``set_candidate``
+            keep: Number of versions kept on disk (CURRENT and CANDIDATE are
+                always kept)
+
+        Returns:
+            The published version name
+        """
+        version = version or f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+        target = self.versions_dir / version
+        if target.exists():
+            raise ValueError(f"Model version {version} already exists")
+
+        self.versions_dir.mkdir(parents=True, exist_ok=True)
+        staging = self.versions_dir / f'.{version}.tmp'
+        try:
+            model.save_model(str(staging))
+            (staging / PUBLISHED_FILE).write_text(str(time.time_ns()))
+            os.replace(staging, target)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Published predictive maintenance model {version}")
+
+        if activate:
+            self.activate(version)
+        self.remove_old_versions(keep)
+        return version
+
+    def activate(self, version: str) -> None:
+        """Atomically make ``version`` the live model (also used to roll back)"""
+        self._require(version)
+        self._write_pointer(CURRENT_FILE, version)
+        logger.info(f"Activated predictive maintenance model {version}")
+
+    def set_candidate(self, version: Optional[str]) -> None:
+        """Shadow-score ``version`` on live traffic, or stop with None"""
+        if version is None:
+            (self.root / CANDIDATE_FILE).unlink(missing_ok=True)
+            logger.info("Cleared predictive maintenance shadow candidate")
+            return
+        self._require(version)
+        self._write_pointer(CANDIDATE_FILE, version)
+        logger.info(f"Shadow-scoring predictive maintenance model {version}")
+
+    def remove_old_versions(self, keep: int) -> None:
+        """Delete all but the newest ``keep`` versions, never CURRENT or CANDIDATE"""
+        pinned = {self._read_pointer(CURRENT_FILE), self._read_pointer(CANDIDATE_FILE)} - {None}
+        # Processes still mapping a removed version keep their pages until they swap
+        removable = [v for v in self.versions() if v not in pinned]
+        spare = max(0, keep - len(pinned))
+        for old in removable[:max(0, len(removable) - spare)]:
+            shutil.rmtree(self.versions_dir / old, ignore_errors=True)
+
+    def _require(self, version: str) -> None:
+        if not self.store(version).exists():
+            raise ValueError(f"Unknown model version {version} in {self.root}")
+
+    def _read_pointer(self, name: str) -> Optional[str]:
+        try:
+            return (self.root / name).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_pointer(self, name: str, version: str) -> None:
+        # Readers see either the old or the new pointer, never a partial one
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f'.{name}.{uuid4().hex}'
+        tmp.write_text(version)
+        os.replace(tmp, self.root / name)
+
+
+def _published_at(path: Path) -> int:
+    """Publish time in ns; directory mtime for versions published without a timestamp"""
+    try:
+        return int((path / PUBLISHED_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return path.stat().st_mtime_ns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage predictive maintenance model versions")
+    parser.add_argument('command', choices=['list', 'activate', 'candidate', 'clear-candidate'])
+    parser.add_argument('version', nargs='?', help="Version for activate / candidate")
+    parser.add_argument('--root', default='./ml_models/predictive_maintenance', help="Registry root directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    registry = ModelRegistry(args.root)
+    if args.command in ('activate', 'candidate') and not args.version:
+        parser.error(f"{args.command} needs a version")
+
+    if args.command == 'list':
+        current, candidate = registry.current_version(), registry.candidate_version()
+        for version in registry.versions():
+            marker = ' (current)' if version == current else ' (candidate)' if version == candidate else ''
+            print(f"{version}{marker}")
+        if current == UNVERSIONED:
+            print(f"{UNVERSIONED} (current, legacy flat layout)")
+    elif args.command == 'activate':
+        registry.activate(args.version)
+    elif args.command == 'candidate':
+        registry.set_candidate(args.version)
+    else:
+        registry.set_candidate(None)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,9 +11,23 @@ from sklearn.metrics import classification_report, confusion_matrix, roc_auc_sco
 from sklearn.preprocessing import StandardScaler
 import joblib
 import logging
+import threading
 from pathlib import Path
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Mapping
+import argparse
 import json
+import sys
+
+# Allow running as a script: python ml_models/predictive_maintenance/train_model.py
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from ml_models.predictive_maintenance.inference import (  # noqa: E402
+    compile_forest,
+    risk_level,
+    risk_levels,
+)
+from ml_models.predictive_maintenance.model_store import ModelStore  # noqa: E402
+from ml_models.predictive_maintenance.registry import ModelRegistry  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -239,12 +253,13 @@ class PredictiveMaintenanceModel:
         
         return metrics
     
-    def predict(self, features: pd.DataFrame) -> Dict[str, Any]:
+    def predict(self, features) -> Dict[str, Any]:
         """
         Make predictions on new data
         
         Args:
-            features: DataFrame with feature values
+            features: DataFrame with feature values, or a 2-D array whose
+                columns are already in ``feature_names`` order
             
         Returns:
             Dictionary with predictions and probabilities
@@ -252,37 +267,33 @@ class PredictiveMaintenanceModel:
         if self.model is None:
             raise ValueError("Model not trained. Call train() first.")
         
-        # Ensure all features are present
-        missing_features = set(self.feature_names) - set(features.columns)
-        if missing_features:
-            raise ValueError(f"Missing features: {missing_features}")
-        
-        # Select and order features
-        X = features[self.feature_names]
-        
-        # Scale
-        X_scaled = self.scaler.transform(X)
-        
-        # Predict
-        predictions = self.model.predict(X_scaled)
-        probabilities = self.model.predict_proba(X_scaled)[:, 1]
-        
-        # Determine risk level
-        risk_levels = []
-        for prob in probabilities:
-            if prob >= 0.7:
-                risk_levels.append('Critical')
-            elif prob >= 0.4:
-                risk_levels.append('High')
-            elif prob >= 0.2:
-                risk_levels.append('Medium')
-            else:
-                risk_levels.append('Low')
+        if isinstance(features, pd.DataFrame):
+            # Ensure all features are present
+            missing_features = set(self.feature_names) - set(features.columns)
+            if missing_features:
+                raise ValueError(f"Missing features: {missing_features}")
+            
+            # Select and order features
+            X = features[self.feature_names].to_numpy(dtype=np.float64)
+        else:
+            X = np.asarray(features, dtype=np.float64)
+            if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+                raise ValueError(
+                    f"Expected an (n, {len(self.feature_names)}) feature matrix, got {X.shape}"
+                )
+        
+        # Scale (same arithmetic as StandardScaler.transform, without its per-call validation)
+        X_scaled = (X - self.scaler.mean_) / self.scaler.scale_
+        
+        # One probability pass; the class prediction is its argmax, as in predict()
+        proba = self.model.predict_proba(X_scaled)
+        predictions = self.model.classes_.take(np.argmax(proba, axis=1))
+        probabilities = proba[:, 1]
         
         return {
             'predictions': predictions.tolist(),
             'probabilities': probabilities.tolist(),
-            'risk_levels': risk_levels
+            'risk_levels': risk_levels(probabilities).tolist()
         }
     
     def save_model(self, output_dir: str = './ml_models/predictive_maintenance'):
@@ -305,6 +316,16 @@ class PredictiveMaintenanceModel:
         with open(metadata_file, 'w') as f:
             json.dump(self.model_metadata, f, indent=2, default=str)
         logger.info(f"Metadata saved to {metadata_file}")
+        
+        # Publish the memory-mappable form MLAgent serves from
+        if self.model_type == 'random_forest':
+            ModelStore(str(output_path)).publish_compiled(self)
+    
+    def export_compiled(self, output_dir: str) -> Path:
+        """Flatten the trained forest and scaler into memory-mappable .npy arrays"""
+        if not isinstance(self.model, RandomForestClassifier) or self.feature_names is None:
+            raise ValueError("Only a trained random_forest model can be compiled")
+        return compile_forest(self.model, self.scaler, self.feature_names, output_dir)
     
     @classmethod
     def load_model(cls, model_dir: str = './ml_models/predictive_maintenance'):
@@ -328,8 +349,93 @@ class PredictiveMaintenanceModel:
         return instance
 
 
+class FastPredictor:
+    """
+    Low-latency single-row scoring for a trained PredictiveMaintenanceModel
+    
+    Avoids pandas and scikit-learn's per-call input validation: features are
+    written into a preallocated row in ``feature_names`` order, the scaler is
+    folded into precomputed mean / scale arrays, and the forest is walked once
+    for both label and probability on the float32 row the trees compare
+    against. Buffers are per-thread, so one instance can be shared.
+    """
+    
+    def __init__(self, model: 'PredictiveMaintenanceModel'):
+        if model.model is None or model.feature_names is None:
+            raise ValueError("Model not trained. Call train() first.")
+        
+        self._source = model
+        self.feature_names = list(model.feature_names)
+        self.classes = model.model.classes_
+        # Scaled in float64 and then narrowed, exactly as predict() does
+        self._mean = np.asarray(model.scaler.mean_, dtype=np.float64)
+        self._scale = np.asarray(model.scaler.scale_, dtype=np.float64)
+        self._local = threading.local()
+        
+        if isinstance(model.model, RandomForestClassifier):
+            # Per-leaf P(class 1) for each tree, normalised like predict_proba
+            self._trees = []
+            for estimator in model.model.estimators_:
+                value = estimator.tree_.value[:, 0, :]
+                self._trees.append((estimator.tree_, value[:, 1] / value.sum(axis=1)))
+            self._model = None
+        else:
+            self._trees = None
+            self._model = model.model
+    
+    def _buffers(self) -> Tuple[np.ndarray, np.ndarray]:
+        """This thread's preallocated (1, n_features) float64 and float32 rows"""
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            shape = (1, len(self.feature_names))
+            buffers = self._local.buffers = (
+                np.empty(shape, dtype=np.float64), np.empty(shape, dtype=np.float32)
+            )
+        return buffers
+    
+    def predict(self, features) -> Dict[str, Any]:
+        """Batch scoring, delegated to ``PredictiveMaintenanceModel.predict``"""
+        return self._source.predict(features)
+    
+    def predict_one(self, features: Mapping[str, float]) -> Tuple[Any, float, str]:
+        """
+        Score one feature row
+        
+        Args:
+            features: Value for every name in ``feature_names`` (engineered
+                features included)
+            
+        Returns:
+            (predicted class, failure probability, risk level)
+        """
+        raw, row = self._buffers()
+        raw[0] = [features[name] for name in self.feature_names]
+        raw -= self._mean
+        raw /= self._scale
+        row[...] = raw
+        
+        if self._trees is not None:
+            total = 0.0
+            for tree, leaf_proba in self._trees:
+                total += leaf_proba[tree.apply(row)[0]]
+            probability = float(total / len(self._trees))
+        else:
+            probability = float(self._model.predict_proba(row)[0, 1])
+        
+        # predict() is argmax over predict_proba, ties going to the first class
+        label = self.classes[1] if probability > 0.5 else self.classes[0]
+        return label.item(), probability, risk_level(probability)
+
+
 def main():
     """Main training pipeline"""
+    parser = argparse.ArgumentParser(description="Train and publish the predictive maintenance model")
+    parser.add_argument('--registry-dir', default='./ml_models/predictive_maintenance',
+                        help="Model registry root")
+    parser.add_argument('--shadow', action='store_true',
+                        help="Publish as the shadow-scored candidate instead of going live")
+    args = parser.parse_args()
+    
     logger.info("🚀 Starting Predictive Maintenance Model Training Pipeline")
     
     # Initialize model
@@ -341,15 +447,18 @@ def main():
     # Train model
     metrics = model.train(df)
     
-    # Save model
-    model.save_model()
+    # Publish a new version; running MLAgents pick it up without a restart
+    registry = ModelRegistry(args.registry_dir)
+    version = registry.publish(model, activate=not args.shadow)
+    if args.shadow:
+        registry.set_candidate(version)
     
     logger.info("\n✅ Training complete!")
-    logger.info(f"Model saved and ready for deployment")
+    logger.info(f"Model version {version} published {'for shadow scoring' if args.shadow else 'and live'}")
     
     # Test loading
     logger.info("\n🔄 Testing model loading...")
-    loaded_model = PredictiveMaintenanceModel.load_model()
+    loaded_model = PredictiveMaintenanceModel.load_model(str(registry.store(version).model_dir))
     logger.info("✅ Model loaded successfully!")
     
     # Test prediction
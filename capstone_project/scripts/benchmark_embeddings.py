@@ -0,0 +1,81 @@
+"""
+Embedding Backend Benchmark for Manufacturing Copilot
+Measures throughput of each EMBEDDING_BACKEND and its parity with the torch model
+
+Usage:
+    python scripts/benchmark_embeddings.py --backends torch onnx onnx-int8 --texts 512
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.embeddings import BACKENDS, build_embeddings  # noqa: E402
+
+SAMPLE_TEXTS = [
+    "Spindle bearing wear on CNC-{i:03d} causes vibration above {v} mm/s during roughing passes.",
+    "Porosity in weld seam {i}: check shielding gas flow, nozzle condition and wire contamination.",
+    "Hydraulic press {i} lost {v} bar of pressure; inspect the main cylinder seal and relief valve.",
+    "Coating line {i} shows thickness deviation of {v} microns after a partial nozzle clog.",
+    "Assembly station {i} torque check failed; recalibrate the driver and verify fixture alignment.",
+]
+
+
+def make_texts(n):
+    """Generate n varied maintenance-style texts."""
+    return [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)].format(i=i, v=(i * 7) % 50 + 1) for i in range(n)]
+
+
+def benchmark(backend, texts, repeats):
+    """Return (texts/sec, embeddings) for one backend."""
+    embeddings = build_embeddings(backend=backend)
+    embeddings.embed_documents(texts[:8])  # warm-up
+
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        vectors = embeddings.embed_documents(texts)
+        best = min(best, time.perf_counter() - started)
+    return len(texts) / best, np.asarray(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--texts", type=int, default=512, help="Number of texts to embed")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per backend (best is reported)")
+    args = parser.parse_args()
+
+    texts = make_texts(args.texts)
+    print("=" * 60)
+    print(f"EMBEDDING BENCHMARK ({args.texts} texts)")
+    print("=" * 60)
+
+    reference = None
+    for backend in args.backends:
+        try:
+            rate, vectors = benchmark(backend, texts, args.repeats)
+        except Exception as e:
+            print(f"{backend:<12} unavailable: {e}")
+            continue
+
+        if reference is None and backend == "torch":
+            reference = vectors
+        parity = ""
+        if reference is not None and backend != "torch":
+            a = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+            b = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+            cosine = (a * b).sum(axis=1)
+            parity = f"  cosine vs torch: min {cosine.min():.4f} mean {cosine.mean():.4f}"
+        print(f"{backend:<12} {rate:8.1f} texts/sec{parity}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
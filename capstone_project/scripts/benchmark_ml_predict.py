@@ -0,0 +1,124 @@
+"""
+Failure Prediction Benchmark for Manufacturing Copilot
+Compares the DataFrame + scikit-learn path with FastPredictor and the compiled
+NumPy forest, per row and for one batched call
+
+Usage:
+    python scripts/benchmark_ml_predict.py --model-dir ./ml_models --rows 2000
+    (without a trained model, a small one is trained on synthetic data first)
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.ml_agent import MLAgent  # noqa: E402
+from ml_models.predictive_maintenance.inference import CompiledForest  # noqa: E402
+from ml_models.predictive_maintenance.registry import ModelRegistry  # noqa: E402
+from ml_models.predictive_maintenance.train_model import (  # noqa: E402
+    FastPredictor,
+    PredictiveMaintenanceModel,
+)
+
+
+def make_rows(n):
+    """Generate n varied sensor readings."""
+    rng = np.random.default_rng(0)
+    return [
+        {
+            "temperature_avg": float(rng.normal(68, 10)),
+            "vibration_avg": float(rng.normal(2.8, 1.0)),
+            "pressure_avg": float(rng.normal(44, 8)),
+            "hours_since_maintenance": float(rng.uniform(0, 720)),
+            "equipment_age_months": int(rng.integers(1, 120)),
+        }
+        for _ in range(n)
+    ]
+
+
+def load_model_dir(model_dir):
+    """Return the current version's directory, with compiled arrays."""
+    registry = ModelRegistry(os.path.join(model_dir, "predictive_maintenance"))
+    version = registry.current_version()
+    if version is None:
+        print("No trained model found; training one on synthetic data...")
+        model = PredictiveMaintenanceModel(model_type="random_forest")
+        model.train(model.generate_synthetic_data(n_samples=10000))
+        registry = ModelRegistry(os.path.join(tempfile.mkdtemp(prefix="pm_model_"), "predictive_maintenance"))
+        version = registry.publish(model)
+
+    store = registry.store(version)
+    if not store.has_compiled():
+        store.publish_compiled(PredictiveMaintenanceModel.load_model(str(store.model_dir)))
+    return str(store.model_dir)
+
+
+def time_calls(fn, rows):
+    """Return per-call latencies in microseconds."""
+    latencies = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        started = time.perf_counter()
+        fn(row)
+        latencies[i] = (time.perf_counter() - started) * 1e6
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark failure prediction paths")
+    parser.add_argument("--model-dir", default="./ml_models", help="Directory containing the predictive_maintenance/ registry")
+    parser.add_argument("--rows", type=int, default=2000, help="Number of single-row predictions to time")
+    args = parser.parse_args()
+
+    pm_dir = load_model_dir(args.model_dir)
+    model = PredictiveMaintenanceModel.load_model(pm_dir)
+    fast = FastPredictor(model)
+    compiled = CompiledForest.load(os.path.join(pm_dir, "compiled"))
+    agent = MLAgent.__new__(MLAgent)  # only the feature helpers are used
+    rows = make_rows(args.rows)
+    prepared = [agent._feature_values(row) for row in rows]
+
+    paths = {
+        "dataframe": lambda row: model.predict(agent._prepare_features_for_prediction(row)),
+        "fast": lambda row: fast.predict_one(agent._feature_values(row)),
+        "compiled": lambda row: compiled.predict_one(agent._feature_values(row)),
+    }
+    # Model time alone, with features already prepared
+    model_only = {
+        "fast model": fast.predict_one,
+        "compiled model": compiled.predict_one,
+    }
+
+    print("=" * 60)
+    print(f"PREDICTION BENCHMARK ({args.rows} rows, "
+          f"{len(model.feature_names)} features, {model.model_type})")
+    print("=" * 60)
+
+    for name, fn in paths.items():
+        time_calls(fn, rows[:50])  # warm-up
+        latencies = time_calls(fn, rows)
+        print(f"{name:<16} p50 {np.percentile(latencies, 50):9.1f} us   "
+              f"p99 {np.percentile(latencies, 99):9.1f} us")
+
+    for name, fn in model_only.items():
+        latencies = time_calls(fn, prepared)
+        print(f"{name:<16} p50 {np.percentile(latencies, 50):9.1f} us   "
+              f"p99 {np.percentile(latencies, 99):9.1f} us")
+
+    matrix = agent._build_feature_matrix(rows, compiled.feature_names)
+    for name, predictor in (("sklearn batch", model), ("compiled batch", compiled)):
+        predictor.predict(matrix[:50])  # warm-up
+        started = time.perf_counter()
+        predictor.predict(matrix)
+        elapsed = time.perf_counter() - started
+        print(f"{name:<16} {elapsed * 1e3:9.1f} ms for {len(matrix)} rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
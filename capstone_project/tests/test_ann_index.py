@@ -0,0 +1,138 @@
+"""Unit tests for the in-process IVF snapshot index."""
+
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from app.ann_index import AnnIndexManager, build_snapshot
+from app.retrieval import HybridRetriever
+
+
+class FakeCollection:
+    """Chroma collection stand-in holding random embeddings."""
+
+    def __init__(self, n=400, dim=16, seed=0):
+        rng = np.random.default_rng(seed)
+        self.embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+        self.ids = [f"chunk-{i}" for i in range(n)]
+        self.types = ["CNC" if i % 2 else "WELDING" for i in range(n)]
+        self.metadata = {"kb_version": "v1"}
+
+    def get(self, include=(), limit=None, offset=0):
+        end = offset + limit if limit else len(self.ids)
+        rows = range(offset, min(end, len(self.ids)))
+        return {
+            "ids": [self.ids[i] for i in rows],
+            "embeddings": [self.embeddings[i].tolist() for i in rows],
+            "documents": [f"text {i}" for i in rows],
+            "metadatas": [{"doc_id": self.ids[i], "equipment_type": self.types[i]} for i in rows],
+        }
+
+
+def brute_force(collection, query, k, allowed=None):
+    vectors = collection.embeddings / np.linalg.norm(collection.embeddings, axis=1, keepdims=True)
+    scores = vectors @ (query / np.linalg.norm(query))
+    order = [i for i in np.argsort(-scores) if allowed is None or collection.types[i] in allowed]
+    return [collection.ids[i] for i in order[:k]]
+
+
+def mapped_versions(root):
+    """Snapshot versions under ``root`` with files mapped into this process."""
+    prefix = str(root) + os.sep
+    with open("/proc/self/maps") as f:
+        paths = [line.split(None, 5)[5].strip() for line in f if len(line.split(None, 5)) == 6]
+    return {path[len(prefix):].split(os.sep)[0] for path in paths if path.startswith(prefix)}
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    collection = FakeCollection()
+    build_snapshot(collection, str(tmp_path), nlist=8, page_size=64)
+    manager = AnnIndexManager(str(tmp_path), nprobe=8, reload_seconds=0)
+    return collection, manager
+
+
+class TestAnnIndex:
+    """Test cases for building and searching snapshots."""
+
+    def test_exhaustive_probe_matches_brute_force(self, snapshot):
+        """Test that probing every list returns the exact neighbours."""
+        collection, manager = snapshot
+        query = collection.embeddings[3] + 0.1
+        [hits] = manager.query([query], 5)
+        assert [item_id for item_id, _, _ in hits] == brute_force(collection, query, 5)
+
+    def test_partial_probe_has_high_recall(self, tmp_path):
+        """Test that scanning a quarter of the lists still finds most neighbours."""
+        collection = FakeCollection(n=2000)
+        build_snapshot(collection, str(tmp_path), nlist=32)
+        manager = AnnIndexManager(str(tmp_path), nprobe=8, reload_seconds=0)
+
+        recall = []
+        for i in range(20):
+            query = collection.embeddings[i]
+            [hits] = manager.query([query], 10)
+            expected = set(brute_force(collection, query, 10))
+            recall.append(len(expected & {item_id for item_id, _, _ in hits}) / 10)
+        assert np.mean(recall) >= 0.6
+
+    def test_equipment_filter(self, snapshot):
+        """Test that filtered searches only return allowed equipment types."""
+        collection, manager = snapshot
+        query = collection.embeddings[0]
+        [hits] = manager.query([query], 5, ["CNC", "ALL"])
+        assert all(metadata["equipment_type"] == "CNC" for _, _, metadata in hits)
+        assert [item_id for item_id, _, _ in hits] == brute_force(collection, query, 5, {"CNC"})
+
+    def test_records_roundtrip(self, snapshot):
+        """Test that texts and metadata are served from the snapshot."""
+        _, manager = snapshot
+        [(item_id, text, metadata)] = manager.get(["chunk-7"])
+        assert (item_id, text, metadata["equipment_type"]) == ("chunk-7", "text 7", "CNC")
+        assert len(list(manager.iter_all())) == 400
+
+    def test_hot_swap_on_new_snapshot(self, tmp_path, snapshot):
+        """Test that publishing a new snapshot is picked up by reload()."""
+        _, manager = snapshot
+        old_version = manager.fingerprint()
+
+        build_snapshot(FakeCollection(n=50, seed=1), str(tmp_path), nlist=4)
+        assert manager.reload()
+        assert manager.fingerprint() != old_version
+        assert len(manager.index) == 50
+
+    def test_replaced_snapshots_are_unmapped(self, tmp_path, snapshot):
+        """Test that after several swaps only the current snapshot stays mapped."""
+        if not os.path.exists("/proc/self/maps"):
+            pytest.skip("needs /proc/self/maps")
+        _, manager = snapshot
+        first = manager.index
+
+        # A scan in progress keeps its snapshot open across a swap
+        records = manager.iter_all()
+        next(records)
+        for seed in range(1, 4):
+            build_snapshot(FakeCollection(n=50, seed=seed), str(tmp_path), nlist=4, keep=10)
+            assert manager.reload()
+        assert mapped_versions(tmp_path) == {first.version, manager.fingerprint()}
+        assert len(list(records)) == 399
+
+        gc.collect()
+        assert mapped_versions(tmp_path) == {manager.fingerprint()}
+        assert first.vectors is None
+        assert len(manager.query([np.ones(16)], 3)[0]) == 3
+
+    def test_missing_snapshot_raises(self, tmp_path):
+        """Test that serving without a published snapshot fails loudly."""
+        with pytest.raises(FileNotFoundError):
+            AnnIndexManager(str(tmp_path / "empty"), reload_seconds=0)
+
+    def test_serves_hybrid_retriever(self, snapshot):
+        """Test that the manager plugs into the hybrid retriever as a store."""
+        collection, manager = snapshot
+        retriever = HybridRetriever(manager)
+        retriever.refresh(manager.fingerprint())
+        [hits] = retriever.retrieve_many(["text 5"], [collection.embeddings[5]], ["CNC"], k=3)
+        assert hits[0][0] == "chunk-5"
@@ -1,5 +1,7 @@
 """Integration tests for the Manufacturing Copilot API."""
 
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -33,6 +35,21 @@ class TestHealthEndpoint:
         assert "X-Response-Time-ms" in response.headers
 
 
+class TestReadinessEndpoint:
+    """Test cases for the readiness endpoint."""
+
+    def test_ready_reports_warmup_state(self, client):
+        """Test that readiness is either ready (200) or not yet ready (503)."""
+        response = client.get("/ready")
+        assert response.status_code in (200, 503)
+        assert response.json()["status"] in ("ready", "warming_up", "initialization_failed")
+
+    def test_health_does_not_wait_for_agents(self, client):
+        """Test that liveness answers even before the agents are warmed up."""
+        response = client.get("/health")
+        assert response.status_code == 200
+
+
 class TestDiagnoseEndpoint:
     """Test cases for the main diagnosis endpoint."""
 
@@ -128,6 +145,117 @@ class TestDiagnoseEndpoint:
         assert 0.0 <= data["confidence_score"] <= 1.0
 
 
+class TestDiagnoseStreamEndpoint:
+    """Test cases for the streaming diagnosis endpoint."""
+
+    def test_stream_without_auth(self, client):
+        """Test that the streaming endpoint requires authentication."""
+        payload = {
+            "plant_id": "PUNE-IN",
+            "equipment_id": "CNC-A-102",
+            "problem_description": "Machine overheating"
+        }
+        response = client.post("/v1/diagnose/stream", json=payload)
+        assert response.status_code == 422  # Missing auth header
+
+    def test_stream_emits_agent_results_and_final_frame(self, client, valid_auth_token):
+        """Test that agent results stream first and the final frame is a full response."""
+        payload = {
+            "plant_id": "PUNE-IN",
+            "equipment_id": "CNC-A-102",
+            "problem_description": "Machine overheating during operation"
+        }
+        headers = {"X-Auth-Token": valid_auth_token}
+        response = client.post("/v1/diagnose/stream", json=payload, headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        events = [json.loads(line) for line in response.text.splitlines() if line]
+        agents_reported = {e["agent"] for e in events if e["event"] == "agent_result"}
+        assert {"vision", "rag", "report"} <= agents_reported
+
+        final = events[-1]
+        assert final["event"] == "final"
+        for field in ("request_id", "vision_analysis", "rag_guidance",
+                      "generated_report", "confidence_score", "safety_disclaimer"):
+            assert field in final["data"]
+
+
+class TestLoadShedding:
+    """Test cases for shedding load when the LLM endpoint is saturated."""
+
+    def test_overloaded_returns_503_with_retry_after(self, client, valid_auth_token, monkeypatch):
+        """Test that a full LLM queue is answered immediately with 503 + Retry-After."""
+        from app import main
+        from app.concurrency import Overloaded
+
+        class SaturatedCopilot:
+            def check_capacity(self):
+                raise Overloaded("LLM endpoint is overloaded", retry_after=7)
+
+        async def get_saturated_copilot():
+            return SaturatedCopilot()
+
+        monkeypatch.setattr(main, "get_copilot", get_saturated_copilot)
+        payload = {
+            "plant_id": "PUNE-IN",
+            "equipment_id": "CNC-A-102",
+            "problem_description": "Spindle overheating",
+        }
+        for path in ("/v1/diagnose", "/v1/diagnose/stream"):
+            response = client.post(path, json=payload, headers={"X-Auth-Token": valid_auth_token})
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "7"
+
+
+class TestPredictBatchEndpoint:
+    """Test cases for the batch failure prediction endpoint."""
+
+    def test_batch_predictions_in_request_order(self, client, valid_auth_token, monkeypatch, tmp_path):
+        """Test that every item is scored and returned in request order."""
+        from app import ml_agent
+
+        agent = ml_agent.MLAgent(models_dir=str(tmp_path), reload_seconds=0)
+        monkeypatch.setattr(ml_agent, "get_ml_agent", lambda: agent)
+        payload = {"items": [
+            {"equipment_id": "CNC-A-102", "sensor_data": {"temperature_avg": 88.0}},
+            {"equipment_id": "PUMP-B-05", "sensor_data": {}},
+        ]}
+        response = client.post(
+            "/v1/predict/batch", json=payload, headers={"X-Auth-Token": valid_auth_token}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["count"] == 2
+        assert [p["equipment_id"] for p in data["predictions"]] == ["CNC-A-102", "PUMP-B-05"]
+
+    def test_empty_batch_rejected(self, client, valid_auth_token):
+        """Test that a batch must contain at least one item."""
+        response = client.post(
+            "/v1/predict/batch", json={"items": []}, headers={"X-Auth-Token": valid_auth_token}
+        )
+        assert response.status_code == 422
+
+
+class TestModelInfoEndpoint:
+    """Test cases for the predictive maintenance model info endpoint."""
+
+    def test_reports_versions_without_a_model(self, client, valid_auth_token, monkeypatch, tmp_path):
+        """Test that an untrained deployment reports no live or candidate version."""
+        from app import ml_agent
+
+        agent = ml_agent.MLAgent(models_dir=str(tmp_path), reload_seconds=0)
+        monkeypatch.setattr(ml_agent, "get_ml_agent", lambda: agent)
+        response = client.get(
+            "/v1/models/predictive-maintenance", headers={"X-Auth-Token": valid_auth_token}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["model_version"] is None
+        assert data["candidate_version"] is None
+        assert data["shadow"]["scored"] == 0
+
+
 class TestObservabilityMiddleware:
     """Test cases for observability middleware."""
 
@@ -0,0 +1,65 @@
+"""Unit tests for the micro-batcher."""
+
+import asyncio
+
+import pytest
+
+from app.batching import MicroBatcher
+
+
+class TestMicroBatcher:
+    """Test cases for collecting concurrent requests into batches."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_items_share_one_batch(self):
+        """Test that items submitted together are processed in one call, in order."""
+        seen_batches = []
+
+        async def process(items):
+            seen_batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(process, max_batch_size=32, max_wait_ms=5)
+        results = await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+
+        assert results == [i * 2 for i in range(10)]
+        assert seen_batches == [list(range(10))]
+
+    @pytest.mark.asyncio
+    async def test_full_batch_flushes_immediately(self):
+        """Test that batches never exceed the maximum size."""
+        seen_batches = []
+
+        async def process(items):
+            seen_batches.append(len(items))
+            return items
+
+        batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=1000)
+        results = await asyncio.wait_for(
+            asyncio.gather(*[batcher.submit(i) for i in range(8)]), timeout=1
+        )
+
+        assert results == list(range(8))
+        assert seen_batches == [4, 4]
+
+    @pytest.mark.asyncio
+    async def test_single_item_flushes_after_wait(self):
+        """Test that a lone item is processed once the wait window elapses."""
+        async def process(items):
+            return [f"done:{item}" for item in items]
+
+        batcher = MicroBatcher(process, max_batch_size=32, max_wait_ms=1)
+        assert await batcher.submit("query") == "done:query"
+        assert batcher.stats()["batches"] == 1
+
+    @pytest.mark.asyncio
+    async def test_batch_error_reaches_every_caller(self):
+        """Test that a failing batch raises in each waiting caller."""
+        async def process(items):
+            raise RuntimeError("embedding model unavailable")
+
+        batcher = MicroBatcher(process, max_batch_size=32, max_wait_ms=1)
+        results = await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
@@ -0,0 +1,167 @@
+"""Unit tests for the in-process caches."""
+
+import sqlite3
+import time
+
+import numpy as np
+import pytest
+
+from app.cache import CompletionCache, SemanticCache, TTLCache
+
+
+class TestTTLCache:
+    """Test cases for the LRU + TTL cache."""
+
+    def test_hit_and_miss_counters(self):
+        """Test that hits and misses are counted."""
+        cache = TTLCache(max_entries=4, ttl_seconds=60)
+        cache.set("a", 1)
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted first."""
+        cache = TTLCache(max_entries=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # "b" becomes least recently used
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are treated as misses."""
+        cache = TTLCache(max_entries=2, ttl_seconds=0.01)
+        cache.set("a", 1)
+        time.sleep(0.02)
+        assert cache.get("a") is None
+
+
+class TestSemanticCache:
+    """Test cases for the embedding-keyed semantic cache."""
+
+    def test_near_duplicate_query_hits(self):
+        """Test that a query within the distance threshold reuses the cached value."""
+        cache = SemanticCache(max_distance=0.05, ttl_seconds=60, max_entries=8)
+        embedding = np.array([1.0, 0.0, 0.0])
+        cache.store(embedding, ["SOP-123"], {"steps": ["1. Cool down"]})
+
+        near = np.array([0.99, 0.05, 0.0])
+        assert cache.lookup(near, ["SOP-123"]) == {"steps": ["1. Cool down"]}
+        assert cache.stats()["hits"] == 1
+
+    def test_distant_query_misses(self):
+        """Test that a dissimilar query is not served from the cache."""
+        cache = SemanticCache(max_distance=0.05, ttl_seconds=60, max_entries=8)
+        cache.store([1.0, 0.0, 0.0], ["SOP-123"], "cached")
+        assert cache.lookup([0.0, 1.0, 0.0], ["SOP-123"]) is None
+
+    def test_different_cited_documents_miss(self):
+        """Test that the same query with different retrieved documents misses."""
+        cache = SemanticCache(max_distance=0.05, ttl_seconds=60, max_entries=8)
+        cache.store([1.0, 0.0, 0.0], ["SOP-123"], "cached")
+        assert cache.lookup([1.0, 0.0, 0.0], ["SOP-456"]) is None
+
+    def test_lru_eviction(self):
+        """Test that the cache stays bounded."""
+        cache = SemanticCache(max_distance=0.05, ttl_seconds=60, max_entries=2)
+        for i in range(3):
+            vector = np.zeros(3)
+            vector[i] = 1.0
+            cache.store(vector, ["DOC"], i)
+        assert len(cache) == 2
+        assert cache.lookup([1.0, 0.0, 0.0], ["DOC"]) is None
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are not returned."""
+        cache = SemanticCache(max_distance=0.05, ttl_seconds=0.01, max_entries=8)
+        cache.store([1.0, 0.0], ["DOC"], "cached")
+        time.sleep(0.02)
+        assert cache.lookup([1.0, 0.0], ["DOC"]) is None
+
+    def test_fingerprint_change_invalidates(self):
+        """Test that a changed knowledge base fingerprint clears the cache."""
+        cache = SemanticCache(max_distance=0.05, ttl_seconds=60, max_entries=8)
+        cache.validate((5, "v1"))
+        cache.store([1.0, 0.0], ["DOC"], "cached")
+
+        cache.validate((5, "v1"))
+        assert cache.lookup([1.0, 0.0], ["DOC"]) == "cached"
+
+        cache.validate((6, "v2"))
+        assert cache.lookup([1.0, 0.0], ["DOC"]) is None
+        assert cache.stats()["invalidations"] == 1
+
+
+class TestCompletionCache:
+    """Test cases for the exact-match LLM completion cache."""
+
+    def test_key_depends_on_model_params_and_prompt(self):
+        """Test that every part of the request changes the cache key."""
+        base = CompletionCache.make_key("llm", {"temperature": 0.7}, "prompt")
+        assert base == CompletionCache.make_key("llm", {"temperature": 0.7}, "prompt")
+        assert base != CompletionCache.make_key("other-llm", {"temperature": 0.7}, "prompt")
+        assert base != CompletionCache.make_key("llm", {"temperature": 0.5}, "prompt")
+        assert base != CompletionCache.make_key("llm", {"temperature": 0.7}, "prompt 2")
+
+    def test_memory_tier(self):
+        """Test that completions are served from memory."""
+        cache = CompletionCache(max_entries=4, ttl_seconds=60)
+        cache.set("key", "completion")
+        assert cache.get("key") == "completion"
+        assert cache.get("missing") is None
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        """Test that the SQLite tier is read by a fresh cache instance."""
+        db_path = str(tmp_path / "llm_cache.sqlite3")
+        cache = CompletionCache(max_entries=4, ttl_seconds=60, db_path=db_path)
+        cache.set("key", "completion")
+        cache.close()
+
+        restarted = CompletionCache(max_entries=4, ttl_seconds=60, db_path=db_path)
+        assert restarted.get("key") == "completion"
+        assert restarted.stats()["disk_hits"] == 1
+        restarted.close()
+
+    def test_disk_errors_are_misses(self, tmp_path):
+        """Test that a failing SQLite read is treated as a cache miss."""
+        db_path = str(tmp_path / "llm_cache.sqlite3")
+        cache = CompletionCache(max_entries=4, ttl_seconds=60, db_path=db_path)
+        with sqlite3.connect(db_path) as other:
+            other.execute("DROP TABLE completions")
+
+        assert cache.get("key") is None
+        assert cache.stats()["disk_errors"] == 1
+        cache.close()
+
+    @pytest.mark.asyncio
+    async def test_async_access(self, tmp_path):
+        """Test that aget/aset read and write both tiers."""
+        db_path = str(tmp_path / "llm_cache.sqlite3")
+        cache = CompletionCache(max_entries=4, ttl_seconds=60, db_path=db_path)
+        await cache.aset("key", "completion")
+        cache.memory.clear()
+
+        assert await cache.aget("key") == "completion"
+        assert await cache.aget("missing") is None
+        assert cache.stats()["disk_hits"] == 1
+        cache.close()
+
+    def test_expired_rows_pruned_on_startup(self, tmp_path):
+        """Test that opening the cache deletes rows older than the TTL."""
+        db_path = str(tmp_path / "llm_cache.sqlite3")
+        CompletionCache(max_entries=4, ttl_seconds=60, db_path=db_path).close()
+        with sqlite3.connect(db_path) as other:
+            other.execute(
+                "INSERT INTO completions (key, value, created_at) VALUES (?, ?, ?)",
+                ("old", "completion", time.time() - 120),
+            )
+
+        cache = CompletionCache(max_entries=4, ttl_seconds=60, db_path=db_path)
+        with sqlite3.connect(db_path) as other:
+            assert other.execute("SELECT COUNT(*) FROM completions").fetchone()[0] == 0
+        cache.close()
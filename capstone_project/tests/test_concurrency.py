@@ -0,0 +1,207 @@
+"""Unit tests for the concurrency controls."""
+
+import asyncio
+
+import pytest
+
+from app.concurrency import AdaptiveLimiter, Overloaded, SingleFlight
+
+
+class TestSingleFlight:
+    """Test cases for request coalescing."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_identical_calls_share_one_computation(self):
+        """Test that concurrent calls with the same key run the function once."""
+        flight = SingleFlight()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"report": "shared"}
+
+        results = await asyncio.gather(*[flight.do("key", compute) for _ in range(5)])
+
+        assert calls == 1
+        assert all(result == {"report": "shared"} for result, _ in results)
+        assert sum(shared for _, shared in results) == 4
+        assert flight.in_flight() == 0
+
+    @pytest.mark.asyncio
+    async def test_different_keys_run_independently(self):
+        """Test that different keys are not coalesced."""
+        flight = SingleFlight()
+        calls = []
+
+        async def compute(key):
+            calls.append(key)
+            await asyncio.sleep(0.01)
+            return key
+
+        results = await asyncio.gather(
+            flight.do("a", lambda: compute("a")),
+            flight.do("b", lambda: compute("b")),
+        )
+
+        assert sorted(calls) == ["a", "b"]
+        assert [result for result, _ in results] == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_sequential_calls_recompute(self):
+        """Test that the key is released once the computation finishes."""
+        flight = SingleFlight()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        await flight.do("key", compute)
+        result, shared = await flight.do("key", compute)
+        assert result == 2
+        assert shared is False
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_all_callers(self):
+        """Test that a failure is raised to every coalesced caller."""
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("LLM endpoint unavailable")
+
+        results = await asyncio.gather(
+            flight.do("key", compute), flight.do("key", compute), return_exceptions=True
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_shared_work(self):
+        """Test that one caller disconnecting leaves the computation running for others."""
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        first = asyncio.ensure_future(flight.do("key", compute))
+        second = asyncio.ensure_future(flight.do("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+
+        result, shared = await second
+        assert result == "done"
+        assert shared is True
+
+
+class TestAdaptiveLimiter:
+    """Test cases for the AIMD concurrency limiter and load shedding."""
+
+    @pytest.mark.asyncio
+    async def test_bounds_concurrency(self):
+        """Test that no more calls than the limit run at once; the rest queue."""
+        limiter = AdaptiveLimiter("llm", initial_limit=2, max_queue=10, tolerance=100)
+        running = 0
+        peak = 0
+
+        async def call():
+            nonlocal running, peak
+            async with limiter.slot():
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[call() for _ in range(6)])
+        assert peak == 2
+        assert limiter.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_sheds_when_queue_is_full(self):
+        """Test that callers beyond the queue depth fail fast with Overloaded."""
+        limiter = AdaptiveLimiter("llm", initial_limit=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        queued = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+
+        with pytest.raises(Overloaded) as error:
+            limiter.check()
+        assert error.value.retry_after >= 1
+
+        release.set()
+        await asyncio.gather(holder, queued)
+        assert limiter.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout_raises_overloaded(self):
+        """Test that a caller waiting longer than queue_timeout is shed."""
+        limiter = AdaptiveLimiter("llm", initial_limit=1, queue_timeout=0.01)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.slot():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            async with limiter.slot():
+                pass
+
+        release.set()
+        await holder
+        assert limiter.in_flight == 0 and limiter.stats()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_aimd_limit_follows_latency(self):
+        """Test that the limit grows while fast and is cut when calls slow down."""
+        limiter = AdaptiveLimiter("llm", initial_limit=1, max_limit=4, tolerance=10.0, backoff=0.5)
+
+        async def call(seconds):
+            async with limiter.slot():
+                await asyncio.sleep(seconds)
+
+        for _ in range(5):
+            await call(0.001)
+        grown = limiter.limit
+        assert grown > 1
+
+        await call(0.1)  # ~100x slower than the baseline
+        assert limiter.limit == pytest.approx(grown * 0.5)
+        assert limiter.stats()["decreases"] == 1
+
+    @pytest.mark.asyncio
+    async def test_errors_decrease_limit(self):
+        """Test that failing calls count as congestion."""
+        limiter = AdaptiveLimiter("llm", initial_limit=8, backoff=0.5)
+        with pytest.raises(RuntimeError):
+            async with limiter.slot():
+                raise RuntimeError("HTTP 503")
+        assert limiter.limit == 4
+
+    @pytest.mark.asyncio
+    async def test_mixed_call_lengths_do_not_collapse_limit(self):
+        """Test that long calls are compared with their own kind, not with short ones."""
+        limiter = AdaptiveLimiter("llm", initial_limit=2, tolerance=3.0, backoff=0.5)
+
+        async def call(kind, seconds):
+            async with limiter.slot(kind):
+                await asyncio.sleep(seconds)
+
+        for _ in range(10):
+            await asyncio.gather(call("rag", 0.02), call("report", 0.1))
+
+        assert limiter.stats()["decreases"] == 0
+        assert limiter.limit >= 2
+
+        await call("report", 0.5)  # 5x slower than usual for reports
+        assert limiter.stats()["decreases"] == 1
@@ -0,0 +1,92 @@
+"""Unit tests for token-budgeted RAG context assembly."""
+
+from app.context_builder import build_context, context_budget, estimate_tokens, normalize_text
+
+
+def count_words(text):
+    return len(text.split())
+
+
+SOP = """
+                SOP-123: CNC Machine Troubleshooting
+                Section 4.2: Overheating Issues
+
+                1. Immediately stop the machine and allow cooldown (15-20 minutes)
+                2. Check coolant levels in the reservoir - refill if below minimum mark
+                3. Inspect air filters - replace if clogged
+                """
+
+
+class TestNormalization:
+    """Test cases for whitespace normalisation."""
+
+    def test_indentation_and_blank_lines_removed(self):
+        """Test that leading indentation and blank lines do not reach the prompt."""
+        text = normalize_text(SOP)
+        assert text.startswith("SOP-123: CNC Machine Troubleshooting\nSection 4.2")
+        assert "  " not in text
+        assert "\n\n" not in text
+
+
+class TestBuildContext:
+    """Test cases for packing chunks into the budget."""
+
+    def test_fits_within_budget(self):
+        """Test that the packed context never exceeds the budget."""
+        chunks = [SOP, "SAFETY-SOP-001: Lockout/tagout before maintenance. " * 20]
+        context = build_context(chunks, "CNC overheating coolant", budget=40, count_tokens=count_words)
+        assert context.tokens <= 40
+        assert count_words(context.text) <= 40
+        assert context.truncated
+
+    def test_everything_fits(self):
+        """Test that small inputs are included whole and reported accurately."""
+        context = build_context([SOP], "overheating", budget=1000, count_tokens=count_words)
+        assert context.text == normalize_text(SOP)
+        assert context.tokens == count_words(context.text)
+        assert context.sources == [0]
+        assert not context.truncated
+
+    def test_overlapping_chunks_are_deduplicated(self):
+        """Test that lines repeated by chunk overlap are included once."""
+        first = "Step A: isolate power.\nStep B: drain coolant."
+        second = "Step B: drain coolant.\nStep C: replace pump seal."
+        duplicate = first
+        context = build_context([first, second, duplicate], "coolant", budget=1000, count_tokens=count_words)
+        assert context.text.count("Step B: drain coolant.") == 1
+        assert "Step C: replace pump seal." in context.text
+        assert context.sources == [0, 1]
+
+    def test_partial_chunk_keeps_relevant_sentences(self):
+        """Test that a chunk that does not fit contributes its most relevant lines."""
+        chunk = "\n".join([
+            "WELD-GUIDE: Welding Defects",
+            "Spatter is caused by high voltage and is cosmetic in most cases.",
+            "Porosity is caused by contaminated base material and poor gas flow.",
+            "Undercut is caused by excessive travel speed along the joint edge.",
+        ])
+        context = build_context([chunk], "weld porosity gas flow", budget=16, count_tokens=count_words)
+        assert "Porosity" in context.text
+        assert "Undercut" not in context.text
+        assert context.tokens <= 16
+
+
+class TestBudget:
+    """Test cases for the budget derived from settings."""
+
+    def test_budget_respects_context_window(self, monkeypatch):
+        """Test that the prompt and generation reserve are subtracted from the window."""
+        from app.context_builder import settings
+
+        monkeypatch.setattr(settings, "LLM_CONTEXT_WINDOW", 2048)
+        monkeypatch.setattr(settings, "MAX_TOKENS", 512)
+        monkeypatch.setattr(settings, "RAG_CONTEXT_MAX_TOKENS", 4000)
+        assert context_budget(prompt_tokens=200) == 2048 - 512 - 200
+
+        monkeypatch.setattr(settings, "RAG_CONTEXT_MAX_TOKENS", 1000)
+        assert context_budget(prompt_tokens=200) == 1000
+
+    def test_estimate_is_conservative(self):
+        """Test that the fallback estimate over-counts rather than under-counts words."""
+        text = "Check coolant levels in the reservoir"
+        assert estimate_tokens(text) >= count_words(text)
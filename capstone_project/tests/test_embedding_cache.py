@@ -0,0 +1,118 @@
+"""Unit tests for the memory-mapped query-embedding cache."""
+
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+from app.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class CountingEmbeddings:
+    """Embedding stand-in that records which texts it was asked to embed."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0, 0.0, 0.0] for text in texts]
+
+
+def _put_from_other_process(path):
+    cache = EmbeddingCache(path, dim=4, identity="model-a")
+    cache.put("vibration alarm on Press 7", [1.0, 2.0, 3.0, 4.0])
+    cache.close()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "query_embeddings.bin")
+
+
+class TestEmbeddingCache:
+    """Test cases for EmbeddingCache."""
+
+    def test_roundtrip_and_normalized_key(self, cache_path):
+        """Test that lookups ignore case and extra whitespace."""
+        cache = EmbeddingCache(cache_path, dim=4, identity="model-a")
+        cache.put("Overheating", [0.5, 0.25, 0.0, 1.0])
+        assert cache.get("  overheating ").tolist() == [0.5, 0.25, 0.0, 1.0]
+        assert cache.get("vibration") is None
+        assert cache.stats()["hits"] == 1
+
+    def test_survives_restart(self, cache_path):
+        """Test that entries are read back from the file by a new instance."""
+        cache = EmbeddingCache(cache_path, dim=4, identity="model-a")
+        cache.put("overheating", [1.0, 0.0, 0.0, 0.0])
+        cache.close()
+
+        reopened = EmbeddingCache(cache_path, dim=4, identity="model-a")
+        assert reopened.get("overheating").tolist() == [1.0, 0.0, 0.0, 0.0]
+
+    def test_model_change_resets_file(self, cache_path):
+        """Test that vectors from another embedding model are never served."""
+        cache = EmbeddingCache(cache_path, dim=4, identity="model-a")
+        cache.put("overheating", [1.0, 0.0, 0.0, 0.0])
+        cache.close()
+
+        other = EmbeddingCache(cache_path, dim=4, identity="model-b")
+        assert other.get("overheating") is None
+        assert len(other) == 0
+
+    def test_settings_change_keeps_old_mapping_valid(self, cache_path):
+        """Test that a worker with other settings never truncates a file mapped elsewhere."""
+        old = EmbeddingCache(cache_path, dim=4, identity="model-a", max_entries=64)
+        old.put("overheating", [1.0, 2.0, 3.0, 4.0])
+
+        new = EmbeddingCache(cache_path, dim=8, identity="model-a", max_entries=16)
+        assert new.get("overheating") is None
+        new.put("overheating", [0.5] * 8)
+
+        # The old worker keeps reading and writing its own (now unlinked) file
+        assert old.get("overheating").tolist() == [1.0, 2.0, 3.0, 4.0]
+        old.put("vibration", [4.0, 3.0, 2.0, 1.0])
+        assert len(old) == 2
+
+        reopened = EmbeddingCache(cache_path, dim=8, identity="model-a", max_entries=16)
+        assert reopened.get("overheating").tolist() == [0.5] * 8
+        assert not [name for name in os.listdir(os.path.dirname(cache_path)) if name.endswith(".tmp")]
+
+    def test_bounded_with_lru_eviction(self, cache_path):
+        """Test that a full set evicts its least recently used entry."""
+        cache = EmbeddingCache(cache_path, dim=4, identity="model-a", max_entries=2, ways=2)
+        cache.put("first", [1.0] * 4)
+        cache.put("second", [2.0] * 4)
+        cache.get("first")  # "second" is now least recently used
+        cache.put("third", [3.0] * 4)
+
+        assert len(cache) == 2
+        assert cache.get("second") is None
+        assert cache.get("first") is not None and cache.get("third") is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_shared_across_processes(self, cache_path):
+        """Test that a vector written by another worker process is a hit here."""
+        cache = EmbeddingCache(cache_path, dim=4, identity="model-a")
+        process = multiprocessing.get_context("spawn").Process(target=_put_from_other_process, args=(cache_path,))
+        process.start()
+        process.join(timeout=30)
+        assert process.exitcode == 0
+        assert cache.get("Vibration alarm on press 7").tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+class TestCachedEmbeddings:
+    """Test cases for the caching embeddings wrapper."""
+
+    def test_only_misses_are_embedded(self, cache_path):
+        """Test that cached queries skip the model and duplicates are embedded once."""
+        model = CountingEmbeddings()
+        embeddings = CachedEmbeddings(model, EmbeddingCache(cache_path, dim=4, identity="model-a"))
+
+        first = embeddings.embed_documents(["overheating", "vibration", "overheating"])
+        second = embeddings.embed_documents(["Overheating", "weld porosity"])
+
+        assert model.calls == [["overheating", "vibration"], ["weld porosity"]]
+        assert first[0] == first[2] == second[0]
+        assert np.allclose(embeddings.embed_query("vibration"), [9.0, 1.0, 0.0, 0.0])
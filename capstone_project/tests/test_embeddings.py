@@ -0,0 +1,109 @@
+"""Unit tests for the pluggable embedding backends."""
+
+import numpy as np
+import pytest
+
+from app.embeddings import OnnxEmbeddings, _mean_pool, build_embeddings
+
+
+class FakeTokenizer:
+    """Tokenizer stand-in: one token per word, padded to the longest text."""
+
+    def __call__(self, texts, padding, truncation, max_length, return_tensors):
+        width = max(len(text.split()) for text in texts)
+        ids = np.zeros((len(texts), width), dtype=np.int64)
+        mask = np.zeros((len(texts), width), dtype=np.int64)
+        for row, text in enumerate(texts):
+            ids[row, :len(text.split())] = [len(word) for word in text.split()]
+            mask[row, :len(text.split())] = 1
+        return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+class FakeSession:
+    """ONNX session stand-in whose token embedding is [word length, 1]."""
+
+    def __init__(self):
+        self.batches = []
+
+    def run(self, outputs, feed):
+        self.batches.append(feed["input_ids"].shape)
+        ids = feed["input_ids"].astype(np.float32)
+        return [np.stack([ids, np.ones_like(ids)], axis=-1)]
+
+
+def make_onnx_embeddings(batch_size=2, normalize=False):
+    embeddings = object.__new__(OnnxEmbeddings)
+    embeddings.session = FakeSession()
+    embeddings.tokenizer = FakeTokenizer()
+    embeddings.input_names = {"input_ids", "attention_mask"}
+    embeddings.batch_size = batch_size
+    embeddings.max_length = 256
+    embeddings.normalize = normalize
+    return embeddings
+
+
+def cosine(a, b):
+    a, b = np.asarray(a), np.asarray(b)
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+class TestOnnxEmbeddings:
+    """Test cases for ONNX Runtime pooling and batching."""
+
+    def test_mean_pool_ignores_padding(self):
+        """Test that padded positions do not contribute to the mean."""
+        hidden = np.array([[[1.0], [3.0], [100.0]]])
+        mask = np.array([[1, 1, 0]])
+        assert _mean_pool(hidden, mask).tolist() == [[2.0]]
+
+    def test_length_sorted_batches_keep_input_order(self):
+        """Test that outputs follow input order although batches are length-sorted."""
+        embeddings = make_onnx_embeddings(batch_size=2)
+        texts = ["a much longer maintenance text", "aa", "bbb ccc", "d"]
+        vectors = embeddings.embed_documents(texts)
+
+        expected = [np.mean([len(word) for word in text.split()]) for text in texts]
+        assert [v[0] for v in vectors] == pytest.approx(expected)
+        # Short texts are batched together, so the long one pads alone
+        assert embeddings.session.batches == [(2, 1), (2, 5)]
+
+    def test_normalize(self):
+        """Test that outputs are unit length when normalisation is on."""
+        embeddings = make_onnx_embeddings(normalize=True)
+        vectors = np.array(embeddings.embed_documents(["spindle bearing wear", "weld"]))
+        assert np.linalg.norm(vectors, axis=1) == pytest.approx([1.0, 1.0])
+
+    def test_unknown_backend(self):
+        """Test that a typo in EMBEDDING_BACKEND fails loudly."""
+        with pytest.raises(ValueError):
+            build_embeddings(backend="tensorrt")
+
+
+class TestBackendParity:
+    """Compare the optimised backends with the reference sentence-transformers model."""
+
+    TEXTS = [
+        "Spindle bearing wear on CNC-001 causes vibration above 4 mm/s.",
+        "Porosity in weld seams: check shielding gas flow and nozzle condition.",
+        "Replace the hydraulic press seal if pressure drops below 180 bar.",
+        "Coating thickness deviation after nozzle clog on line 3.",
+    ]
+
+    @pytest.mark.parametrize("backend,min_cosine", [("onnx", 0.99), ("onnx-int8", 0.97), ("torch-int8", 0.97)])
+    def test_parity_with_torch(self, backend, min_cosine, tmp_path, monkeypatch):
+        """Test that each backend stays in the embedding space of the torch model."""
+        pytest.importorskip("sentence_transformers")
+        pytest.importorskip("langchain_community")
+        if backend.startswith("onnx"):
+            pytest.importorskip("onnxruntime")
+            pytest.importorskip("optimum")
+        from app.config import settings
+
+        monkeypatch.setattr(settings, "EMBEDDING_ONNX_DIR", str(tmp_path))
+        try:
+            reference = build_embeddings(backend="torch").embed_documents(self.TEXTS)
+            candidate = build_embeddings(backend=backend).embed_documents(self.TEXTS)
+        except OSError as e:
+            pytest.skip(f"embedding model unavailable: {e}")
+
+        assert cosine(reference, candidate).min() >= min_cosine
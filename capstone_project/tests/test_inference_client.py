@@ -0,0 +1,241 @@
+"""Unit tests for the shared HuggingFace inference client."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.inference_client import InferenceClient, InferenceError
+
+
+def make_client(handler, **kwargs):
+    kwargs.setdefault("max_retries", 3)
+    kwargs.setdefault("hedge_enabled", False)
+    return InferenceClient(
+        base_url="https://hf.test/models",
+        token="hf_test",
+        request_timeout=5,
+        attempt_timeout=1,
+        transport=httpx.MockTransport(handler),
+        **kwargs,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "INFERENCE_BACKOFF_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "INFERENCE_BACKOFF_MAX_SECONDS", 0.01)
+
+
+class TestInferenceClient:
+    """Test cases for retries, concurrency limits and hedging."""
+
+    @pytest.mark.asyncio
+    async def test_text_generation(self):
+        """Test the request format and generated text extraction."""
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(200, json=[{"generated_text": "Check the spindle."}])
+
+        client = make_client(handler)
+        assert await client.text_generation("org/llm", "prompt", temperature=0.5) == "Check the spindle."
+        assert seen[0].url == "https://hf.test/models/org/llm"
+        assert seen[0].headers["Authorization"] == "Bearer hf_test"
+
+    @pytest.mark.asyncio
+    async def test_retries_transient_errors(self):
+        """Test that 503s and connection errors are retried until success."""
+        responses = iter([
+            httpx.Response(503, json={"error": "loading", "estimated_time": 0.01}),
+            httpx.ConnectError("reset"),
+            httpx.Response(200, json=[{"generated_text": "ok"}]),
+        ])
+
+        def handler(request):
+            response = next(responses)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        client = make_client(handler)
+        assert await client.text_generation("org/llm", "prompt") == "ok"
+        assert client.stats()["retries"] == 2
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self):
+        """Test that MAX_RETRIES bounds the attempts."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(502, text="bad gateway")
+
+        client = make_client(handler, max_retries=2)
+        with pytest.raises(InferenceError) as error:
+            await client.text_generation("org/llm", "prompt")
+        assert len(calls) == 3
+        assert error.value.status_code == 502
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        """Test that a 4xx other than 408/429 fails immediately."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(400, json={"error": "bad input"})
+
+        client = make_client(handler)
+        with pytest.raises(InferenceError):
+            await client.text_generation("org/llm", "prompt")
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_per_model_concurrency_limit(self):
+        """Test that no more than the configured requests run against one model."""
+        in_flight = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json=[{"generated_text": "ok"}])
+
+        client = make_client(handler, max_concurrency_per_model=2)
+        await asyncio.gather(*[client.text_generation("org/llm", "prompt") for _ in range(6)])
+        assert peak == 2
+
+    @pytest.mark.asyncio
+    async def test_hedged_request_beats_slow_attempt(self, monkeypatch):
+        """Test that a request slower than recent latencies is hedged and the fast reply wins."""
+        monkeypatch.setattr(settings, "INFERENCE_HEDGE_MIN_MS", 10)
+        calls = 0
+
+        async def handler(request):
+            nonlocal calls
+            calls += 1
+            # The 21st request stalls; its hedge answers quickly
+            if calls == 21:
+                await asyncio.sleep(0.5)
+                return httpx.Response(200, json=[{"generated_text": "slow"}])
+            return httpx.Response(200, json=[{"generated_text": "fast"}])
+
+        client = make_client(handler, hedge_enabled=True)
+        for _ in range(20):
+            await client.image_to_text("org/vlm", b"image")
+
+        assert await client.image_to_text("org/vlm", b"image") == "fast"
+        assert client.stats()["hedges"] == 1 and client.stats()["hedge_wins"] == 1
+
+    @pytest.mark.asyncio
+    async def test_text_generation_is_not_hedged(self, monkeypatch):
+        """Test that a slow generation is awaited instead of sent twice."""
+        monkeypatch.setattr(settings, "INFERENCE_HEDGE_MIN_MS", 10)
+        calls = 0
+
+        async def handler(request):
+            nonlocal calls
+            calls += 1
+            if calls == 21:
+                await asyncio.sleep(0.1)
+            return httpx.Response(200, json=[{"generated_text": f"call {calls}"}])
+
+        client = make_client(handler, hedge_enabled=True)
+        for _ in range(20):
+            await client.text_generation("org/llm", "prompt")
+
+        assert await client.text_generation("org/llm", "prompt") == "call 21"
+        assert calls == 21 and client.stats()["hedges"] == 0
+
+    @pytest.mark.asyncio
+    async def test_hedge_delay_is_per_output_length(self, monkeypatch):
+        """Test that a long call is not hedged against the latency of short ones."""
+        monkeypatch.setattr(settings, "INFERENCE_HEDGE_MIN_MS", 10)
+
+        async def handler(request):
+            if json.loads(request.content)["parameters"]["max_new_tokens"] == 512:
+                await asyncio.sleep(0.1)
+            return httpx.Response(200, json=[{"generated_text": "ok"}])
+
+        client = make_client(handler, hedge_enabled=True)
+        for _ in range(20):
+            await client.post_json("org/llm", json={"inputs": "x", "parameters": {"max_new_tokens": 16}})
+        await client.post_json("org/llm", json={"inputs": "x", "parameters": {"max_new_tokens": 512}})
+
+        assert client.stats()["hedges"] == 0
+        assert list(client.stats()["hedge_delay_ms"]) == ["org/llm:16"]
+
+    @pytest.mark.asyncio
+    async def test_rejected_image_batch_falls_back_to_single_calls(self):
+        """Test that an endpoint rejecting image lists is called once per image from then on."""
+        requests = []
+
+        def handler(request):
+            is_batch = request.headers["Content-Type"] == "application/json"
+            requests.append("batch" if is_batch else "single")
+            if is_batch:
+                return httpx.Response(400, json={"error": "Input should be a valid image"})
+            return httpx.Response(200, json=[{"generated_text": f"image of {len(request.content)} bytes"}])
+
+        client = make_client(handler)
+        assert await client.image_to_text_batch("org/vlm", [b"a", b"bb"]) == ["image of 1 bytes", "image of 2 bytes"]
+        assert await client.image_to_text_batch("org/vlm", [b"a", b"bb"]) == ["image of 1 bytes", "image of 2 bytes"]
+        assert requests == ["batch"] + ["single"] * 4
+
+    @pytest.mark.asyncio
+    async def test_stream_text_generation(self):
+        """Test that server-sent token events are yielded as text chunks."""
+        body = (
+            'data:{"token": {"text": "Replace", "special": false}}\n\n'
+            'data:{"token": {"text": " the seal", "special": false}}\n\n'
+            'data:{"token": {"text": "</s>", "special": true}}\n\n'
+        )
+
+        def handler(request):
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+        client = make_client(handler)
+        chunks = [chunk async for chunk in client.stream_text_generation("org/llm", "prompt")]
+        assert chunks == ["Replace", " the seal"]
+
+    @pytest.mark.asyncio
+    async def test_generation_waits_until_the_deadline(self):
+        """Test that generation is only bound by the deadline, not the attempt timeout."""
+        seen = []
+
+        def handler(request):
+            seen.append(request.extensions["timeout"])
+            return httpx.Response(200, json=[{"generated_text": "ok"}])
+
+        client = make_client(handler)
+        await client.text_generation("org/llm", "prompt", max_new_tokens=800)
+        await client.image_to_text("org/vlm", b"image")
+
+        assert seen[0]["connect"] == 1 and seen[0]["read"] > 4
+        assert seen[1]["read"] == 1
+
+    @pytest.mark.asyncio
+    async def test_generation_read_timeouts_are_not_retried(self):
+        """Test that a generation that may have reached the model is not sent again."""
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            raise httpx.ReadTimeout("slow", request=request)
+
+        client = make_client(handler)
+        with pytest.raises(InferenceError):
+            await client.text_generation("org/llm", "prompt")
+        assert len(calls) == 1
+
+        calls.clear()
+        with pytest.raises(InferenceError):
+            await client.image_to_text("org/vlm", b"image")
+        assert len(calls) == 4
@@ -0,0 +1,237 @@
+"""Unit tests for the bulk document ingestion pipeline."""
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from app import ingestion
+from app.ingestion import IngestionCheckpoint, IngestionPipeline, load_csv, load_html
+
+
+class FakeEmbeddings:
+    calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.records = {}
+        self.metadata = None
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for record in zip(ids, embeddings, documents, metadatas):
+            self.records[record[0]] = record
+
+    def get(self, ids=None, where=None, include=()):
+        matches = [
+            record for record in self.records.values()
+            if (ids is None or record[0] in ids)
+            and (where is None or all(record[3].get(k) == v for k, v in where.items()))
+        ]
+        return {
+            "ids": [record[0] for record in matches],
+            "embeddings": [record[1] for record in matches],
+            "metadatas": [record[3] for record in matches],
+        }
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            self.records.pop(chunk_id, None)
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    """A bulletin and a maintenance log on disk."""
+    bulletins = tmp_path / "bulletins"
+    bulletins.mkdir()
+    (bulletins / "ehs_update.html").write_text(
+        "<html><head><title>EHS Update</title><style>p {color: red}</style></head>"
+        "<body><h1>Lockout/Tagout</h1><p>Verify zero energy state before servicing the press.</p></body></html>"
+    )
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    (logs / "cnc_maintenance_logs.csv").write_text(
+        "equipment_id,action\nCNC-A-102,Replaced spindle bearing\nCNC-A-103,Refilled coolant\n"
+    )
+    return tmp_path
+
+
+@pytest.fixture
+def pipeline_factory(tmp_path, monkeypatch):
+    FakeEmbeddings.calls = []
+    monkeypatch.setattr(ingestion, "_load_embeddings", lambda model_id, threads=None: FakeEmbeddings())
+
+    def build(collection):
+        return IngestionPipeline(
+            collection,
+            checkpoint_path=str(tmp_path / "checkpoint.json"),
+            workers=0,
+            batch_size=2,
+        )
+
+    return build
+
+
+def records_of(collection, doc_id):
+    """Stored records of one document, by chunk index."""
+    records = [record for record in collection.records.values() if record[3]["doc_id"] == doc_id]
+    return sorted(records, key=lambda record: record[3]["chunk_index"])
+
+
+class TestLoaders:
+    """Test cases for the streaming loaders."""
+
+    def test_html_extracts_visible_text(self, corpus):
+        """Test that scripts/styles are dropped and the title is kept as metadata."""
+        [(text, metadata)] = load_html(corpus / "bulletins" / "ehs_update.html")
+        assert "Verify zero energy state" in text
+        assert "color" not in text
+        assert metadata == {"title": "EHS Update"}
+
+    def test_csv_groups_rows(self, corpus):
+        """Test that log rows are rendered as column/value lines in blocks."""
+        sections = list(load_csv(corpus / "logs" / "cnc_maintenance_logs.csv", rows_per_section=1))
+        assert len(sections) == 2
+        assert "equipment_id: CNC-A-102" in sections[0][0]
+        assert sections[1][1] == {"rows": "2-2"}
+
+
+class TestIngestionPipeline:
+    """Test cases for chunking, upserting and checkpointing."""
+
+    def test_ingests_all_files_with_metadata(self, corpus, pipeline_factory):
+        """Test that chunks are upserted with deterministic IDs and metadata."""
+        collection = FakeCollection()
+        stats = pipeline_factory(collection).run([str(corpus)])
+
+        assert stats.files == 2
+        assert stats.chunks == len(collection.records)
+        log_path = corpus / "logs" / "cnc_maintenance_logs.csv"
+        chunk_id, _, _, metadata = records_of(collection, "cnc_maintenance_logs")[0]
+        assert chunk_id == f"cnc_maintenance_logs-{ingestion.source_key(str(log_path))}:0"
+        assert metadata["equipment_type"] == "CNC"
+        assert metadata["source"] == str(log_path)
+        assert records_of(collection, "ehs_update")[0][3]["equipment_type"] == "ALL"
+        assert collection.metadata["kb_version"]
+
+    def test_equipment_type_ignores_parent_directories(self, tmp_path, pipeline_factory):
+        """Test that the equipment type comes from the file name, not the directory."""
+        docs = tmp_path / "express" / "cnc"
+        docs.mkdir(parents=True)
+        (docs / "press_brake_manual.txt").write_text("Check the ram alignment daily.")
+        (docs / "shift_handover.txt").write_text("Log every stoppage.")
+        collection = FakeCollection()
+        pipeline_factory(collection).run([str(tmp_path)])
+
+        assert records_of(collection, "press_brake_manual")[0][3]["equipment_type"] == "PRESS"
+        assert records_of(collection, "shift_handover")[0][3]["equipment_type"] == "ALL"
+
+    def test_rerun_skips_unchanged_files(self, corpus, pipeline_factory):
+        """Test that a second run resumes from the checkpoint."""
+        pipeline_factory(FakeCollection()).run([str(corpus)])
+
+        collection = FakeCollection()
+        stats = pipeline_factory(collection).run([str(corpus)])
+        assert stats.skipped_files == 2
+        assert collection.records == {}
+        assert collection.metadata is None
+
+    def test_changed_file_is_reingested(self, corpus, pipeline_factory):
+        """Test that modifying a file invalidates its checkpoint entry."""
+        pipeline_factory(FakeCollection()).run([str(corpus)])
+        log = corpus / "logs" / "cnc_maintenance_logs.csv"
+        log.write_text(log.read_text() + "CNC-A-104,Recalibrated probe\n")
+
+        stats = pipeline_factory(FakeCollection()).run([str(corpus)])
+        assert stats.files == 1
+        assert stats.skipped_files == 1
+
+    def test_checkpoint_roundtrip(self, tmp_path, corpus):
+        """Test that the checkpoint is persisted atomically and reloaded."""
+        path = corpus / "logs" / "cnc_maintenance_logs.csv"
+        checkpoint = IngestionCheckpoint(str(tmp_path / "cp.json"))
+        checkpoint.mark_done(path, chunks=3)
+        checkpoint.save()
+
+        assert IngestionCheckpoint(str(tmp_path / "cp.json")).is_done(path)
+
+
+class TestIncrementalReindexing:
+    """Test cases for content-hash based re-indexing."""
+
+    def test_only_changed_chunks_are_embedded(self, corpus, pipeline_factory, monkeypatch):
+        """Test that re-ingesting a modified file embeds only the new chunk."""
+        monkeypatch.setattr(ingestion.settings, "INGEST_CSV_ROWS_PER_SECTION", 1)
+        collection = FakeCollection()
+        pipeline_factory(collection).run([str(corpus)])
+        FakeEmbeddings.calls = []
+
+        log = corpus / "logs" / "cnc_maintenance_logs.csv"
+        log.write_text(log.read_text() + "CNC-A-104,Recalibrated probe\n")
+        stats = pipeline_factory(collection).run([str(corpus)])
+
+        embedded = [text for call in FakeEmbeddings.calls for text in call]
+        assert len(embedded) == 1
+        assert "CNC-A-104" in embedded[0]
+        assert stats.unchanged_chunks > 0
+        assert all("content_hash" in record[3] for record in collection.records.values())
+
+    def test_shifted_chunks_reuse_stored_embeddings(self, corpus, pipeline_factory, monkeypatch):
+        """Test that text moving to another chunk index is not re-embedded."""
+        monkeypatch.setattr(ingestion.settings, "INGEST_CSV_ROWS_PER_SECTION", 1)
+        collection = FakeCollection()
+        pipeline_factory(collection).run([str(corpus / "logs")])
+        FakeEmbeddings.calls = []
+
+        log = corpus / "logs" / "cnc_maintenance_logs.csv"
+        log.write_text("equipment_id,action\nCNC-A-101,Tightened belt\n" + log.read_text().split("\n", 1)[1])
+        stats = pipeline_factory(collection).run([str(corpus / "logs")])
+
+        assert [len(call) for call in FakeEmbeddings.calls] == [1]
+        assert stats.reused_chunks == 2
+        assert len(collection.records) == 3
+
+    def test_removed_chunks_and_files_are_deleted(self, corpus, pipeline_factory):
+        """Test that shrunk files lose stale chunks and removed files are pruned."""
+        collection = FakeCollection()
+        pipeline_factory(collection).run([str(corpus)])
+
+        (corpus / "bulletins" / "ehs_update.html").unlink()
+        stats = pipeline_factory(collection).run([str(corpus)])
+
+        assert stats.removed_files == 1
+        assert not records_of(collection, "ehs_update")
+        assert records_of(collection, "cnc_maintenance_logs")
+
+    def test_files_sharing_a_stem_do_not_collide(self, tmp_path, pipeline_factory):
+        """Test that same-stem files keep separate chunks and a rerun changes nothing."""
+        docs = tmp_path / "docs"
+        for relative, text in [
+            ("safety.txt", "Wear gloves near the press."),
+            ("safety.html", "<p>Lock out the coater before cleaning.</p>"),
+            ("a/manual.txt", "Grease the CNC spindle weekly."),
+            ("b/manual.txt", "Replace welding tips every shift."),
+        ]:
+            (docs / relative).parent.mkdir(parents=True, exist_ok=True)
+            (docs / relative).write_text(text)
+        collection = FakeCollection()
+        stats = pipeline_factory(collection).run([str(docs)])
+
+        assert stats.chunks == len(collection.records) == 4
+        assert len({record[3]["source"] for record in collection.records.values()}) == 4
+
+        for path in docs.rglob("*.*"):
+            path.touch()  # invalidate the checkpoint without changing content
+        FakeEmbeddings.calls = []
+        stats = pipeline_factory(collection).run([str(docs)])
+
+        assert stats.files == 4
+        assert stats.unchanged_chunks == 4
+        assert not stats.changed
+        assert FakeEmbeddings.calls == []
@@ -0,0 +1,407 @@
+"""Unit tests for the ML agent's predictive maintenance scoring."""
+
+import asyncio
+import json
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.ml_agent import MLAgent
+from ml_models.predictive_maintenance.inference import CompiledForest, risk_level, risk_levels
+from ml_models.predictive_maintenance.model_store import ModelStore
+from ml_models.predictive_maintenance.registry import ModelRegistry
+from ml_models.predictive_maintenance.train_model import FastPredictor, PredictiveMaintenanceModel
+
+
+@pytest.fixture(scope="module")
+def trained_model(tmp_path_factory):
+    """Provide a small model trained on synthetic data and the directory it was saved to."""
+    model = PredictiveMaintenanceModel(model_type="random_forest")
+    model.model.set_params(n_estimators=10, n_jobs=1)
+    model.train(model.generate_synthetic_data(n_samples=2000))
+    model_dir = tmp_path_factory.mktemp("ml_models")
+    model.save_model(str(model_dir / "predictive_maintenance"))
+    return model, model_dir
+
+
+@pytest.fixture(scope="module")
+def trained_agent(trained_model):
+    """Provide an MLAgent serving the compiled form of the trained model."""
+    _, model_dir = trained_model
+    agent = MLAgent(models_dir=str(model_dir), reload_seconds=0)
+    agent._load_models()
+    return agent
+
+
+def sensor_rows(n):
+    """Generate varied sensor readings spanning normal and failing equipment."""
+    rng = np.random.default_rng(7)
+    return [
+        {
+            "temperature_avg": float(rng.normal(70, 10)),
+            "vibration_avg": float(rng.normal(3.0, 1.0)),
+            "pressure_avg": float(rng.normal(42, 8)),
+            "hours_since_maintenance": float(rng.uniform(0, 720)),
+            "equipment_age_months": int(rng.integers(1, 120)),
+        }
+        for _ in range(n)
+    ]
+
+
+class TestRiskLevels:
+    """Test cases for vectorized risk bucketing."""
+
+    def test_bucket_boundaries(self):
+        """Test that each threshold is inclusive of its lower bound."""
+        probabilities = np.array([0.0, 0.19, 0.2, 0.39, 0.4, 0.69, 0.7, 1.0])
+        assert risk_levels(probabilities).tolist() == [
+            "Low", "Low", "Medium", "Medium", "High", "High", "Critical", "Critical"
+        ]
+
+
+class TestFastPredictor:
+    """Test cases for the pandas-free single-row scoring path."""
+
+    def test_matches_model_predict(self, trained_model, trained_agent):
+        """Test that label, probability and risk equal the DataFrame path exactly."""
+        model, _ = trained_model
+        predictor = FastPredictor(model)
+        for row in sensor_rows(50):
+            features = trained_agent._feature_values(row)
+            expected = model.predict(trained_agent._prepare_features_for_prediction(row))
+            label, probability, level = predictor.predict_one(features)
+            assert label == expected["predictions"][0]
+            assert probability == expected["probabilities"][0]
+            assert level == expected["risk_levels"][0]
+
+    def test_gradient_boosting_model(self):
+        """Test that non-forest models are scored through a single predict_proba."""
+        model = PredictiveMaintenanceModel(model_type="gradient_boosting")
+        model.model.set_params(n_estimators=10)
+        data = model.generate_synthetic_data(n_samples=1000)
+        model.train(data)
+        predictor = FastPredictor(model)
+
+        sample = model.engineer_features(data.drop(columns="failure_within_7_days")).iloc[:5]
+        expected = model.predict(sample)
+        for i, (_, features) in enumerate(sample.iterrows()):
+            _, probability, _ = predictor.predict_one(features.to_dict())
+            assert probability == pytest.approx(expected["probabilities"][i])
+
+    def test_scalar_risk_level_matches_vectorized(self):
+        """Test that the scalar and array risk bucketing agree."""
+        probabilities = [0.0, 0.2, 0.4, 0.55, 0.7, 0.99]
+        assert [risk_level(p) for p in probabilities] == risk_levels(probabilities).tolist()
+
+    def test_untrained_model_rejected(self):
+        """Test that a fast predictor cannot be built from an untrained model."""
+        with pytest.raises(ValueError):
+            FastPredictor(PredictiveMaintenanceModel())
+
+
+class TestCompiledForest:
+    """Test cases for the array-backed forest evaluator."""
+
+    def test_matches_sklearn_probabilities(self, trained_model, monkeypatch):
+        """Test that compiled predictions match the sklearn forest across chunks."""
+        model, model_dir = trained_model
+        forest = CompiledForest.load(str(model_dir / "predictive_maintenance" / "compiled"))
+        monkeypatch.setattr(CompiledForest, "CHUNK_ROWS", 64)
+
+        data = model.generate_synthetic_data(n_samples=500)
+        X = model.engineer_features(data.drop(columns="failure_within_7_days"))[model.feature_names]
+        expected = model.predict(X)
+        compiled = forest.predict(X.to_numpy(dtype=np.float64))
+
+        np.testing.assert_allclose(compiled["probabilities"], expected["probabilities"], atol=1e-9)
+        assert compiled["predictions"] == expected["predictions"]
+        assert compiled["risk_levels"] == expected["risk_levels"]
+
+    def test_arrays_are_memory_mapped(self, trained_agent):
+        """Test that the agent serves from read-only memory-mapped arrays."""
+        assert isinstance(trained_agent.predictor, CompiledForest)
+        assert isinstance(trained_agent.predictor._threshold, np.memmap)
+        assert not trained_agent.predictor._threshold.flags.writeable
+
+    def test_single_row_matches_batch(self, trained_agent):
+        """Test that predict_one agrees with the batched evaluator."""
+        rows = sensor_rows(20)
+        batch = trained_agent.predictor.predict(
+            trained_agent._build_feature_matrix(rows, trained_agent.predictor.feature_names)
+        )
+        for i, row in enumerate(rows):
+            label, probability, level = trained_agent.predictor.predict_one(
+                trained_agent._feature_values(row)
+            )
+            assert probability == pytest.approx(batch["probabilities"][i])
+            assert (label, level) == (batch["predictions"][i], batch["risk_levels"][i])
+
+    def test_rejects_unknown_format(self, trained_model, tmp_path):
+        """Test that arrays written by another format version are not loaded."""
+        _, model_dir = trained_model
+        compiled_dir = tmp_path / "compiled"
+        shutil.copytree(model_dir / "predictive_maintenance" / "compiled", compiled_dir)
+        metadata = json.loads((compiled_dir / "forest.json").read_text())
+        metadata["format_version"] = 999
+        (compiled_dir / "forest.json").write_text(json.dumps(metadata))
+
+        with pytest.raises(ValueError):
+            CompiledForest.load(str(compiled_dir))
+
+
+class TestModelStore:
+    """Test cases for loading models from the memory-mappable store."""
+
+    def test_compiles_joblib_only_model_on_first_load(self, trained_model, tmp_path):
+        """Test that a model without compiled arrays is compiled once and then mapped."""
+        _, model_dir = trained_model
+        legacy_dir = tmp_path / "predictive_maintenance"
+        shutil.copytree(model_dir / "predictive_maintenance", legacy_dir)
+        shutil.rmtree(legacy_dir / "compiled")
+
+        store = ModelStore(str(legacy_dir))
+        assert store.exists() and not store.has_compiled()
+        predictor = store.load()
+        assert isinstance(predictor, CompiledForest)
+        assert store.has_compiled()
+        assert not [p for p in legacy_dir.iterdir() if p.name.startswith(".")]
+
+    def test_republish_replaces_compiled_arrays(self, trained_model, tmp_path):
+        """Test that publishing again swaps in a complete compiled directory."""
+        model, _ = trained_model
+        store = ModelStore(str(tmp_path / "predictive_maintenance"))
+        store.publish_compiled(model)
+        first = store.load()
+        store.publish_compiled(model)
+        second = store.load()
+        assert second.metadata == first.metadata
+
+    def test_gradient_boosting_served_without_compiling(self, tmp_path):
+        """Test that models that cannot be compiled are served by FastPredictor."""
+        model = PredictiveMaintenanceModel(model_type="gradient_boosting")
+        model.model.set_params(n_estimators=5)
+        model.train(model.generate_synthetic_data(n_samples=500))
+        model.save_model(str(tmp_path))
+
+        assert isinstance(ModelStore(str(tmp_path)).load(), FastPredictor)
+        assert not ModelStore(str(tmp_path)).has_compiled()
+
+    def test_missing_model_raises(self, tmp_path):
+        """Test that an empty directory is reported as missing."""
+        with pytest.raises(FileNotFoundError):
+            ModelStore(str(tmp_path)).load()
+
+
+class TestLazyLoading:
+    """Test cases for deferring model loading to the first prediction."""
+
+    @pytest.mark.asyncio
+    async def test_loads_on_first_prediction(self, trained_model):
+        """Test that constructing the agent reads nothing until a prediction is made."""
+        _, model_dir = trained_model
+        agent = MLAgent(models_dir=str(model_dir), reload_seconds=0)
+        assert agent.predictor is None
+
+        result = await agent.predict_failure("CNC-A-102", sensor_rows(1)[0])
+        assert isinstance(agent.predictor, CompiledForest)
+        assert result["model_used"] == "Random Forest (Predictive Maintenance)"
+        assert result["model_version"] == "unversioned"
+
+    def test_import_does_not_load_sklearn_or_pandas(self):
+        """Test that importing the agent keeps heavy ML libraries out of the worker."""
+        root = Path(__file__).parent.parent
+        code = (
+            "import sys; import app.ml_agent; "
+            "print(any(m in sys.modules for m in ('sklearn', 'pandas')))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        assert output.strip() == "False"
+
+
+class TestModelRegistry:
+    """Test cases for versioned models, the CURRENT pointer and hot swapping."""
+
+    def test_publish_and_activate(self, trained_model, tmp_path):
+        """Test that publishing moves CURRENT and activate rolls it back."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path))
+        assert registry.current_version() is None
+
+        registry.publish(model, version="v1")
+        registry.publish(model, version="v2")
+        assert registry.versions() == ["v1", "v2"]
+        assert registry.current_version() == "v2"
+        assert registry.store("v2").has_compiled()
+
+        registry.activate("v1")
+        assert registry.current_version() == "v1"
+        assert not [p for p in tmp_path.iterdir() if p.name.startswith(".")]
+
+    def test_rejects_unknown_and_duplicate_versions(self, trained_model, tmp_path):
+        """Test that pointers cannot name missing versions and versions are immutable."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path))
+        registry.publish(model, version="v1")
+        with pytest.raises(ValueError):
+            registry.activate("missing")
+        with pytest.raises(ValueError):
+            registry.set_candidate("missing")
+        with pytest.raises(ValueError):
+            registry.publish(model, version="v1")
+
+    def test_old_versions_pruned_but_pointers_kept(self, trained_model, tmp_path):
+        """Test that pruning never removes the live or candidate version."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path))
+        registry.publish(model, version="v1")
+        registry.set_candidate("v1")
+        for version in ("v2", "v3", "v4"):
+            registry.publish(model, version=version, keep=2)
+        assert registry.versions() == ["v1", "v4"]
+
+    def test_versions_ordered_by_publish_time(self, trained_model, tmp_path):
+        """Test that v10 is newer than v9 and survives pruning."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path))
+        for version in ("v8", "v9", "v10"):
+            registry.publish(model, version=version, keep=2)
+        assert registry.versions() == ["v9", "v10"]
+        assert registry.current_version() == "v10"
+
+    def test_legacy_flat_layout_is_unversioned(self, trained_model):
+        """Test that a directory written by save_model alone is still served."""
+        _, model_dir = trained_model
+        registry = ModelRegistry(str(model_dir / "predictive_maintenance"))
+        assert registry.current_version() == "unversioned"
+
+    @pytest.mark.asyncio
+    async def test_hot_swap_reports_model_version(self, trained_model, tmp_path):
+        """Test that activating a version swaps it in without restarting the agent."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path / "predictive_maintenance"))
+        registry.publish(model, version="v1")
+        agent = MLAgent(models_dir=str(tmp_path), reload_seconds=0)
+
+        result = await agent.predict_failure("CNC-A-102", sensor_rows(1)[0])
+        assert result["model_version"] == "v1"
+
+        registry.publish(model, version="v2")
+        assert (await agent.predict_failure("CNC-A-102", sensor_rows(1)[0]))["model_version"] == "v1"
+        assert agent.reload()
+        batch = await agent.predict_failure_batch([("CNC-A-102", sensor_rows(1)[0])])
+        assert batch[0]["model_version"] == "v2"
+
+    def test_watcher_picks_up_new_version(self, trained_model, tmp_path):
+        """Test that the background watcher swaps in a newly activated version."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path / "predictive_maintenance"))
+        registry.publish(model, version="v1")
+        agent = MLAgent(models_dir=str(tmp_path), reload_seconds=0.05)
+        try:
+            agent._load_models()
+            registry.publish(model, version="v2")
+            deadline = time.monotonic() + 5
+            while agent.model_version != "v2" and time.monotonic() < deadline:
+                time.sleep(0.02)
+            assert agent.model_version == "v2"
+        finally:
+            agent.close()
+
+    @pytest.mark.asyncio
+    async def test_shadow_scores_candidate(self, trained_model, tmp_path):
+        """Test that sampled traffic is scored by the candidate and compared."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path / "predictive_maintenance"))
+        registry.publish(model, version="v1")
+        registry.publish(model, version="v2", activate=False)
+        registry.set_candidate("v2")
+        agent = MLAgent(models_dir=str(tmp_path), reload_seconds=0, shadow_sample_rate=1.0)
+
+        rows = sensor_rows(5)
+        await agent.predict_failure("CNC-A-102", rows[0])
+        await agent.predict_failure_batch([(f"EQ-{i}", row) for i, row in enumerate(rows)])
+        deadline = time.monotonic() + 5
+        while agent.model_info()["shadow"]["scored"] < 6 and time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+
+        info = agent.model_info()
+        assert info["model_version"] == "v1"
+        assert info["candidate_version"] == "v2"
+        assert info["shadow"]["scored"] == 6
+        assert info["shadow"]["risk_level_agreement"] == 1.0
+        assert info["shadow"]["max_probability_diff"] == pytest.approx(0.0)
+
+    def test_promoted_candidate_stops_shadowing(self, trained_model, tmp_path):
+        """Test that activating the candidate reuses it and ends shadow scoring."""
+        model, _ = trained_model
+        registry = ModelRegistry(str(tmp_path / "predictive_maintenance"))
+        registry.publish(model, version="v1")
+        registry.publish(model, version="v2", activate=False)
+        registry.set_candidate("v2")
+        agent = MLAgent(models_dir=str(tmp_path), reload_seconds=0)
+        agent._load_models()
+        candidate_predictor = agent.candidate.predictor
+
+        registry.activate("v2")
+        agent.reload()
+        assert agent.model_version == "v2"
+        assert agent.predictor is candidate_predictor
+        assert agent.candidate is None
+
+
+class TestBatchPrediction:
+    """Test cases for scoring many equipment in one model pass."""
+
+    @pytest.mark.asyncio
+    async def test_batch_matches_single_predictions(self, trained_agent):
+        """Test that batch results equal one predict_failure call per equipment."""
+        rows = sensor_rows(25)
+        items = [(f"EQ-{i:04d}", row) for i, row in enumerate(rows)]
+
+        batch = await trained_agent.predict_failure_batch(items)
+
+        assert [r["equipment_id"] for r in batch] == [eq for eq, _ in items]
+        for (equipment_id, row), result in zip(items, batch):
+            single = await trained_agent.predict_failure(equipment_id, row)
+            assert result["failure_probability"] == pytest.approx(single["failure_probability"])
+            assert result["risk_level"] == single["risk_level"]
+            assert result["recommendations"] == single["recommendations"]
+
+    def test_matrix_matches_dataframe_input(self, trained_model, trained_agent):
+        """Test that the model scores an array and the equivalent DataFrame identically."""
+        model, _ = trained_model
+        rows = sensor_rows(10)
+        from_matrix = model.predict(trained_agent._build_feature_matrix(rows, model.feature_names))
+        frames = [model.predict(trained_agent._prepare_features_for_prediction(r)) for r in rows]
+        assert from_matrix["probabilities"] == pytest.approx(
+            [f["probabilities"][0] for f in frames]
+        )
+
+    def test_rejects_wrong_feature_count(self, trained_model, trained_agent):
+        """Test that a matrix with the wrong number of columns is rejected."""
+        model, _ = trained_model
+        for predictor in (model, trained_agent.predictor):
+            with pytest.raises(ValueError):
+                predictor.predict(np.zeros((3, 4)))
+
+    @pytest.mark.asyncio
+    async def test_mock_model_batch(self, tmp_path):
+        """Test that batch prediction falls back to the rule-based model when untrained."""
+        agent = MLAgent(models_dir=str(tmp_path), reload_seconds=0)
+        results = await agent.predict_failure_batch(
+            [("CNC-A-102", {"temperature_avg": 90.0}), ("PUMP-B-05", {})]
+        )
+        assert [r["equipment_id"] for r in results] == ["CNC-A-102", "PUMP-B-05"]
+        assert all(r["model_used"] == "Mock Model (Rule-based)" for r in results)
+
+    @pytest.mark.asyncio
+    async def test_empty_batch(self, trained_agent):
+        """Test that an empty batch returns no predictions."""
+        assert await trained_agent.predict_failure_batch([]) == []
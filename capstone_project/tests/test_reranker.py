@@ -0,0 +1,89 @@
+"""Unit tests for cross-encoder re-ranking."""
+
+import time
+
+from app.reranker import Reranker
+
+
+def hits(*texts):
+    return [(f"chunk-{i}", text, {}) for i, text in enumerate(texts)]
+
+
+class KeywordScorer:
+    """Scores a pair by how often the passage contains the query's last word."""
+
+    def __init__(self, delay=0.0):
+        self.calls = []
+        self.delay = delay
+
+    def __call__(self, pairs):
+        self.calls.append(list(pairs))
+        time.sleep(self.delay * len(pairs))
+        return [passage.count(query.split()[-1]) for query, passage in pairs]
+
+
+class TestReranker:
+    """Test cases for re-ranking, caching and the latency budget."""
+
+    def test_reorders_and_keeps_top_n(self):
+        """Test that candidates are ordered by score and truncated."""
+        reranker = Reranker(KeywordScorer(), latency_budget_ms=0)
+        candidates = hits("spindle", "coolant coolant", "coolant", "bearing")
+        [ranked] = reranker.rerank_many(["check coolant"], [candidates], top_n=2)
+        assert [chunk_id for chunk_id, _, _ in ranked] == ["chunk-1", "chunk-2"]
+
+    def test_batch_scored_in_one_call(self):
+        """Test that all queries of a batch share one scorer call."""
+        scorer = KeywordScorer()
+        reranker = Reranker(scorer, latency_budget_ms=0)
+        reranker.rerank_many(["a coolant", "b spindle"], [hits("x", "y"), hits("z")], top_n=1)
+        assert len(scorer.calls) == 1
+        assert len(scorer.calls[0]) == 3
+
+    def test_scores_cached_by_query_and_chunk(self):
+        """Test that repeated pairs are served from the cache."""
+        scorer = KeywordScorer()
+        reranker = Reranker(scorer, latency_budget_ms=0)
+        candidates = hits("coolant", "spindle")
+        reranker.rerank_many(["coolant"], [candidates], top_n=2)
+        reranker.rerank_many(["coolant"], [candidates], top_n=2)
+        assert len(scorer.calls) == 1
+        assert reranker.stats()["cache"]["hits"] == 2
+
+    def test_knowledge_base_change_clears_cache(self):
+        """Test that a new fingerprint invalidates cached scores."""
+        scorer = KeywordScorer()
+        reranker = Reranker(scorer, latency_budget_ms=0)
+        reranker.validate((1, "v1"))
+        reranker.rerank_many(["coolant"], [hits("coolant")], top_n=1)
+        reranker.validate((1, "v2"))
+        reranker.rerank_many(["coolant"], [hits("coolant")], top_n=1)
+        assert len(scorer.calls) == 2
+
+    def test_latency_budget_limits_pairs(self):
+        """Test that a slow scorer is asked for fewer pairs, best-ranked first."""
+        scorer = KeywordScorer(delay=0.002)
+        reranker = Reranker(scorer, latency_budget_ms=10)
+        reranker.rerank_many(["seed"], [hits(*["x"] * 10)], top_n=1)  # measures ~2ms per pair
+
+        candidates = hits(*[f"doc {i} coolant" for i in range(20)])
+        [ranked] = reranker.rerank_many(["coolant"], [candidates], top_n=3)
+
+        scored = scorer.calls[-1]
+        assert len(scored) < 20
+        assert [passage for _, passage in scored] == [text for _, text, _ in candidates[:len(scored)]]
+        assert len(ranked) == 3
+        assert reranker.stats()["budget_limited_batches"] == 1
+
+    def test_warm_up_seeds_latency_budget(self):
+        """Test that the first real batch is capped using the warm-up timing."""
+        scorer = KeywordScorer(delay=0.002)
+        reranker = Reranker(scorer, latency_budget_ms=10)
+        reranker.warm_up(pairs=10)
+        assert reranker.stats()["ms_per_pair"] is not None
+
+        candidates = hits(*[f"doc {i} coolant" for i in range(20)])
+        reranker.rerank_many(["coolant"], [candidates], top_n=3)
+
+        assert len(scorer.calls[-1]) < 20
+        assert reranker.stats()["budget_limited_batches"] == 1
@@ -0,0 +1,165 @@
+"""Unit tests for hybrid BM25 + vector retrieval."""
+
+import numpy as np
+
+from app.knowledge_base import infer_equipment_type
+from app.retrieval import BM25Index, ChromaStore, HybridRetriever, reciprocal_rank_fusion, tokenize
+
+DOCS = {
+    "sop-123": ("SOP-123: CNC machine overheating. Check coolant levels and spindle bearings.", "CNC"),
+    "maint-v2": ("MAINT-GUIDE-V2: Welding porosity, incomplete fusion and spatter.", "WELDING"),
+    "coating": ("COATING-MANUAL-2024: Orange peel and surface discoloration.", "COATING"),
+    "safety": ("SAFETY-SOP-001: Lockout/tagout before any maintenance on machines.", "ALL"),
+    "pn-4471": ("Replacement spindle bearing part number PN-4471-B for CNC lathes.", "CNC"),
+}
+
+
+class FakeCollection:
+    """Minimal Chroma collection with brute-force cosine search."""
+
+    def __init__(self, docs):
+        self.ids = list(docs)
+        self.texts = [docs[i][0] for i in self.ids]
+        self.metadatas = [{"doc_id": i, "equipment_type": docs[i][1]} for i in self.ids]
+        self.embeddings = [embed(text) for text in self.texts]
+        self.queries = []
+
+    def get(self, ids=None, include=(), limit=None, offset=0):
+        positions = [self.ids.index(i) for i in ids] if ids else list(range(len(self.ids)))
+        positions = positions[offset:offset + limit] if limit else positions
+        return {
+            "ids": [self.ids[p] for p in positions],
+            "documents": [self.texts[p] for p in positions],
+            "metadatas": [self.metadatas[p] for p in positions],
+        }
+
+    def query(self, query_embeddings, n_results, where=None, include=()):
+        self.queries.append(where)
+        allowed = where["equipment_type"]["$in"] if where else None
+        results = {"ids": [], "documents": [], "metadatas": []}
+        for query in query_embeddings:
+            positions = [
+                p for p in range(len(self.ids))
+                if allowed is None or self.metadatas[p]["equipment_type"] in allowed
+            ]
+            positions.sort(key=lambda p: -float(np.dot(query, self.embeddings[p])))
+            positions = positions[:n_results]
+            results["ids"].append([self.ids[p] for p in positions])
+            results["documents"].append([self.texts[p] for p in positions])
+            results["metadatas"].append([self.metadatas[p] for p in positions])
+        return results
+
+
+def embed(text):
+    """Bag-of-letters embedding: good enough to rank, bad at exact identifiers."""
+    vector = np.zeros(26)
+    for char in text.lower():
+        if "a" <= char <= "z":
+            vector[ord(char) - ord("a")] += 1
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+class TestTokenize:
+    """Test cases for the BM25 tokenizer."""
+
+    def test_identifiers_are_kept_whole_and_split(self):
+        """Test that compound identifiers produce whole and partial terms."""
+        terms = tokenize("See SOP-123 and PN-4471-B.")
+        assert "sop-123" in terms
+        assert "pn-4471-b" in terms
+        assert "4471" in terms
+
+
+class TestBM25Index:
+    """Test cases for the in-process inverted index."""
+
+    def setup_method(self):
+        ids = list(DOCS)
+        self.index = BM25Index.build(
+            ids, [DOCS[i][0] for i in ids], [{"equipment_type": DOCS[i][1]} for i in ids]
+        )
+
+    def test_exact_part_number_ranks_first(self):
+        """Test that an exact part number finds its document."""
+        results = self.index.search("need part PN-4471-B", k=3)
+        assert results[0][0] == "pn-4471"
+
+    def test_equipment_filter_excludes_other_types(self):
+        """Test that the pre-filter keeps only the type and generic documents."""
+        results = self.index.search("maintenance porosity machines", k=5, equipment_types=["CNC", "ALL"])
+        assert {item_id for item_id, _ in results} <= {"sop-123", "pn-4471", "safety"}
+        assert "maint-v2" not in {item_id for item_id, _ in results}
+
+    def test_no_match_returns_empty(self):
+        """Test that a query with no known terms returns nothing."""
+        assert self.index.search("xyzzy", k=3) == []
+
+
+class TestFusion:
+    """Test cases for reciprocal rank fusion."""
+
+    def test_documents_in_both_rankings_win(self):
+        """Test that agreement between retrievers is rewarded."""
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d", "e"]])
+        assert fused[0][0] == "b"
+        assert {item_id for item_id, _ in fused} == {"a", "b", "c", "d", "e"}
+
+
+class TestHybridRetriever:
+    """Test cases for hybrid retrieval over a collection."""
+
+    def test_hybrid_finds_identifier_missed_by_vectors(self):
+        """Test that BM25 brings in a chunk the vector search did not return."""
+        collection = FakeCollection(DOCS)
+        retriever = HybridRetriever(ChromaStore(collection), candidates=1)
+        retriever.refresh(("fingerprint", 1))
+
+        query = "PN-4471-B"
+        [hits] = retriever.retrieve_many([query], [embed(query)], [None], k=2)
+        assert "pn-4471" in [item_id for item_id, _, _ in hits]
+
+    def test_queries_grouped_by_equipment_filter(self):
+        """Test that one vector query is issued per distinct filter."""
+        collection = FakeCollection(DOCS)
+        retriever = HybridRetriever(ChromaStore(collection))
+        retriever.refresh(("fingerprint", 1))
+
+        queries = ["spindle overheating", "coolant leak", "weld porosity"]
+        results = retriever.retrieve_many(
+            queries, [embed(q) for q in queries], ["CNC", "CNC", "WELDING"], k=3
+        )
+
+        assert len(collection.queries) == 2
+        for hits in results[:2]:
+            assert all(meta["equipment_type"] in ("CNC", "ALL") for _, _, meta in hits)
+        assert results[2][0][0] == "maint-v2"
+
+    def test_refresh_only_when_fingerprint_changes(self):
+        """Test that the BM25 index is rebuilt only for a new fingerprint."""
+        retriever = HybridRetriever(ChromaStore(FakeCollection(DOCS)))
+        assert retriever.refresh((5, "v1")) is True
+        assert retriever.refresh((5, "v1")) is False
+        assert len(retriever.index) == len(DOCS)
+
+
+class TestEquipmentTypeInference:
+    """Test cases for deriving the pre-filter from the request."""
+
+    def test_from_equipment_id_prefix(self):
+        """Test that the equipment ID prefix determines the type."""
+        assert infer_equipment_type("WELDING-B-201") == "WELDING"
+
+    def test_matches_whole_words_only(self):
+        """Test that a type inside a longer word does not match."""
+        assert infer_equipment_type("COMPRESSOR-3") is None
+        assert infer_equipment_type("EXPRESS-LINE-2") is None
+        assert infer_equipment_type("PRESS2-B") == "PRESS"
+        assert infer_equipment_type("cnc_spindle_manual") == "CNC"
+
+    def test_from_vision_defects(self):
+        """Test that vision defects determine the type when the ID does not."""
+        assert infer_equipment_type("LINE-7", ["orange-peel"]) == "COATING"
+
+    def test_unknown(self):
+        """Test that no filter is applied when the type cannot be inferred."""
+        assert infer_equipment_type("LINE-7", ["quality-concern"]) is None
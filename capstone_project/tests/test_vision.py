@@ -0,0 +1,289 @@
+"""Unit tests for the Vision agent's image pipeline."""
+
+import asyncio
+import io
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.knowledge_base import extract_defects
+from app.local_vision import LocalDefectClassifier
+from app.object_store import LocalObjectStore, ObjectNotFound, ObjectStore
+
+
+class TestLocalObjectStore:
+    """Test cases for the local-filesystem image store."""
+
+    def test_put_and_get_without_extension(self, tmp_path):
+        """Test that image IDs resolve to files with an image extension."""
+        store = LocalObjectStore(str(tmp_path))
+        store.put("plant-a/img_123.jpg", b"jpeg-bytes")
+        assert store.get("plant-a/img_123") == b"jpeg-bytes"
+        assert store.get("plant-a/img_123.jpg") == b"jpeg-bytes"
+
+    def test_missing_object(self, tmp_path):
+        """Test that unknown IDs raise ObjectNotFound."""
+        with pytest.raises(ObjectNotFound):
+            LocalObjectStore(str(tmp_path)).get("img_missing")
+
+    @pytest.mark.parametrize("key", ["../secrets.txt", "/etc/passwd", "a/../../outside", ""])
+    def test_keys_cannot_escape_root(self, tmp_path, key):
+        """Test that path traversal in image IDs is rejected."""
+        (tmp_path / "secrets.txt").write_text("x")
+        store = LocalObjectStore(str(tmp_path / "images"))
+        with pytest.raises(ObjectNotFound):
+            store.get(key)
+
+    def test_incomplete_backend_fails_at_construction(self):
+        """Test that a backend missing a method cannot be instantiated."""
+        class ReadOnlyStore(ObjectStore):
+            def get(self, key):
+                return b""
+
+        with pytest.raises(TypeError):
+            ReadOnlyStore()
+
+
+class TestExtractDefects:
+    """Test cases for mapping VLM descriptions to defect labels."""
+
+    def test_known_defects(self):
+        """Test that defect words map to their labels."""
+        assert extract_defects("A weld seam with small pores and heavy spatter") == ["weld-porosity", "spatter"]
+        assert extract_defects("a metal bracket with a crack running across it") == ["micro-fracture"]
+
+    def test_clean_part(self):
+        """Test that a description without defect words yields no defects."""
+        assert extract_defects("a shiny metal gear on a table") == []
+
+
+class TestPreprocessImage:
+    """Test cases for off-loop image decoding and resizing."""
+
+    def test_downscales_and_reencodes(self):
+        """Test that large images are resized to the maximum side as JPEG."""
+        Image = pytest.importorskip("PIL.Image")
+        from app.imaging import preprocess_image
+
+        buffer = io.BytesIO()
+        Image.new("RGBA", (2000, 1000), (200, 10, 10, 255)).save(buffer, format="PNG")
+        output = preprocess_image(buffer.getvalue(), max_size=512)
+
+        with Image.open(io.BytesIO(output)) as image:
+            assert image.format == "JPEG"
+            assert image.size == (512, 256)
+
+    def test_rejects_non_images(self):
+        """Test that undecodable uploads raise ValueError."""
+        pytest.importorskip("PIL")
+        from app.imaging import preprocess_image
+
+        with pytest.raises(ValueError):
+            preprocess_image(b"not an image")
+
+
+class FakeVLMClient:
+    """Inference client stand-in that records batched VLM calls."""
+
+    def __init__(self):
+        self.batches = []
+
+    async def image_to_text_batch(self, model_id, images):
+        self.batches.append(len(images))
+        await asyncio.sleep(0)
+        return ["a weld with porosity" for _ in images]
+
+
+@pytest.fixture
+def vision_agent(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_community")
+    pytest.importorskip("PIL")
+    from app import agents
+
+    monkeypatch.setattr(settings, "IMAGE_STORE_ROOT", str(tmp_path))
+    agent = agents.VisionAgent()
+    agent.client = FakeVLMClient()
+    return agent
+
+
+def _png(color):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestVisionAgent:
+    """Test cases for fetching, batching and caching image analyses."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_images_share_one_vlm_call(self, vision_agent):
+        """Test that images analysed together are described in one batch."""
+        for i in range(3):
+            vision_agent.store.put(f"img_{i}.png", _png((i * 40, 0, 0)))
+
+        results = await asyncio.gather(*[vision_agent.analyze_image(f"img_{i}", "WELD-01") for i in range(3)])
+
+        assert vision_agent.client.batches == [3]
+        assert all(result["defects_found"] == ["weld-porosity"] for result in results)
+
+    @pytest.mark.asyncio
+    async def test_same_photo_is_served_from_cache(self, vision_agent):
+        """Test that re-diagnosing identical image content skips the VLM."""
+        vision_agent.store.put("first.png", _png((0, 90, 0)))
+        vision_agent.store.put("copy.png", _png((0, 90, 0)))
+
+        await vision_agent.analyze_image("first", "WELD-01")
+        result = await vision_agent.analyze_image("copy", "WELD-01")
+
+        assert result["cache_hit"] is True
+        assert result["image_analyzed"] == "copy"
+        assert vision_agent.client.batches == [1]
+
+    @pytest.mark.asyncio
+    async def test_missing_image(self, vision_agent):
+        """Test that an unknown image ID is reported without calling the VLM."""
+        result = await vision_agent.analyze_image("img_missing", "WELD-01")
+        assert result["defects_found"] == [] and "not found" in result["error"]
+        assert vision_agent.client.batches == []
+
+
+class FakeRAGAgent:
+    """RAG stand-in that records the defects it was asked about."""
+
+    def __init__(self):
+        self.defects = None
+
+    async def get_guidance(self, equipment_id, problem_description, defects, on_token=None):
+        self.defects = defects
+        return {"recommended_steps": ["1. Inspect the weld."], "cited_documents": [], "confidence": 0.8}
+
+
+class FakeReportAgent:
+    """Report stand-in returning a fixed report."""
+
+    async def generate_report(self, plant_id, equipment_id, problem, vision_analysis, rag_guidance, on_token=None):
+        return "report"
+
+
+class TestDiagnoseWithoutImage:
+    """Test cases for image-less requests through the full graph."""
+
+    @pytest.mark.asyncio
+    async def test_equipment_profile_reaches_rag(self, vision_agent, monkeypatch):
+        """Test that a request without image_id uses the equipment-profile defects."""
+        from app import agents
+        from app.knowledge_base import DEFECT_KEYWORDS
+        from app.models import DiagnosisRequest
+
+        rag = FakeRAGAgent()
+        monkeypatch.setattr(settings, "DIAGNOSE_COALESCING_ENABLED", False)
+        monkeypatch.setattr(agents, "vision_agent", vision_agent)
+        monkeypatch.setattr(agents, "rag_agent", rag)
+        monkeypatch.setattr(agents, "report_agent", FakeReportAgent())
+        monkeypatch.setattr(agents, "copilot_graph", agents._build_graph())
+
+        response = await agents.run_copilot_inference(DiagnosisRequest(
+            plant_id="PUNE-IN", equipment_id="WELDING-01", problem_description="Porous welds on the seam"
+        ))
+
+        expected = DEFECT_KEYWORDS["WELDING"][:2]
+        assert response.vision_analysis["defects_found"] == expected
+        assert response.vision_analysis["image_analyzed"] == "no_image_provided"
+        assert "error" not in response.vision_analysis
+        assert rag.defects == expected
+        assert response.confidence_score == pytest.approx((0.87 + 0.8) / 2)
+        assert vision_agent.client.batches == []
+
+
+class FakeOnnxSession:
+    """ONNX session stand-in returning fixed logits per image."""
+
+    def __init__(self, logits):
+        self.logits = np.array(logits, dtype=np.float32)
+        self.batch_sizes = []
+
+    def run(self, outputs, feed):
+        batch = next(iter(feed.values()))
+        self.batch_sizes.append(len(batch))
+        return [np.tile(self.logits, (len(batch), 1))]
+
+
+def make_local_classifier(logits, labels=("weld-porosity", "spatter", "no-defect")):
+    classifier = object.__new__(LocalDefectClassifier)
+    classifier.session = FakeOnnxSession(logits)
+    classifier.input_name = "pixel_values"
+    classifier.labels = list(labels)
+    classifier.input_size = 32
+    classifier.threshold = 0.5
+    classifier.model_id = "local:defect_classifier.onnx"
+    return classifier
+
+
+class TestLocalDefectClassifier:
+    """Test cases for the local CPU defect classifier."""
+
+    def test_reports_defects_above_threshold(self):
+        """Test that defects are thresholded, ordered by probability and exclude no-defect."""
+        classifier = make_local_classifier([1.0, 3.0, 5.0])
+        [(defects, confidence)] = classifier.classify([np.zeros((3, 32, 32), dtype=np.float32)])
+        assert defects == ["spatter", "weld-porosity"]
+        assert confidence == pytest.approx(1 / (1 + np.exp(-3.0)), abs=1e-4)
+
+    def test_clean_image_confidence(self):
+        """Test that without defects confidence is the no-defect output's probability."""
+        classifier = make_local_classifier([-3.0, -2.0, 1.0])
+        [(defects, confidence)] = classifier.classify([np.zeros((3, 32, 32), dtype=np.float32)])
+        assert defects == []
+        assert confidence == pytest.approx(1 / (1 + np.exp(-1.0)), abs=1e-4)
+
+    def test_clean_image_confidence_without_no_defect_label(self):
+        """Test that a model without a no-defect output uses the top defect probability."""
+        classifier = make_local_classifier([-3.0, -2.0], labels=("weld-porosity", "spatter"))
+        [(defects, confidence)] = classifier.classify([np.zeros((3, 32, 32), dtype=np.float32)])
+        assert defects == []
+        assert confidence == pytest.approx(1 - 1 / (1 + np.exp(2.0)), abs=1e-4)
+
+    def test_preprocess_shape(self):
+        """Test that images are decoded to normalised CHW arrays of the input size."""
+        pytest.importorskip("PIL")
+        array = make_local_classifier([0, 0, 0]).preprocess(_png((255, 255, 255)))
+        assert array.shape == (3, 32, 32) and array.dtype == np.float32
+
+
+class SlowVLMClient(FakeVLMClient):
+    """VLM stand-in that answers after the latency budget."""
+
+    async def image_to_text_batch(self, model_id, images):
+        await asyncio.sleep(0.2)
+        return await super().image_to_text_batch(model_id, images)
+
+
+class TestVisionFallback:
+    """Test cases for the local fallback when the VLM is slow."""
+
+    @pytest.mark.asyncio
+    async def test_slow_vlm_falls_back_to_local_model(self, vision_agent, monkeypatch):
+        """Test that the local classifier answers within the budget, batched across requests."""
+        from app.batching import MicroBatcher
+
+        monkeypatch.setattr(settings, "VISION_REMOTE_BUDGET_MS", 20)
+        vision_agent.client = SlowVLMClient()
+        vision_agent.local = make_local_classifier([4.0, -4.0, -4.0])
+        vision_agent.local_batcher = MicroBatcher(vision_agent._classify_batch, max_batch_size=8, max_wait_ms=5)
+        for i in range(2):
+            vision_agent.store.put(f"img_{i}.png", _png((0, 0, i * 50)))
+
+        results = await asyncio.gather(*[vision_agent.analyze_image(f"img_{i}", "WELD-01") for i in range(2)])
+
+        assert [result["model_used"] for result in results] == ["local:defect_classifier.onnx"] * 2
+        assert results[0]["defects_found"] == ["weld-porosity"]
+        assert vision_agent.local.session.batch_sizes == [2]
+        assert vision_agent.fallbacks == 2
+
+        # The late VLM answer is cached for the next request
+        await asyncio.sleep(0.3)
+        result = await vision_agent.analyze_image("img_0", "WELD-01")
+        assert result["cache_hit"] is True and result["model_used"] == settings.VLM_MODEL_ID